@@ -0,0 +1,91 @@
+"""Benchmark of the startup time of the repo-stream command line interface.
+
+Compares the time spent by the ``repo-stream --hook`` entry point, which runs
+in every commit of the repositories that define the hook, with the time spent
+importing the update machinery.
+
+Usage::
+
+    python benchmarks/bench_import.py --runs 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROOT_DIRPATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "interpreter": "pass",
+    "hook": (
+        "import sys\n"
+        "from repo_stream.__main__ import main\n"
+        "sys.exit(main(['--hook', '-config', 'foo/bar', '-updater', 'baz']))\n"
+    ),
+    "update": "from repo_stream import update; update",
+}
+
+
+def _run(code):
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, "-c", code], cwd=ROOT_DIRPATH)
+    return time.perf_counter() - start
+
+
+def _imported_modules(code):
+    stdout = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            f"import sys\n{code.replace('sys.exit', 'int')}\nprint(len(sys.modules))",
+        ],
+        cwd=ROOT_DIRPATH,
+    )
+    return int(stdout)
+
+
+def run_benchmark(runs=10):
+    """Measure the startup time of each scenario in fresh interpreters.
+
+    Parameters
+    ----------
+
+    runs : int, optional
+      Number of executions of each scenario.
+
+    Returns
+    -------
+
+    dict : Minimum and median wall time in milliseconds and number of
+      imported modules of each scenario.
+    """
+    response = {}
+    for name, code in SCENARIOS.items():
+        times = [_run(code) for _ in range(runs)]
+        response[name] = {
+            "min_ms": round(min(times) * 1000, 2),
+            "median_ms": round(statistics.median(times) * 1000, 2),
+            "modules": _imported_modules(code),
+        }
+    return response
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    sys.stdout.write(json.dumps(run_benchmark(runs=args.runs), indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
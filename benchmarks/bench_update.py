@@ -0,0 +1,244 @@
+"""Offline end-to-end benchmark of the repo-stream update command.
+
+Runs :py:func:`repo_stream.update.update` against a local stand-in of Github
+and local bare repositories, reporting the wall time, API calls, bytes
+transferred, subprocesses spawned and peak memory of the execution.
+
+Usage::
+
+    python benchmarks/bench_update.py --scenario 1k --latency 0.05 --jobs 8
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_github import (  # noqa: E402
+    USERNAME,
+    FakeGithub,
+    generate_repos,
+)
+from repo_stream.update import update  # noqa: E402
+
+
+SCENARIOS = {"10": 10, "1k": 1000, "10k": 10000}
+
+
+class _CountingPopen(subprocess.Popen):
+    count = 0
+
+    def __init__(self, *args, **kwargs):
+        type(self).count += 1
+        super().__init__(*args, **kwargs)
+
+
+@contextlib.contextmanager
+def _silenced_output():
+    # pre-commit and git subprocesses write directly to the file descriptors
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = (os.dup(1), os.dup(2))
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+        os.dup2(devnull.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            os.close(saved_fds[0])
+            os.close(saved_fds[1])
+
+
+def run_benchmark(
+    n_repos,
+    hook_ratio=0.1,
+    change_ratio=0.5,
+    latency=0,
+    rate_limit=None,
+    rate_limit_window=60,
+    discovery="rest",
+    verbose=False,
+    **update_kwargs,
+):
+    """Run a benchmark scenario.
+
+    Parameters
+    ----------
+
+    n_repos : int
+      Number of repositories of the benchmark user.
+
+    hook_ratio : float, optional
+      Fraction of the repositories defining a repo-stream hook.
+
+    change_ratio : float, optional
+      Fraction of the repositories with a repo-stream hook that are changed.
+
+    latency : float, optional
+      Seconds waited by the server before answering each request.
+
+    rate_limit : int, optional
+      Requests allowed for each API resource in each rate limit window.
+
+    rate_limit_window : float, optional
+      Seconds after which the rate limits are reset.
+
+    discovery : str, optional
+      Discovery backend, ``"rest"`` or ``"graphql"``.
+
+    verbose : bool, optional
+      Don't silence the output of the update.
+
+    update_kwargs : dict
+      Other arguments passed to :py:func:`repo_stream.update.update`.
+
+    Returns
+    -------
+
+    dict : Metrics of the execution.
+    """
+    with tempfile.TemporaryDirectory() as dirname:
+        git_dirpath = os.path.join(dirname, "git")
+        repos = generate_repos(
+            git_dirpath,
+            n_repos,
+            hook_ratio=hook_ratio,
+            change_ratio=change_ratio,
+        )
+
+        server = FakeGithub(
+            repos,
+            latency=latency,
+            rate_limit=rate_limit,
+            rate_limit_window=rate_limit_window,
+        )
+        server.start()
+
+        environ = dict(os.environ)
+        os.environ.update(
+            {
+                "GIT_AUTHOR_NAME": "repo-stream",
+                "GIT_AUTHOR_EMAIL": "repo-stream@example.com",
+                "GIT_COMMITTER_NAME": "repo-stream",
+                "GIT_COMMITTER_EMAIL": "repo-stream@example.com",
+            }
+        )
+        if discovery == "graphql" or update_kwargs.get("commit_mode") == "api":
+            os.environ["GITHUB_TOKEN"] = "fake"
+        else:
+            os.environ.pop("GITHUB_TOKEN", None)
+
+        popen = subprocess.Popen
+        subprocess.Popen = _CountingPopen
+        _CountingPopen.count = 0
+        try:
+            with contextlib.ExitStack() as stack:
+                if not verbose:
+                    stack.enter_context(_silenced_output())
+                start = time.perf_counter()
+                exitcode = update(
+                    [USERNAME],
+                    discovery=discovery,
+                    api_url=server.url,
+                    raw_url=f"{server.url}/raw",
+                    git_url=git_dirpath,
+                    pre_commit_home=os.path.join(dirname, "pre-commit"),
+                    **update_kwargs,
+                )
+                wall_time = time.perf_counter() - start
+        finally:
+            subprocess.Popen = popen
+            os.environ.clear()
+            os.environ.update(environ)
+            server.stop()
+
+    return {
+        "repos": n_repos,
+        "exitcode": exitcode,
+        "wall_time": round(wall_time, 3),
+        "api_calls": server.api_calls,
+        "requests": dict(sorted(server.requests.items())),
+        "pull_requests": len(server.pulls),
+        "bytes_received": server.bytes_received,
+        "bytes_sent": server.bytes_sent,
+        "subprocesses": _CountingPopen.count,
+        # kilobytes in Linux
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_rss_children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenario",
+        choices=SCENARIOS,
+        default="10",
+        help="Number of repositories of the benchmark user.",
+    )
+    parser.add_argument(
+        "--repos",
+        type=int,
+        default=None,
+        help="Custom number of repositories, overrides --scenario.",
+    )
+    parser.add_argument("--hook-ratio", type=float, default=0.1)
+    parser.add_argument("--change-ratio", type=float, default=0.5)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Seconds waited by the server before answering each request.",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=None,
+        help="Requests allowed for each API resource in each window.",
+    )
+    parser.add_argument("--rate-limit-window", type=float, default=60)
+    parser.add_argument("--discovery", choices=("rest", "graphql"), default="rest")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--network-jobs", type=int, default=4)
+    parser.add_argument("--api-jobs", type=int, default=16)
+    parser.add_argument("--sparse-clone", action="store_true")
+    parser.add_argument("--commit-mode", choices=("push", "api"), default="push")
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    metrics = run_benchmark(
+        args.repos if args.repos is not None else SCENARIOS[args.scenario],
+        hook_ratio=args.hook_ratio,
+        change_ratio=args.change_ratio,
+        latency=args.latency,
+        rate_limit=args.rate_limit,
+        rate_limit_window=args.rate_limit_window,
+        discovery=args.discovery,
+        verbose=args.verbose,
+        jobs=args.jobs,
+        network_jobs=args.network_jobs,
+        api_jobs=args.api_jobs,
+        sparse_clone=args.sparse_clone,
+        commit_mode=args.commit_mode,
+    )
+    sys.stdout.write(json.dumps(metrics, indent=2) + "\n")
+    return metrics["exitcode"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
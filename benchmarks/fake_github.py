@@ -0,0 +1,449 @@
+"""Local stand-in for the Github endpoints and GIT remotes used by repo-stream.
+
+The server answers the REST, GraphQL and raw contents requests performed by
+:py:mod:`repo_stream.github` and :py:mod:`repo_stream.graphql` for a set of
+generated repositories, whose GIT remotes are local bare repositories.
+"""
+
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import socketserver
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+
+
+USERNAME = "bench"
+CONFIG_REPO = f"{USERNAME}/repo-stream-config"
+
+REPO_STREAM_PC_CONFIG = """repos:
+  - repo: https://github.com/mondeja/repo-stream
+    rev: v1.3.1
+    hooks:
+      - id: repo-stream
+        args:
+          - -config=https://github.com/{config_repo}
+          - -updater={updater}
+"""
+
+OTHER_PC_CONFIG = """repos:
+  - repo: https://github.com/pre-commit/pre-commit-hooks
+    rev: v4.1.0
+    hooks:
+      - id: trailing-whitespace
+"""
+
+# updaters of the configuration repository, one changing the repositories
+# and the other leaving them untouched
+UPDATERS = {
+    "change": """repos:
+  - repo: local
+    hooks:
+      - id: update-readme
+        name: update-readme
+        entry: sh -c "echo updated >> README.md"
+        language: system
+        always_run: true
+        pass_filenames: false
+""",
+    "noop": """repos:
+  - repo: local
+    hooks:
+      - id: noop
+        name: noop
+        entry: "true"
+        language: system
+        always_run: true
+        pass_filenames: false
+""",
+}
+
+
+def _create_bare_repo(dirpath, files):
+    with tempfile.TemporaryDirectory() as worktree:
+        subprocess.check_call(["git", "init", "--quiet", worktree])
+        for filename, content in files.items():
+            with open(os.path.join(worktree, filename), "w") as f:
+                f.write(content)
+        subprocess.check_call(["git", "add", "."], cwd=worktree)
+        subprocess.check_call(
+            [
+                "git",
+                "-c",
+                "user.name=repo-stream",
+                "-c",
+                "user.email=repo-stream@example.com",
+                "commit",
+                "--quiet",
+                "-m",
+                "init",
+            ],
+            cwd=worktree,
+        )
+        subprocess.check_call(["git", "branch", "-M", "main"], cwd=worktree)
+        subprocess.check_call(["git", "clone", "--quiet", "--bare", worktree, dirpath])
+    return (
+        subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=dirpath)
+        .decode("utf-8")
+        .strip()
+    )
+
+
+def generate_repos(git_dirpath, n_repos, hook_ratio=0.1, change_ratio=0.5):
+    """Generate the repositories of a benchmark scenario.
+
+    Only the repositories with a repo-stream hook, which are cloned by
+    repo-stream, get a bare repository. They are copied from a template
+    for each updater, so generating thousands of them is fast.
+
+    Parameters
+    ----------
+
+    git_dirpath : str
+      Directory where the bare repositories are created, as
+      ``<owner>/<name>.git``.
+
+    n_repos : int
+      Number of repositories of the user.
+
+    hook_ratio : float, optional
+      Fraction of the repositories defining a repo-stream hook.
+
+    change_ratio : float, optional
+      Fraction of the repositories with a repo-stream hook that are changed
+      by their updater, so a pull request is opened for them.
+
+    Returns
+    -------
+
+    list : Repositories as dictionaries with the fields ``full_name``,
+      ``default_branch``, ``head_sha`` and ``pre_commit_config``.
+    """
+    templates = {}
+    for updater in UPDATERS:
+        pc_config = REPO_STREAM_PC_CONFIG.format(
+            config_repo=CONFIG_REPO,
+            updater=updater,
+        )
+        template_dirpath = os.path.join(git_dirpath, "templates", f"{updater}.git")
+        head_sha = _create_bare_repo(
+            template_dirpath,
+            {"README.md": "benchmark\n", ".pre-commit-config.yaml": pc_config},
+        )
+        templates[updater] = (template_dirpath, head_sha, pc_config)
+
+    n_hooked = round(n_repos * hook_ratio)
+    n_changed = round(n_hooked * change_ratio)
+
+    repos = []
+    for i in range(n_repos):
+        full_name = f"{USERNAME}/repo{i}"
+        repo = {
+            "full_name": full_name,
+            "default_branch": "main",
+            "head_sha": f"{i:040x}",
+            "pre_commit_config": OTHER_PC_CONFIG if i % 2 else None,
+        }
+        if i < n_hooked:
+            updater = "change" if i < n_changed else "noop"
+            template_dirpath, head_sha, pc_config = templates[updater]
+            shutil.copytree(
+                template_dirpath,
+                os.path.join(git_dirpath, f"{full_name}.git"),
+            )
+            repo["head_sha"] = head_sha
+            repo["pre_commit_config"] = pc_config
+        repos.append(repo)
+    return repos
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeGithub:
+    """Local HTTP server answering like Github for generated repositories.
+
+    Collects the number of requests by endpoint and the bytes transferred.
+    """
+
+    def __init__(self, repos, latency=0, rate_limit=None, rate_limit_window=60):
+        """Create the server.
+
+        Parameters
+        ----------
+
+        repos : list
+          Repositories, as returned by :py:func:`generate_repos`.
+
+        latency : float, optional
+          Seconds waited before answering each request.
+
+        rate_limit : int, optional
+          Number of requests allowed for each API resource in each window.
+          When exceeded, the API answers with rate limit errors until the
+          window is reset. By default, unlimited.
+
+        rate_limit_window : float, optional
+          Seconds after which the rate limits are reset.
+        """
+        self.repos = {repo["full_name"]: repo for repo in repos}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+
+        self.requests = {}
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.pulls = []
+        self._lock = threading.Lock()
+        self._rate_limit_usage = {}
+        self._rate_limit_reset = time.time() + rate_limit_window
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if server.latency:
+                    time.sleep(server.latency)
+
+                status, headers, response_body = server.respond(
+                    self.command,
+                    self.path,
+                    body,
+                )
+                if not isinstance(response_body, bytes):
+                    response_body = json.dumps(response_body).encode("utf-8")
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(response_body)))
+                self.end_headers()
+                self.wfile.write(response_body)
+
+                with server._lock:
+                    server.bytes_received += len(body) + len(self.requestline)
+                    server.bytes_sent += len(response_body)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def api_calls(self):
+        """Number of requests to the API, excluding raw contents."""
+        return sum(
+            count for endpoint, count in self.requests.items() if endpoint != "raw"
+        )
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop the server."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def _rate_limit_headers(self, resource):
+        # returns the headers of the response and if the limit is exceeded
+        if self.rate_limit is None:
+            return ({}, False)
+
+        with self._lock:
+            now = time.time()
+            if now >= self._rate_limit_reset:
+                self._rate_limit_usage = {}
+                self._rate_limit_reset = now + self.rate_limit_window
+            used = self._rate_limit_usage.get(resource, 0) + 1
+            self._rate_limit_usage[resource] = used
+            reset = self._rate_limit_reset
+
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(self.rate_limit - used, 0)),
+            "X-RateLimit-Reset": str(int(reset) + 1),
+            "X-RateLimit-Resource": resource,
+        }
+        return (headers, used > self.rate_limit)
+
+    def respond(self, method, path, body):
+        """Build the response for a request.
+
+        Parameters
+        ----------
+
+        method : str
+          HTTP method of the request.
+
+        path : str
+          Path of the request, including the query string.
+
+        body : bytes
+          Body of the request.
+
+        Returns
+        -------
+
+        tuple : Status, headers and body of the response.
+        """
+        url = urllib.parse.urlparse(path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = url.path.strip("/").split("/")
+
+        if parts[0] == "raw":
+            self._count("raw")
+            return self._raw("/".join(parts[1:3]), "/".join(parts[4:]))
+
+        if parts[0] == "graphql":
+            resource, endpoint = ("graphql", "graphql")
+        elif parts[0] == "search":
+            resource, endpoint = ("search", "search")
+        else:
+            resource, endpoint = ("core", f"{method} {parts[0]}/{parts[-1]}")
+        self._count(endpoint)
+
+        headers, exceeded = self._rate_limit_headers(resource)
+        if exceeded:
+            return (403, headers, {"message": "API rate limit exceeded"})
+
+        if parts[0] == "graphql":
+            return (200, headers, self._graphql(json.loads(body)))
+        elif parts[0] == "search":
+            return (200, headers, {"total_count": 0, "items": []})
+        elif parts[0] == "users":
+            return self._user_repos(parts[1], query, headers)
+
+        repo = "/".join(parts[1:3])
+        if parts[3] == "commits":
+            return (200, headers, self.repos[repo]["head_sha"].encode())
+        elif parts[3] == "pulls" and method == "POST":
+            with self._lock:
+                self.pulls.append(json.loads(body))
+                number = len(self.pulls)
+            return (
+                201,
+                headers,
+                {
+                    "number": number,
+                    "user": {"login": USERNAME},
+                    "html_url": f"{self.url}/{repo}/pull/{number}",
+                },
+            )
+        elif parts[3] == "pulls":
+            return (200, headers, [])
+        elif parts[3] == "git" and method == "POST":
+            # Git Data API, the objects are not stored
+            sha = hashlib.sha1(body).hexdigest()
+            return (201, headers, {"sha": sha})
+        return (404, headers, {"message": "Not Found"})
+
+    def _raw(self, repo, filepath):
+        if repo == CONFIG_REPO:
+            updater = UPDATERS.get(filepath[: -len(".yaml")])
+            if updater is not None:
+                return (200, {}, updater.encode())
+        elif filepath == ".pre-commit-config.yaml" and repo in self.repos:
+            pc_config = self.repos[repo]["pre_commit_config"]
+            if pc_config is not None:
+                return (200, {}, pc_config.encode())
+        return (404, {}, b"404: Not Found")
+
+    def _user_repos(self, username, query, headers):
+        repos = [
+            repo
+            for full_name, repo in self.repos.items()
+            if full_name.split("/")[0] == username
+        ]
+        if not repos:
+            return (404, headers, {"message": "Not Found"})
+
+        per_page, page = (int(query["per_page"]), int(query["page"]))
+        last = max((len(repos) - 1) // per_page + 1, 1)
+        headers = {
+            **headers,
+            "Link": f'<{self.url}/users/{username}/repos?page={last}>; rel="last"',
+        }
+        return (
+            200,
+            headers,
+            [
+                {
+                    "full_name": repo["full_name"],
+                    "default_branch": repo["default_branch"],
+                    "pushed_at": "2022-01-01T00:00:00Z",
+                    "size": 1,
+                    "fork": False,
+                    "archived": False,
+                }
+                for repo in repos[(page - 1) * per_page : page * per_page]
+            ],
+        )
+
+    def _graphql(self, payload):
+        variables = payload["variables"]
+        repos = [
+            repo
+            for full_name, repo in self.repos.items()
+            if full_name.split("/")[0] == variables["login"]
+        ]
+        if not repos:
+            return {"data": {"repositoryOwner": None}}
+
+        start = int(variables["after"] or 0)
+        end = min(start + variables["first"], len(repos))
+        return {
+            "data": {
+                "repositoryOwner": {
+                    "repositories": {
+                        "pageInfo": {
+                            "hasNextPage": end < len(repos),
+                            "endCursor": str(end),
+                        },
+                        "nodes": [
+                            {
+                                "nameWithOwner": repo["full_name"],
+                                "isFork": False,
+                                "isArchived": False,
+                                "pushedAt": "2022-01-01T00:00:00Z",
+                                "diskUsage": 1,
+                                "defaultBranchRef": {
+                                    "name": repo["default_branch"],
+                                    "target": {"oid": repo["head_sha"]},
+                                },
+                                "object": (
+                                    {
+                                        "oid": None,
+                                        "text": repo["pre_commit_config"],
+                                        "isTruncated": False,
+                                    }
+                                    if repo["pre_commit_config"] is not None
+                                    else None
+                                ),
+                            }
+                            for repo in repos[start:end]
+                        ],
+                    }
+                }
+            }
+        }
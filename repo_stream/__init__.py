@@ -1,7 +1,23 @@
 """repo-stream package"""
 
-from repo_stream.update import update
+import sys
 
 
 __all__ = ("update",)
 __version__ = "1.1.0"
+
+
+if sys.version_info < (3, 7):  # module level '__getattr__' not supported
+    from repo_stream.update import update  # noqa: F401
+else:
+
+    def __getattr__(name):
+        # the update machinery is imported when it is used, so the hook
+        # doesn't pay its import time
+        if name == "update":
+            from repo_stream.update import update
+
+            # importing the submodule binds it to the name of the function
+            globals()["update"] = update
+            return update
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
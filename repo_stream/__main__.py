@@ -5,7 +5,6 @@ import os
 import sys
 
 from repo_stream import __version__
-from repo_stream.update import update
 
 
 DESCRIPTION = (
@@ -13,7 +12,29 @@ DESCRIPTION = (
 )
 
 
+def build_hook_parser():
+    # parser of the arguments of the hook, which runs in every commit of the
+    # repositories that define it, so it must not import the update machinery
+    parser = argparse.ArgumentParser(description=DESCRIPTION, add_help=False)
+    parser.add_argument("--hook", action="store_true", dest="hook")
+    parser.add_argument("-config", "--config", dest="ignoreme_config", default=None)
+    parser.add_argument("-updater", "--updater", dest="ignoreme_updater", default=None)
+    return parser
+
+
 def build_parser():
+    from repo_stream.git import GITHUB_GIT_URL
+    from repo_stream.github import GITHUB_API_URL, GITHUB_RAW_URL
+    from repo_stream.metrics import METRICS_FORMATS
+    from repo_stream.resources import DEFAULT_API_SLOTS, DEFAULT_NETWORK_SLOTS
+    from repo_stream.shard import parse_shard
+
+    def shard_type(value):
+        try:
+            return parse_shard(value)
+        except ValueError as err:
+            raise argparse.ArgumentTypeError(str(err)) from None
+
     parser = argparse.ArgumentParser(description=DESCRIPTION)
     parser.add_argument(
         "-v",
@@ -66,6 +87,285 @@ def build_parser():
             " previous commits in the forked branch.",
         ),
     )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        default=None,
+        metavar="PATH",
+        help=(
+            "Directory where Github responses are cached between executions."
+            " Cached responses are revalidated using conditional requests,"
+            " which don't consume Github API rate limit if they haven't changed."
+        ),
+    )
+    parser.add_argument(
+        "--discovery",
+        dest="discovery",
+        default="auto",
+        choices=("auto", "graphql", "rest"),
+        help=(
+            "Backend used to discover repositories and their pre-commit"
+            " configurations. 'graphql' requires a Github token and 'auto'"
+            " uses it when the environment variable GITHUB_TOKEN is defined."
+            " By default 'auto'."
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of pre-commit executions running concurrently. By default 1.",
+    )
+    parser.add_argument(
+        "--network-jobs",
+        dest="network_jobs",
+        type=int,
+        default=DEFAULT_NETWORK_SLOTS,
+        metavar="N",
+        help=(
+            "Number of repositories being cloned or pushed concurrently, while"
+            " pre-commit runs over the repositories already cloned. By"
+            f" default {DEFAULT_NETWORK_SLOTS}."
+        ),
+    )
+    parser.add_argument(
+        "--api-jobs",
+        dest="api_jobs",
+        type=int,
+        default=DEFAULT_API_SLOTS,
+        metavar="N",
+        help=(
+            "Number of requests to the Github API performed concurrently. By"
+            f" default {DEFAULT_API_SLOTS}."
+        ),
+    )
+    parser.add_argument(
+        "--preflight",
+        dest="preflight",
+        action="store_true",
+        help=(
+            "Skip the repositories whose files can't be processed by any hook"
+            " of the updater configuration, checking it in their trees listed"
+            " through the Github API before cloning them."
+        ),
+    )
+    parser.add_argument(
+        "--mirror-cache-dir",
+        dest="mirror_cache_dir",
+        default=None,
+        metavar="PATH",
+        help=(
+            "Directory where bare mirrors of the updated repositories are kept"
+            " between executions, so only new objects are fetched."
+        ),
+    )
+    parser.add_argument(
+        "--mirror-cache-max-age",
+        dest="mirror_cache_max_age",
+        type=float,
+        default=30,
+        metavar="DAYS",
+        help="Remove mirrors not used in this number of days. By default 30.",
+    )
+    parser.add_argument(
+        "--mirror-cache-max-size",
+        dest="mirror_cache_max_size",
+        type=float,
+        default=None,
+        metavar="MB",
+        help=(
+            "Maximum size of the mirrors directory. When exceeded, least"
+            " recently used mirrors are removed."
+        ),
+    )
+    parser.add_argument(
+        "--sparse-clone",
+        action="store_true",
+        dest="sparse_clone",
+        help=(
+            "Only clone and checkout the files that the hooks of the updater"
+            " configurations could process, based on their 'files' and"
+            " 'types' filters. If they can't be determined, repositories are"
+            " fully cloned."
+        ),
+    )
+    parser.add_argument(
+        "--state-file",
+        dest="state_file",
+        default=None,
+        metavar="PATH",
+        help=(
+            "SQLite database where the state of the updates is stored between"
+            " executions. Repositories and updaters not changed since an update"
+            " which didn't produce changes are skipped."
+        ),
+    )
+    parser.add_argument(
+        "--pre-commit-home",
+        dest="pre_commit_home",
+        default=None,
+        metavar="DIR",
+        help=(
+            "Directory where pre-commit hook environments are installed,"
+            " shared by all the updates. By default, the pre-commit's cache"
+            " directory."
+        ),
+    )
+    parser.add_argument(
+        "--commit-mode",
+        dest="commit_mode",
+        default="push",
+        choices=("push", "api"),
+        help=(
+            "How the branches with the changes are created. 'push' commits and"
+            " pushes them, 'api' creates the commits and the branches through"
+            " the Github API without pushing, which requires a Github token."
+            " By default '%(default)s'."
+        ),
+    )
+    parser.add_argument(
+        "--pre-commit-timeout",
+        dest="pre_commit_timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help=(
+            "Seconds after which a pre-commit execution is considered hung and"
+            " the update of the repository fails."
+        ),
+    )
+    parser.add_argument(
+        "--pre-commit-worker-max-jobs",
+        dest="pre_commit_worker_max_jobs",
+        type=int,
+        default=100,
+        metavar="N",
+        help=(
+            "Number of pre-commit executions after which a pre-commit worker"
+            " process is replaced by a new one. By default %(default)s."
+        ),
+    )
+    parser.add_argument(
+        "--pre-commit-cache-key-file",
+        dest="pre_commit_cache_key_file",
+        default=None,
+        metavar="PATH",
+        help=(
+            "File where a key identifying the hook environments of the updater"
+            " configurations used is written after the execution, which can be"
+            " used to persist the pre-commit hook environments directory"
+            " between executions."
+        ),
+    )
+    parser.add_argument(
+        "--only-pre-commit-cache-key",
+        dest="only_pre_commit_cache_key",
+        action="store_true",
+        help=(
+            "Only download the updater configurations of the repositories and"
+            " write the key of their hook environments to the file defined by"
+            " '--pre-commit-cache-key-file', without updating any repository,"
+            " so the hook environments directory can be restored before the"
+            " execution."
+        ),
+    )
+    parser.add_argument(
+        "--api-url",
+        dest="api_url",
+        default=GITHUB_API_URL,
+        metavar="URL",
+        help="URL of the Github API. By default '%(default)s'.",
+    )
+    parser.add_argument(
+        "--raw-url",
+        dest="raw_url",
+        default=GITHUB_RAW_URL,
+        metavar="URL",
+        help=(
+            "URL from which raw files contents of repositories are downloaded."
+            " By default '%(default)s'."
+        ),
+    )
+    parser.add_argument(
+        "--git-url",
+        dest="git_url",
+        default=GITHUB_GIT_URL,
+        metavar="URL",
+        help=(
+            "URL under which the repositories are cloned and pushed. By"
+            " default '%(default)s'."
+        ),
+    )
+    parser.add_argument(
+        "--metrics-file",
+        dest="metrics_file",
+        default=None,
+        metavar="PATH",
+        help=(
+            "File where the time spent in each stage and repository, API"
+            " requests, subprocesses and other counters of the execution are"
+            " written."
+        ),
+    )
+    parser.add_argument(
+        "--metrics-format",
+        dest="metrics_format",
+        default=None,
+        choices=METRICS_FORMATS,
+        help=(
+            "Format of the metrics file. 'prometheus' writes it in the text"
+            " format read by the node exporter textfile collector. By"
+            " default, 'prometheus' for files with extension '.prom' and"
+            " 'json' otherwise."
+        ),
+    )
+    parser.add_argument(
+        "--shard",
+        dest="shard",
+        default=None,
+        type=shard_type,
+        metavar="INDEX/COUNT",
+        help=(
+            "Only update the repositories of a shard, being the repositories"
+            " split in COUNT shards by a stable hash of their names and INDEX"
+            " a number between 1 and COUNT. Useful to distribute the updates"
+            " between several CI jobs."
+        ),
+    )
+    parser.add_argument(
+        "--results-file",
+        dest="results_file",
+        default=None,
+        metavar="PATH",
+        help=(
+            "JSON file where the outcome of the update of each repository is"
+            " written. Results and metrics files of several shards can be"
+            " merged with the 'repo-stream-merge' command."
+        ),
+    )
+    parser.add_argument(
+        "--journal",
+        dest="journal_file",
+        default=None,
+        metavar="PATH",
+        help=(
+            "Append-only file where the progress of the execution is recorded,"
+            " so it can be resumed with '--resume' if it is interrupted."
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        dest="resume",
+        help=(
+            "Resume the interrupted execution recorded in the '--journal' file"
+            " instead of starting from the beginning. The discovered"
+            " repositories and the completed updates are not processed again."
+        ),
+    )
     parser.add_argument(
         "usernames",
         nargs="*",
@@ -77,36 +377,57 @@ def build_parser():
     return parser
 
 
-def parse_args():
+def validate_hook_args(args):
+    if not args.ignoreme_config:
+        sys.stderr.write(
+            "You must define a repository for your configuration file"
+            " using the argument '-config/--config'.\n"
+        )
+        sys.exit(1)
+    if not args.ignoreme_updater:
+        sys.stderr.write(
+            "You must define a configuration file for your updater"
+            " using the argument '-updater/--updater'.\n"
+        )
+        sys.exit(1)
+
+
+def parse_args(argv=None):
     parser = build_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if args.hook:
-        if not args.ignoreme_config:
-            sys.stderr.write(
-                "You must define a repository for your configuration file"
-                " using the argument '-config/--config'.\n"
-            )
-            sys.exit(1)
-        if not args.ignoreme_updater:
-            sys.stderr.write(
-                "You must define a configuration file for your updater"
-                " using the argument '-updater/--updater'.\n"
-            )
-            sys.exit(1)
+        validate_hook_args(args)
     else:
         if not args.usernames:
             sys.stderr.write("You must pass at least one username to scan.\n")
             sys.exit(1)
+        if args.resume and not args.journal_file:
+            sys.stderr.write("You must define a '--journal' file to '--resume'.\n")
+            sys.exit(1)
+        if args.only_pre_commit_cache_key and not args.pre_commit_cache_key_file:
+            sys.stderr.write(
+                "You must define a '--pre-commit-cache-key-file' to"
+                " '--only-pre-commit-cache-key'.\n"
+            )
+            sys.exit(1)
 
     return args
 
 
-def main():
-    args = parse_args()
+def main(argv=None):
+    # fast path for the hook, other arguments are handled by the full parser
+    hook_args, other_args = build_hook_parser().parse_known_args(argv)
+    if hook_args.hook and not other_args:
+        validate_hook_args(hook_args)
+        return 0
+
+    args = parse_args(argv)
     exitcode = 0
     try:
         if not args.hook:
+            from repo_stream import update
+
             repositories_to_ignore = []
             if args.ignore_repositories:
                 if not os.path.isfile(args.ignore_repositories):
@@ -127,6 +448,36 @@ def main():
                 repositories_to_ignore=repositories_to_ignore,
                 dry_run=args.dry_run,
                 clone_depth=args.clone_depth,
+                cache_dir=args.cache_dir,
+                discovery=args.discovery,
+                jobs=args.jobs,
+                network_jobs=args.network_jobs,
+                api_jobs=args.api_jobs,
+                mirror_cache_dir=args.mirror_cache_dir,
+                mirror_cache_max_age=args.mirror_cache_max_age * 24 * 60 * 60,
+                mirror_cache_max_size=(
+                    int(args.mirror_cache_max_size * 1024 * 1024)
+                    if args.mirror_cache_max_size is not None
+                    else None
+                ),
+                sparse_clone=args.sparse_clone,
+                state_file=args.state_file,
+                pre_commit_home=args.pre_commit_home,
+                pre_commit_cache_key_file=args.pre_commit_cache_key_file,
+                api_url=args.api_url,
+                raw_url=args.raw_url,
+                git_url=args.git_url,
+                metrics_file=args.metrics_file,
+                metrics_format=args.metrics_format,
+                shard=args.shard,
+                results_file=args.results_file,
+                journal_file=args.journal_file,
+                resume=args.resume,
+                pre_commit_timeout=args.pre_commit_timeout,
+                pre_commit_worker_max_jobs=args.pre_commit_worker_max_jobs,
+                commit_mode=args.commit_mode,
+                preflight=args.preflight,
+                only_pre_commit_cache_key=args.only_pre_commit_cache_key,
             )
     except Exception:
         raise
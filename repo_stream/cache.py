@@ -0,0 +1,218 @@
+"""Persistent HTTP cache validated with conditional requests."""
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 * 1024
+DEFAULT_CACHE_LOW_WATER_RATIO = 0.9
+
+
+def auth_identity(token):
+    """Get an opaque identity for a Github token, safe to be written to disk.
+
+    Parameters
+    ----------
+
+    token : str
+      Github token. If is ``None``, the identity of anonymous requests is
+      returned.
+
+    Returns
+    -------
+
+    str : Identity of the token.
+    """
+    if token is None:
+        return "anonymous"
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+class HTTPCache:
+    """Cache of HTTP responses stored in a directory.
+
+    Each response is stored in a file named by a hash of the requested URL
+    and the authentication identity, holding a JSON line with the metadata of
+    the response (including ``ETag`` and ``Last-Modified`` validators)
+    followed by the body. Files are evicted by least recent use when the
+    total size of the cache exceeds the maximum size.
+
+    The recency and size of the stored responses are indexed in memory when
+    the cache is opened, so the directory is not walked again to evict them.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_size=DEFAULT_CACHE_MAX_SIZE,
+        low_water_ratio=DEFAULT_CACHE_LOW_WATER_RATIO,
+    ):
+        """Open or create a cache directory.
+
+        Parameters
+        ----------
+
+        directory : str
+          Directory where the responses are stored.
+
+        max_size : int, optional
+          Maximum size in bytes of the cache. When exceeded, the least
+          recently used responses are removed.
+
+        low_water_ratio : float, optional
+          Fraction of ``max_size`` down to which the cache is reduced when
+          the maximum size is exceeded, so each eviction frees room for
+          several responses.
+        """
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        self.low_water_ratio = low_water_ratio
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # sizes of the stored responses, from least to most recently used
+        self._index = collections.OrderedDict(
+            (filepath, size)
+            for filepath, _, size in sorted(self._entries(), key=lambda e: e[1])
+        )
+        self._size = sum(self._index.values())
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith(".cache"):
+                    continue
+                filepath = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(filepath)
+                except FileNotFoundError:
+                    continue
+                yield (filepath, stat.st_mtime, stat.st_size)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.cache")
+
+    @staticmethod
+    def key(url, identity):
+        """Build the key of a response in the cache.
+
+        Parameters
+        ----------
+
+        url : str
+          Requested URL.
+
+        identity : str
+          Authentication identity of the request, as returned by
+          :py:func:`auth_identity`.
+
+        Returns
+        -------
+
+        str : Key of the response.
+        """
+        return hashlib.sha256(f"{identity} {url}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Get a stored response, marking it as recently used.
+
+        Parameters
+        ----------
+
+        key : str
+          Key of the response.
+
+        Returns
+        -------
+
+        dict : Metadata of the response (``status``, ``reason``, ``headers``,
+          ``etag`` and ``last_modified``) and its ``body`` or ``None`` if the
+          response is not stored.
+        """
+        filepath = self._path(key)
+        try:
+            with open(filepath, "rb") as f:
+                entry = json.loads(f.readline().decode("utf-8"))
+                entry["body"] = f.read()
+            os.utime(filepath)
+        except (FileNotFoundError, ValueError):
+            return None
+        with self._lock:
+            if filepath in self._index:
+                self._index.move_to_end(filepath)
+        return entry
+
+    def set(self, key, status, reason, headers, body):
+        """Store a response.
+
+        Responses without ``ETag`` nor ``Last-Modified`` headers are not
+        stored because they can't be validated.
+
+        Parameters
+        ----------
+
+        key : str
+          Key of the response.
+
+        status : int
+          HTTP status code of the response.
+
+        reason : str
+          HTTP reason phrase of the response.
+
+        headers : dict
+          Response headers, with lowercased names.
+
+        body : bytes
+          Response body content.
+        """
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if etag is None and last_modified is None:
+            return
+
+        metadata = json.dumps(
+            {
+                "status": status,
+                "reason": reason,
+                "headers": headers,
+                "etag": etag,
+                "last_modified": last_modified,
+            }
+        ).encode("utf-8")
+
+        filepath = self._path(key)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        fd, tmp_filepath = tempfile.mkstemp(dir=os.path.dirname(filepath))
+        with os.fdopen(fd, "wb") as f:
+            f.write(metadata)
+            f.write(b"\n")
+            f.write(body)
+
+        size = len(metadata) + 1 + len(body)
+        with self._lock:
+            self._size -= self._index.pop(filepath, 0)
+            os.replace(tmp_filepath, filepath)
+            self._index[filepath] = size
+            self._size += size
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        low_water_size = self.max_size * self.low_water_ratio
+        while self._index and self._size > low_water_size:
+            filepath, size = self._index.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+
+    @property
+    def size(self):
+        """Total size in bytes of the stored responses."""
+        return self._size
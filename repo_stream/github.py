@@ -1,11 +1,63 @@
 """Github related utilities."""
 
+import asyncio
+import base64
+import collections
+import concurrent.futures
 import functools
+import http.client
+import io
+import itertools
 import json
-import multiprocessing
 import os
+import threading
 import urllib.parse
-import urllib.request
+from urllib.error import HTTPError
+
+from repo_stream.cache import auth_identity
+from repo_stream.metrics import get_metrics
+from repo_stream.ratelimit import RateLimitScheduler
+from repo_stream.records import RepoRecord
+from repo_stream.resilience import (
+    REQUEST_ERRORS,
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    RetryPolicy,
+)
+
+
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_RAW_URL = "https://raw.githubusercontent.com"
+
+DEFAULT_MAX_REQUESTS_IN_FLIGHT = 16
+RATE_LIMIT_RETRIES = 3
+HEDGE_QUANTILE = 0.95
+# fraction of the requests in flight that can be hedged duplicates
+HEDGE_MAX_IN_FLIGHT_RATIO = 0.1
+USER_AGENT = "repo-stream"
+
+
+def run_sync(coro):
+    """Run a coroutine until completion in a new event loop.
+
+    Parameters
+    ----------
+
+    coro : coroutine
+      Coroutine to execute.
+
+    Returns
+    -------
+
+    object : Value returned by the coroutine.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
 
 
 def repo_url_to_full_name(url):
@@ -52,14 +104,812 @@ def parse_github_pagination(link_header):
     return response
 
 
-def _get_user_repos__request(url):
-    req = urllib.request.Request(url)
-    add_github_auth_headers(req)
-    req = urllib.request.urlopen(req)
-    return json.loads(req.read().decode("utf-8"))
+def add_github_auth_headers(req):
+    """Add Github authentication headers if them are present in environment variables.
+
+    If the environment variable ``GITHUB_TOKEN`` is defined, then an ``Authorization``
+    header is added to a :py:class:`urllib.request.Request` object.
+
+    Parameters
+    ----------
+
+    req : urllib.request.Request
+      HTTP request for which the authentication headers will be included.
+    """
+    GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+    if GITHUB_TOKEN is not None:
+        req.add_header("Authorization", f"token {GITHUB_TOKEN}")
+
+
+class GithubResponse:
+    """HTTP response returned by :py:class:`GithubClient` requests."""
+
+    def __init__(self, url, status, reason, headers, body, from_cache=False):
+        """Store the data of a response.
+
+        Parameters
+        ----------
+
+        url : str
+          Requested URL.
+
+        status : int
+          HTTP status code of the response.
+
+        reason : str
+          HTTP reason phrase of the response.
+
+        headers : dict
+          Response headers, with lowercased names.
+
+        body : bytes
+          Response body content.
+
+        from_cache : bool, optional
+          Indicates if the response has been served from a cache after being
+          validated by the server.
+        """
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.from_cache = from_cache
+
+    def getheader(self, name, default=None):
+        """Get the value of a response header by its case insensitive name."""
+        return self.headers.get(name.lower(), default)
+
+    def text(self):
+        """Decode the body of the response as UTF-8 text."""
+        return self.body.decode("utf-8")
+
+    def json(self):
+        """Decode the body of the response as JSON."""
+        return json.loads(self.text())
+
+
+class _HostConnectionPool:
+    """Keep-alive connections opened against a single host."""
+
+    def __init__(self, scheme, netloc, timeout):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return (self._idle.pop(), True)
+        conn_class = (
+            http.client.HTTPSConnection
+            if self.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        return (conn_class(self.netloc, timeout=self.timeout), False)
+
+    def release(self, conn):
+        with self._lock:
+            self._idle.append(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = (self._idle, [])
+        for conn in idle:
+            conn.close()
+
+
+class GithubClient:
+    """Asynchronous Github client sharing persistent HTTP connections.
+
+    Every request is a coroutine, so many of them can be gathered from the
+    same event loop. The blocking socket work is delegated to a bounded
+    thread pool operating over keep-alive connections (one pool of them per
+    host), so TLS handshakes are paid once per connection instead of once
+    per request and no more than ``max_requests_in_flight`` requests are sent
+    at the same time.
+
+    Idempotent requests failed by transient errors are retried with
+    jittered backoff, slow raw contents downloads are hedged and the
+    idempotent requests to the resources of hosts that keep failing are
+    rejected by a circuit breaker.
+    """
 
+    def __init__(
+        self,
+        token=None,
+        max_requests_in_flight=DEFAULT_MAX_REQUESTS_IN_FLIGHT,
+        api_url=GITHUB_API_URL,
+        raw_url=GITHUB_RAW_URL,
+        timeout=60,
+        cache=None,
+        scheduler=None,
+        retry_policy=None,
+        circuit_breaker=None,
+        hedge_reads=True,
+        max_hedges_in_flight=None,
+    ):
+        """Configure the client.
+
+        Parameters
+        ----------
+
+        token : str, optional
+          Github token used to authenticate API requests. If not defined, the
+          environment variable ``GITHUB_TOKEN`` will be used, if present.
+
+        max_requests_in_flight : int, optional
+          Maximum number of requests being performed concurrently.
+
+        api_url : str, optional
+          Base URL of the Github REST API.
+
+        raw_url : str, optional
+          Base URL from which raw files contents are downloaded.
+
+        timeout : float, optional
+          Timeout in seconds for blocking socket operations.
+
+        cache : repo_stream.cache.HTTPCache, optional
+          Persistent cache for ``GET`` responses. If defined, requests for
+          stored responses are sent as conditional requests and the responses
+          are served from the cache when the server replies with
+          ``304 Not Modified``.
+
+        scheduler : repo_stream.ratelimit.RateLimitScheduler, optional
+          Scheduler through which all the requests to the Github API and the
+          raw contents downloads, accounted as the ``raw`` resource, are
+          sent. By default, a new scheduler is created for the client.
+
+        retry_policy : repo_stream.resilience.RetryPolicy, optional
+          Policy of the retries of idempotent requests that fail with a
+          connection error or a server error. By default, requests are
+          retried 3 times.
+
+        circuit_breaker : repo_stream.resilience.CircuitBreaker, optional
+          Breaker rejecting the idempotent requests to the resources of the
+          hosts that keep failing. By default, a new breaker is created for
+          the client.
+
+        hedge_reads : bool, optional
+          If a raw file content download takes longer than the 95th
+          percentile of the latest downloads, a duplicate request is sent
+          and the first response received is used.
+
+        max_hedges_in_flight : int, optional
+          Maximum number of duplicate requests being performed concurrently,
+          so they don't take the place of other requests. By default, the
+          10% of ``max_requests_in_flight``, at least one.
+        """
+        self._token = token
+        self.max_requests_in_flight = max_requests_in_flight
+        self.api_url = api_url.rstrip("/")
+        self.raw_url = raw_url.rstrip("/")
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.hedge_reads = hedge_reads
+
+        self._raw_latencies = LatencyTracker()
+        if max_hedges_in_flight is None:
+            max_hedges_in_flight = max(
+                1,
+                int(max_requests_in_flight * HEDGE_MAX_IN_FLIGHT_RATIO),
+            )
+        self._hedges = threading.BoundedSemaphore(max_hedges_in_flight)
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_requests_in_flight,
+        )
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+
+    @property
+    def graphql_url(self):
+        """URL of the Github GraphQL API endpoint."""
+        return f"{self.api_url}/graphql"
+
+    @property
+    def token(self):
+        """Github token used to authenticate API requests."""
+        if self._token is not None:
+            return self._token
+        return os.environ.get("GITHUB_TOKEN")
+
+    def _get_pool(self, scheme, netloc):
+        with self._pools_lock:
+            pool = self._pools.get((scheme, netloc))
+            if pool is None:
+                pool = _HostConnectionPool(scheme, netloc, self.timeout)
+                self._pools[(scheme, netloc)] = pool
+            return pool
+
+    def _build_headers(self, url, headers):
+        response = {"User-Agent": USER_AGENT}
+        if url.startswith(self.api_url) and not url.startswith(self.raw_url):
+            response["Accept"] = "application/vnd.github.v3+json"
+            token = self.token
+            if token is not None:
+                response["Authorization"] = f"token {token}"
+        if headers:
+            response.update(headers)
+        return response
+
+    def _send(self, method, url, data, headers):
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += f"?{parsed.query}"
+        pool = self._get_pool(parsed.scheme, parsed.netloc)
+        metrics = get_metrics()
+        start = metrics.clock()
+
+        while True:
+            conn, reused = pool.acquire()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                if reused:
+                    # the server closed an idle keep-alive connection
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                pool.release(conn)
+
+            endpoint = "raw" if url.startswith(self.raw_url) else "api"
+            elapsed = metrics.clock() - start
+            metrics.add_span(f"http_{endpoint}", elapsed)
+            if endpoint == "raw":
+                self._raw_latencies.add(elapsed)
+            metrics.inc(
+                "http_requests",
+                endpoint=endpoint,
+                method=method,
+                status=resp.status,
+            )
+            metrics.inc("http_sent_bytes", len(data or b""), endpoint=endpoint)
+            metrics.inc("http_received_bytes", len(body), endpoint=endpoint)
+            return GithubResponse(
+                url,
+                resp.status,
+                resp.reason,
+                {name.lower(): value for name, value in resp.getheaders()},
+                body,
+            )
 
-def get_user_repos(username, fork=None, repositories_to_ignore=[], per_page=50):
+    def _send_scheduled(self, method, url, data, headers):
+        if url.startswith(self.raw_url):
+            # not limited by the API budgets, but accounted and throttled
+            # if answered with 'Retry-After' headers
+            resource = "raw"
+        else:
+            resource = self.scheduler.resource_class(method, url, self.api_url)
+        if resource is None:
+            return self._send(method, url, data, headers)
+
+        identity = auth_identity(self.token if "Authorization" in headers else None)
+        metrics = get_metrics()
+        for _ in range(RATE_LIMIT_RETRIES):
+            with metrics.span("rate_limit_wait"):
+                self.scheduler.before_request(identity, resource, method)
+            response = self._send(method, url, data, headers)
+            delay = self.scheduler.after_response(
+                identity,
+                resource,
+                response.status,
+                response.headers,
+            )
+            if delay is None:
+                break
+            metrics.inc("rate_limit_retries", resource=resource)
+            with metrics.span("rate_limit_wait"):
+                self.scheduler.sleep(delay)
+        return response
+
+    def _send_resilient(self, method, url, data, headers, idempotent):
+        host = urllib.parse.urlsplit(url).netloc
+        if url.startswith(self.raw_url):
+            endpoint = resource = "raw"
+        else:
+            endpoint = "api"
+            resource = self.scheduler.resource_class(method, url, self.api_url) or "api"
+        # the resources of a host fail independently, like the search API
+        circuit = (host, resource)
+        metrics = get_metrics()
+        attempt = 0
+
+        while True:
+            # the requests with side effects are never rejected, like the
+            # creation of a pull request once its branch has been pushed
+            if idempotent and not self.circuit_breaker.allow(circuit):
+                metrics.inc("http_circuit_rejections", endpoint=endpoint)
+                raise CircuitOpenError(url, host, resource)
+            try:
+                response = self._send_scheduled(method, url, data, headers)
+            except REQUEST_ERRORS:
+                if self.circuit_breaker.record_failure(circuit):
+                    metrics.inc("http_circuit_opened", endpoint=endpoint)
+                if not idempotent or attempt >= self.retry_policy.retries:
+                    raise
+                delay = self.retry_policy.delay(attempt)
+            else:
+                if response.status not in self.retry_policy.statuses:
+                    self.circuit_breaker.record_success(circuit)
+                    return response
+                if self.circuit_breaker.record_failure(circuit):
+                    metrics.inc("http_circuit_opened", endpoint=endpoint)
+                if not idempotent or attempt >= self.retry_policy.retries:
+                    return response
+                delay = self.retry_policy.delay(
+                    attempt,
+                    response.headers.get("retry-after"),
+                )
+
+            metrics.inc("http_retries", endpoint=endpoint)
+            with metrics.span("retry_wait"):
+                self.retry_policy.sleep(delay)
+            attempt += 1
+
+    def _request_sync(self, method, url, data, headers, idempotent):
+        if self.cache is None or method != "GET":
+            return self._send_resilient(method, url, data, headers, idempotent)
+
+        cache_key = self.cache.key(
+            url,
+            auth_identity(self.token if "Authorization" in headers else None),
+        )
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            headers = dict(headers)
+            if cached["etag"] is not None:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"] is not None:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self._send_resilient(method, url, data, headers, idempotent)
+        if response.status == 304 and cached is not None:
+            get_metrics().inc("http_cache_hits")
+            return GithubResponse(
+                url,
+                cached["status"],
+                cached["reason"],
+                {**cached["headers"], **response.headers},
+                cached["body"],
+                from_cache=True,
+            )
+        if response.status == 200:
+            self.cache.set(
+                cache_key,
+                response.status,
+                response.reason,
+                response.headers,
+                response.body,
+            )
+        return response
+
+    async def _hedged(self, loop, call):
+        # send a duplicate of a read slower than most of the latest ones,
+        # returning the first response received
+        primary = loop.run_in_executor(self._executor, call)
+        delay = self._raw_latencies.quantile(HEDGE_QUANTILE)
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        if not self._hedges.acquire(blocking=False):
+            # too many duplicates in flight already
+            get_metrics().inc("http_hedges_skipped")
+            return await primary
+        get_metrics().inc("http_hedged_requests")
+        hedge = self._executor.submit(call)
+        # released when the duplicate finishes or is cancelled before running
+        hedge.add_done_callback(lambda _: self._hedges.release())
+        pending = {primary, asyncio.wrap_future(hedge)}
+        try:
+            while True:
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                if not pending:
+                    # both requests have failed
+                    return primary.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def request(self, method, url, data=None, headers=None, idempotent=None):
+        """Perform an HTTP request.
+
+        Parameters
+        ----------
+
+        method : str
+          HTTP method.
+
+        url : str
+          Absolute URL to request.
+
+        data : bytes, optional
+          Request body content.
+
+        headers : dict, optional
+          Additional request headers.
+
+        idempotent : bool, optional
+          If the request can be sent several times without side effects, so
+          it's retried after transient errors. By default, only ``GET`` and
+          ``HEAD`` requests are considered idempotent.
+
+        Raises
+        ------
+
+        urllib.error.HTTPError : If the response status code is an error.
+
+        repo_stream.resilience.CircuitOpenError : If the request is
+          idempotent and the resource of the host of the URL keeps failing,
+          so the request has not been sent.
+
+        Returns
+        -------
+
+        GithubResponse : Response for the request.
+        """
+        if idempotent is None:
+            idempotent = method in ("GET", "HEAD")
+        loop = asyncio.get_event_loop()
+        call = functools.partial(
+            self._request_sync,
+            method,
+            url,
+            data,
+            self._build_headers(url, headers),
+            idempotent,
+        )
+        if self.hedge_reads and method == "GET" and url.startswith(self.raw_url):
+            response = await self._hedged(loop, call)
+        else:
+            response = await loop.run_in_executor(self._executor, call)
+        if response.status >= 400:
+            raise HTTPError(
+                url,
+                response.status,
+                response.reason,
+                response.headers,
+                io.BytesIO(response.body),
+            )
+        return response
+
+    async def _iter_pages(self, build_url):
+        # the first page is requested to know the number of pages, then the
+        # rest of them are requested concurrently and yielded in order, but
+        # only as many pages as requests in flight are fetched ahead of the
+        # one yielded, so the memory used doesn't grow with the pages
+        first_page = await self.request("GET", build_url(1))
+        link_header = first_page.getheader("Link")
+        yield first_page
+        del first_page
+
+        last = 1 if not link_header else parse_github_pagination(link_header) or 1
+        pages = iter(range(2, last + 1))
+        tasks = collections.deque(
+            asyncio.ensure_future(self.request("GET", build_url(page)))
+            for page in itertools.islice(pages, self.max_requests_in_flight)
+        )
+        try:
+            while tasks:
+                response = await tasks.popleft()
+                for page in itertools.islice(pages, 1):
+                    tasks.append(
+                        asyncio.ensure_future(self.request("GET", build_url(page)))
+                    )
+                yield response
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _get_pages(self, build_url):
+        return [page async for page in self._iter_pages(build_url)]
+
+    async def iter_user_repos(
+        self,
+        username,
+        fork=None,
+        repositories_to_ignore=[],
+        per_page=50,
+    ):
+        """Iterate over the repositories of a Github user giving certain
+        conditions, yielding them as soon as each page is received.
+
+        See :py:func:`get_user_repos` for the documentation of the parameters.
+        """
+        build_url = lambda page: (
+            f"{self.api_url}/users/{username}/repos?per_page={per_page}"
+            f"&sort=updated&page={page}&type=owner"
+        )
+
+        def is_valid_repo(repo_data):
+            if fork is not None:
+                if repo_data["fork"] is not fork:
+                    return False  # booleans must match for this filter
+            if repo_data["archived"]:
+                return False
+            if repo_data["full_name"] in repositories_to_ignore:
+                return False
+            return True
+
+        async for page in self._iter_pages(build_url):
+            for repo in page.json():
+                if is_valid_repo(repo):
+                    yield RepoRecord(
+                        repo["full_name"],
+                        repo["default_branch"],
+                        pushed_at=repo["pushed_at"],
+                        size=repo["size"],
+                        fork=repo["fork"],
+                        archived=repo["archived"],
+                    )
+
+    async def get_user_repos(
+        self,
+        username,
+        fork=None,
+        repositories_to_ignore=[],
+        per_page=50,
+    ):
+        """Get all the repositories of a Github user giving certain conditions.
+
+        See :py:func:`get_user_repos` for the documentation of the parameters.
+        """
+        return [
+            repo
+            async for repo in self.iter_user_repos(
+                username,
+                fork=fork,
+                repositories_to_ignore=repositories_to_ignore,
+                per_page=per_page,
+            )
+        ]
+
+    async def get_branch_head_sha(self, repo, branch):
+        """Get the SHA of the HEAD commit of a branch.
+
+        Parameters
+        ----------
+
+        repo : str
+          Repository full name.
+
+        branch : str
+          Branch name.
+
+        Returns
+        -------
+
+        str : SHA of the HEAD commit of the branch.
+        """
+        response = await self.request(
+            "GET",
+            f"{self.api_url}/repos/{repo}/commits/{branch}",
+            headers={"Accept": "application/vnd.github.v3.sha"},
+        )
+        return response.text().strip()
+
+    async def get_repo_tree(self, repo, ref):
+        """Get the recursive tree of a repository.
+
+        See :py:func:`get_repo_tree` for the documentation of the parameters.
+        """
+        response = await self.request(
+            "GET",
+            f"{self.api_url}/repos/{repo}/git/trees/{ref}?recursive=1",
+        )
+        data = response.json()
+        if data.get("truncated"):
+            return None
+        return [
+            {"path": entry["path"], "mode": entry["mode"], "type": entry["type"]}
+            for entry in data["tree"]
+        ]
+
+    async def download_raw_githubusercontent(self, repo, branch, filename):
+        """Download a raw text file content from a Github repository.
+
+        See :py:func:`download_raw_githubusercontent` for the documentation
+        of the parameters.
+        """
+        file_url = f"{self.raw_url}/{repo.rstrip('/')}/{branch}/{filename}.yaml"
+        return (await self.request("GET", file_url)).text()
+
+    async def create_github_pr(self, repo, title, body, head, base):
+        """Create a pull request for a Github repository.
+
+        See :py:func:`create_github_pr` for the documentation of the
+        parameters.
+        """
+        data = json.dumps(
+            {
+                "title": title,
+                "body": body,
+                "head": head,
+                "base": base,
+            }
+        ).encode()
+        response = await self.request(
+            "POST",
+            f"{self.api_url}/repos/{repo}/pulls",
+            data=data,
+            headers={"Content-Type": "application/json"},
+        )
+        return response.json()
+
+    async def _post_json(self, url, payload):
+        response = await self.request(
+            "POST",
+            url,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        return response.json()
+
+    async def create_git_blob(self, repo, content):
+        """Create a blob in a Github repository.
+
+        Parameters
+        ----------
+
+        repo : str
+          Repository full name.
+
+        content : bytes
+          Content of the blob.
+
+        Returns
+        -------
+
+        str : SHA of the blob.
+        """
+        blob = await self._post_json(
+            f"{self.api_url}/repos/{repo}/git/blobs",
+            {"content": base64.b64encode(content).decode(), "encoding": "base64"},
+        )
+        return blob["sha"]
+
+    async def create_branch_commit(
+        self,
+        repo,
+        branch,
+        base_sha,
+        base_tree,
+        message,
+        files,
+    ):
+        """Create a branch with a commit changing some files through the
+        Git Data API of Github, without pushing them.
+
+        Text files are included directly in the tree and binary files are
+        uploaded as blobs concurrently.
+
+        See :py:func:`create_github_branch_commit` for the documentation of
+        the parameters.
+        """
+
+        async def tree_entry(file):
+            entry = {"path": file["path"], "mode": file["mode"], "type": "blob"}
+            if file["content"] is None:
+                entry["sha"] = None
+            else:
+                try:
+                    entry["content"] = file["content"].decode("utf-8")
+                except UnicodeDecodeError:
+                    entry["sha"] = await self.create_git_blob(repo, file["content"])
+            return entry
+
+        tree = await self._post_json(
+            f"{self.api_url}/repos/{repo}/git/trees",
+            {
+                "base_tree": base_tree,
+                "tree": await asyncio.gather(*[tree_entry(file) for file in files]),
+            },
+        )
+        commit = await self._post_json(
+            f"{self.api_url}/repos/{repo}/git/commits",
+            {"message": message, "tree": tree["sha"], "parents": [base_sha]},
+        )
+        await self._post_json(
+            f"{self.api_url}/repos/{repo}/git/refs",
+            {"ref": f"refs/heads/{branch}", "sha": commit["sha"]},
+        )
+        return commit["sha"]
+
+    async def get_github_prs(self, repo, per_page=100):
+        """Get the data for all opened pull requests from a repository.
+
+        See :py:func:`get_github_prs` for the documentation of the parameters.
+        """
+        pages = await self._get_pages(
+            lambda page: (
+                f"{self.api_url}/repos/{repo}/pulls?per_page={per_page}&page={page}"
+            ),
+        )
+        return [pr for page in pages for pr in page.json()]
+
+    async def search_issues(self, query, per_page=100, total_count=False):
+        """Search issues and pull requests.
+
+        See :py:func:`search_github_issues` for the documentation of the
+        parameters.
+        """
+        quoted_query = urllib.parse.quote_plus(query)
+        pages = await self._get_pages(
+            lambda page: (
+                f"{self.api_url}/search/issues?q={quoted_query}"
+                f"&per_page={per_page}&page={page}"
+            ),
+        )
+        pages_data = [page.json() for page in pages]
+        items = [item for data in pages_data for item in data["items"]]
+        if not total_count:
+            return items
+        found = max(data["total_count"] for data in pages_data)
+        if any(data.get("incomplete_results") for data in pages_data):
+            # the search timed out, more results could be found
+            found = max(found, len(items) + 1)
+        return (found, items)
+
+    def close(self):
+        """Close all the opened connections and stop the requests executor."""
+        self._executor.shutdown(wait=True)
+        with self._pools_lock:
+            pools, self._pools = (self._pools, {})
+        for pool in pools.values():
+            pool.close()
+
+
+_github_client = None
+_github_client_lock = threading.Lock()
+
+
+def get_github_client():
+    """Get the Github client shared by all the utilities of repo-stream.
+
+    Returns
+    -------
+
+    GithubClient : Shared client, created the first time that is requested.
+    """
+    global _github_client
+    with _github_client_lock:
+        if _github_client is None:
+            _github_client = GithubClient()
+        return _github_client
+
+
+def get_user_repos(
+    username,
+    fork=None,
+    repositories_to_ignore=[],
+    per_page=50,
+    client=None,
+):
     """Get all the repositories of a Github user giving certain conditions.
 
     Parameters
@@ -79,74 +929,52 @@ def get_user_repos(username, fork=None, repositories_to_ignore=[], per_page=50):
     per_page : int, optional
       Number of repositories to retrieve in each request to the Github API.
 
+    client : GithubClient, optional
+      Client used to perform the requests. By default the shared client.
+
     Returns
     -------
 
-    list : All the full names of the user repositories.
+    list : Repositories of the user, as
+      :py:class:`repo_stream.records.RepoRecord` instances.
     """
-    response = []
-
-    build_url = lambda page: (
-        f"https://api.github.com/users/{username}/repos?per_page={per_page}"
-        f"&sort=updated&page={page}&type=owner"
-        "&accept=application/vnd.github.v3+json"
+    return run_sync(
+        (client or get_github_client()).get_user_repos(
+            username,
+            fork=fork,
+            repositories_to_ignore=repositories_to_ignore,
+            per_page=per_page,
+        )
     )
 
-    req = urllib.request.Request(build_url(1))
-    add_github_auth_headers(req)
-    req = urllib.request.urlopen(req)
-    link_header = req.getheader("Link")
-    last = 1 if not link_header else parse_github_pagination(link_header)
-    repos = json.loads(req.read().decode("utf-8"))
-
-    def is_valid_repo(repo_data):
-        if fork is not None:
-            if repo["fork"] is not fork:
-                return False  # booleans must match for this filter
-        if repo_data["archived"]:
-            return False
-        if repo_data["full_name"] in repositories_to_ignore:
-            return False
-        return True
-
-    for repo in repos:
-        if is_valid_repo(repo):
-            response.append(repo["full_name"])
-
-    if last > 1:
-        num_cores = multiprocessing.cpu_count()
-        if last - 1 < num_cores:
-            num_cores = last - 1
-        pool = multiprocessing.Pool(processes=num_cores)
-
-        urls = [build_url(page) for page in range(2, last + 1)]
-        for repos in pool.map(_get_user_repos__request, urls):
-            for repo in repos:
-                if is_valid_repo(repo):
-                    response.append(repo["full_name"])
 
-    return response
+def get_repo_tree(repo, ref, client=None):
+    """Get the recursive tree of a repository.
 
+    Parameters
+    ----------
 
-def add_github_auth_headers(req):
-    """Add Github authentication headers if them are present in environment variables.
+    repo : str
+      Repository full name.
 
-    If the environment variable ``GITHUB_TOKEN`` is defined, then an ``Authorization``
-    header is added to a :py:class:`urllib.request.Request` object.
+    ref : str
+      Branch, tag or commit SHA whose tree is listed.
 
-    Parameters
-    ----------
+    client : GithubClient, optional
+      Client used to perform the request. By default the shared client.
 
-    req : urllib.request.Request
-      HTTP request for which the authentication headers will be included.
+    Returns
+    -------
+
+    list : Entries of the tree as dictionaries with the fields ``path``,
+      ``mode`` and ``type``, or ``None`` if the tree is too large to be
+      listed in a single response.
     """
-    GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
-    if GITHUB_TOKEN is not None:
-        req.add_header("Authorization", f"token {GITHUB_TOKEN}")
+    return run_sync((client or get_github_client()).get_repo_tree(repo, ref))
 
 
 @functools.lru_cache(maxsize=None)
-def download_raw_githubusercontent(repo, branch, filename):
+def download_raw_githubusercontent(repo, branch, filename, client=None):
     """Download a raw text file content from a Github repository.
 
     Parameters
@@ -161,20 +989,25 @@ def download_raw_githubusercontent(repo, branch, filename):
     filename : str
       Path to the file inside the repository tree.
 
+    client : GithubClient, optional
+      Client used to perform the request. By default the shared client.
+
 
     Returns
     -------
 
     str : Downloaded content of the file.
     """
-    file_url = (
-        "https://raw.githubusercontent.com/"
-        f"{repo.rstrip('/')}/{branch}/{filename}.yaml"
+    return run_sync(
+        (client or get_github_client()).download_raw_githubusercontent(
+            repo,
+            branch,
+            filename,
+        )
     )
-    return urllib.request.urlopen(file_url).read().decode("utf-8")
 
 
-def create_github_pr(repo, title, body, head, base):
+def create_github_pr(repo, title, body, head, base, client=None):
     """Create a pull request for a Github repository.
 
     Parameters
@@ -194,26 +1027,77 @@ def create_github_pr(repo, title, body, head, base):
 
     base : str
       Name of the branch for which the changes will be applied.
+
+    client : GithubClient, optional
+      Client used to perform the request. By default the shared client.
     """
-    url = f"https://api.github.com/repos/{repo}/pulls"
+    return run_sync(
+        (client or get_github_client()).create_github_pr(
+            repo,
+            title,
+            body,
+            head,
+            base,
+        )
+    )
+
+
+def create_github_branch_commit(
+    repo,
+    branch,
+    base_sha,
+    base_tree,
+    message,
+    files,
+    client=None,
+):
+    """Create a branch with a commit changing some files through the Git Data
+    API of Github, without pushing them.
+
+    Parameters
+    ----------
+
+    repo : str
+      Repository full name.
+
+    branch : str
+      Name of the branch to create.
+
+    base_sha : str
+      SHA of the parent commit.
 
-    data = json.dumps(
-        {
-            "title": title,
-            "body": body,
-            "head": head,
-            "base": base,
-        }
-    ).encode()
+    base_tree : str
+      SHA of the tree of the parent commit.
 
-    req = urllib.request.Request(url, data=data, method="POST")
-    add_github_auth_headers(req)
+    message : str
+      Commit message.
 
-    req = urllib.request.urlopen(req)
-    return json.loads(req.read().decode("utf-8"))
+    files : list
+      Changed files as dictionaries with the fields ``path``, ``mode`` and
+      ``content`` (bytes, ``None`` for deleted files), as returned by
+      :py:func:`repo_stream.git.git_working_tree_changes`.
 
+    client : GithubClient, optional
+      Client used to perform the requests. By default the shared client.
 
-def get_github_prs(repo):
+    Returns
+    -------
+
+    str : SHA of the created commit.
+    """
+    return run_sync(
+        (client or get_github_client()).create_branch_commit(
+            repo,
+            branch,
+            base_sha,
+            base_tree,
+            message,
+            files,
+        )
+    )
+
+
+def get_github_prs(repo, per_page=100, client=None):
     """Get the data for all opened pull requests from a repository.
 
     Parameters
@@ -221,17 +1105,56 @@ def get_github_prs(repo):
 
     repo : str
       Repository full name from which the opened pull requests will be returned.
+
+    per_page : int, optional
+      Number of pull requests to retrieve in each request to the Github API.
+
+    client : GithubClient, optional
+      Client used to perform the requests. By default the shared client.
     """
-    url = f"https://api.github.com/repos/{repo}/pulls"
+    return run_sync(
+        (client or get_github_client()).get_github_prs(repo, per_page=per_page)
+    )
 
-    req = urllib.request.Request(url)
-    add_github_auth_headers(req)
 
-    req = urllib.request.urlopen(req)
-    return json.loads(req.read().decode("utf-8"))
+def search_github_issues(query, per_page=100, client=None, total_count=False):
+    """Search issues and pull requests using the Github search API.
 
+    The search API only returns up to 1000 results for a query.
+
+    Parameters
+    ----------
 
-def get_github_prs_number_head_body(repo):
+    query : str
+      Search query, like ``is:pr is:open user:mondeja``.
+
+    per_page : int, optional
+      Number of results to retrieve in each request to the Github API.
+
+    client : GithubClient, optional
+      Client used to perform the requests. By default the shared client.
+
+    total_count : bool, optional
+      Also return the total number of results matching the query, which is
+      greater than the number of results retrieved if the search API has
+      not returned all of them.
+
+    Returns
+    -------
+
+    list : Issues and pull requests found. If ``total_count`` is ``True``,
+      a tuple with the total number of results and the results retrieved.
+    """
+    return run_sync(
+        (client or get_github_client()).search_issues(
+            query,
+            per_page=per_page,
+            total_count=total_count,
+        )
+    )
+
+
+def get_github_prs_number_head_body(repo, client=None):
     """Get opened pull requests numbers, head reference name and message body
     content for a repository.
 
@@ -240,7 +1163,11 @@ def get_github_prs_number_head_body(repo):
 
     repo : str
       Repository full name from which the opened pull requests will be returned.
+
+    client : GithubClient, optional
+      Client used to perform the request. By default the shared client.
     """
     return [
-        (pr["number"], pr["head"]["ref"], pr["body"]) for pr in get_github_prs(repo)
+        (pr["number"], pr["head"]["ref"], pr["body"] or "")
+        for pr in get_github_prs(repo, client=client)
     ]
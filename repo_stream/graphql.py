@@ -0,0 +1,245 @@
+"""Github GraphQL API utilities."""
+
+import json
+from urllib.error import HTTPError
+
+from repo_stream.records import RepoRecord
+
+
+DISCOVERY_QUERY = """
+query($login: String!, $first: Int!, $after: String, $isFork: Boolean) {
+  repositoryOwner(login: $login) {
+    repositories(
+      first: $first
+      after: $after
+      isFork: $isFork
+      privacy: PUBLIC
+      ownerAffiliations: OWNER
+      orderBy: {field: UPDATED_AT, direction: DESC}
+    ) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      nodes {
+        nameWithOwner
+        isPrivate
+        isFork
+        isArchived
+        pushedAt
+        diskUsage
+        defaultBranchRef {
+          name
+          target {
+            oid
+          }
+        }
+        object(expression: "HEAD:.pre-commit-config.yaml") {
+          ... on Blob {
+            oid
+            text
+            isTruncated
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+class GraphQLError(Exception):
+    """Errors returned by the Github GraphQL API."""
+
+    def __init__(self, errors):
+        """Store the errors returned by the API.
+
+        Parameters
+        ----------
+
+        errors : list
+          Errors returned in the ``errors`` field of the response.
+        """
+        self.errors = errors
+        super().__init__(
+            "; ".join(error.get("message", str(error)) for error in errors)
+        )
+
+
+async def graphql_request(client, query, variables):
+    """Execute a query against the Github GraphQL API.
+
+    Parameters
+    ----------
+
+    client : repo_stream.github.GithubClient
+      Client used to perform the request.
+
+    query : str
+      GraphQL query.
+
+    variables : dict
+      Variables of the query.
+
+    Raises
+    ------
+
+    GraphQLError : If the response contains errors.
+
+    Returns
+    -------
+
+    dict : ``data`` field of the response.
+    """
+    response = await client.request(
+        "POST",
+        client.graphql_url,
+        data=json.dumps({"query": query, "variables": variables}).encode(),
+        headers={"Content-Type": "application/json"},
+        # queries don't modify anything, so they can be retried
+        idempotent=True,
+    )
+    content = response.json()
+    if content.get("errors"):
+        raise GraphQLError(content["errors"])
+    return content["data"]
+
+
+async def iter_discover_user_repos(
+    client,
+    username,
+    fork=None,
+    repositories_to_ignore=[],
+    per_query=100,
+):
+    """Iterate over the repositories of a Github user discovered using the
+    GraphQL API, yielding them as soon as each query is answered.
+
+    See :py:func:`discover_user_repos` for the documentation of the
+    parameters.
+    """
+    after = None
+
+    while True:
+        data = await graphql_request(
+            client,
+            DISCOVERY_QUERY,
+            {
+                "login": username,
+                "first": per_query,
+                "after": after,
+                "isFork": fork,
+            },
+        )
+        owner = data["repositoryOwner"]
+        if owner is None:
+            raise HTTPError(
+                client.graphql_url,
+                404,
+                f"User '{username}' not found",
+                {},
+                None,
+            )
+        repositories = owner["repositories"]
+
+        for node in repositories["nodes"]:
+            # only public repositories are discovered, like using the REST API
+            if node.get("isPrivate"):
+                continue
+            if node["isArchived"] or node["defaultBranchRef"] is None:
+                continue
+            if node["nameWithOwner"] in repositories_to_ignore:
+                continue
+
+            repo = RepoRecord(
+                node["nameWithOwner"],
+                node["defaultBranchRef"]["name"],
+                pushed_at=node["pushedAt"],
+                size=node["diskUsage"],
+                fork=node["isFork"],
+                archived=node["isArchived"],
+                head_sha=node["defaultBranchRef"]["target"]["oid"],
+            )
+            blob = node["object"]
+            repo.pre_commit_config_sha = blob.get("oid") if blob else None
+            if not blob or blob.get("text") is None:
+                repo.pre_commit_config = None
+            elif blob["isTruncated"]:
+                repo.pre_commit_config = (
+                    await client.request(
+                        "GET",
+                        f"{client.raw_url}/{repo.full_name}/"
+                        f"{repo.default_branch}/.pre-commit-config.yaml",
+                    )
+                ).text()
+            else:
+                repo.pre_commit_config = blob["text"]
+            yield repo
+
+        if not repositories["pageInfo"]["hasNextPage"]:
+            break
+        after = repositories["pageInfo"]["endCursor"]
+
+
+async def discover_user_repos(
+    client,
+    username,
+    fork=None,
+    repositories_to_ignore=[],
+    per_query=100,
+):
+    """Discover the public repositories of a Github user together with their
+    default branches and pre-commit configurations using the GraphQL API.
+
+    Private repositories readable with the token of the client are not
+    returned, so the same repositories are discovered as using
+    :py:func:`repo_stream.github.get_user_repos`.
+
+    The data for up to ``per_query`` repositories is retrieved in each query,
+    so the pre-commit configurations of all the repositories of a user are
+    obtained in a few round trips.
+
+    Parameters
+    ----------
+
+    client : repo_stream.github.GithubClient
+      Client used to perform the requests.
+
+    username : str
+      Github user or organization whose repositories will be returned.
+
+    fork : bool, optional
+      If is ``True``, only forked repositories will be returned, if is
+      ``False``, only non forked repositories will be returned and being
+      ``None`` both forked and unforked repositories will be returned.
+
+    repositories_to_ignore : list, optional
+      Full name of repositories which will not be included in the response.
+
+    per_query : int, optional
+      Number of repositories to retrieve in each query, up to 100.
+
+    Raises
+    ------
+
+    urllib.error.HTTPError : With code 404 if the user does not exist.
+
+    Returns
+    -------
+
+    list : Repositories of the user, as
+      :py:class:`repo_stream.records.RepoRecord` instances which include the
+      SHA of the HEAD of the default branch, the content of the
+      ``.pre-commit-config.yaml`` file of the repository, ``None`` if the
+      repository does not have one, and the blob SHA of that file.
+    """
+    return [
+        repo
+        async for repo in iter_discover_user_repos(
+            client,
+            username,
+            fork=fork,
+            repositories_to_ignore=repositories_to_ignore,
+            per_query=per_query,
+        )
+    ]
@@ -0,0 +1,435 @@
+"""Utilities to inspect the hooks of repo-stream updater configurations."""
+
+import posixpath
+import re
+
+import yaml
+from identify import extensions, identify
+
+from repo_stream.scanner import load_yaml
+
+
+# tags that can't be known from the name of a file
+_CONTENT_TAGS = {
+    "file",
+    "text",
+    "binary",
+    "executable",
+    "non-executable",
+    "symlink",
+    "directory",
+}
+
+# default values of the filters of pre-commit hooks
+_HOOK_FILTERS_DEFAULTS = {
+    "files": "",
+    "exclude": "^$",
+    "types": ["file"],
+    "types_or": [],
+    "exclude_types": [],
+    "always_run": False,
+}
+
+# modes of the entries of GIT trees
+_SYMLINK_MODE = "120000"
+_EXECUTABLE_MODE = "100755"
+_SUBMODULE_MODE = "160000"
+
+_GITHUB_REPO_URL_RE = re.compile(
+    r"^https://github\.com/([^/]+/[^/]+?)(?:\.git)?/?$",
+)
+
+_ESCAPED_CHARACTER_RE = re.compile(r"\\(.)")
+_REGEX_METACHARACTERS = set(".^$*+?{}[]\\|()")
+
+
+def updater_hooks(updater_content):
+    """Get the hooks defined in a pre-commit updater configuration.
+
+    Parameters
+    ----------
+
+    updater_content : str
+      Content of the pre-commit updater configuration file.
+
+    Returns
+    -------
+
+    list : Hooks definitions, as dictionaries.
+    """
+    response = []
+    for repo in (load_yaml(updater_content) or {}).get("repos", []):
+        response.extend(repo.get("hooks", []))
+    return response
+
+
+def _regex_literal(regex):
+    literal = _ESCAPED_CHARACTER_RE.sub("", regex)
+    if any(character in _REGEX_METACHARACTERS for character in literal):
+        return None
+    return _ESCAPED_CHARACTER_RE.sub(r"\1", regex)
+
+
+def _split_regex_alternatives(regex):
+    response, depth, current, escaped = ([], 0, "", False)
+    for character in regex:
+        if escaped:
+            escaped = False
+        elif character == "\\":
+            escaped = True
+        elif character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+        elif character == "|" and depth == 0:
+            response.append(current)
+            current = ""
+            continue
+        current += character
+    response.append(current)
+    return response
+
+
+def files_regex_sparse_patterns(regex):
+    r"""Convert a pre-commit ``files`` regex into sparse checkout patterns.
+
+    Only regexes composed by literal paths, prefixes or suffixes, optionally
+    joined by alternations, can be converted. For example, the regex
+    ``^setup\.cfg$|\.py$`` is converted into the patterns ``/setup.cfg``
+    and ``*.py``.
+
+    Parameters
+    ----------
+
+    regex : str
+      Regular expression matched by pre-commit against files paths.
+
+    Returns
+    -------
+
+    list : Sparse checkout patterns matching at least all the files that
+      the regex matches, or ``None`` if they can't be determined.
+    """
+    if regex.startswith("(") and regex.endswith(")") and regex.count("(") == 1:
+        regex = regex[1:-1]
+
+    response = []
+    for alternative in _split_regex_alternatives(regex):
+        starts = alternative.startswith("^")
+        if starts:
+            alternative = alternative[1:]
+        ends = alternative.endswith("$") and not alternative.endswith("\\$")
+        if ends:
+            alternative = alternative[:-1]
+        elif alternative.endswith(".*"):
+            alternative = alternative[:-2]
+
+        literal = _regex_literal(alternative)
+        if not literal or (not starts and not ends):
+            return None
+
+        if starts and ends:
+            response.append(f"/{literal}")
+        elif starts:
+            response.extend([f"/{literal}*", f"/{literal}*/**"])
+        elif "/" in literal:
+            response.append(f"**/*{literal}")
+        else:
+            response.append(f"*{literal}")
+    return response
+
+
+def types_sparse_patterns(types=None, types_or=None):
+    """Convert pre-commit ``types`` and ``types_or`` hook filters into sparse
+    checkout patterns, based on the extensions and file names known by
+    `identify <https://github.com/pre-commit/identify>`_.
+
+    Files identified only by their shebang are not matched by the patterns.
+
+    Parameters
+    ----------
+
+    types : list, optional
+      Tags that must match all the files processed by the hook.
+
+    types_or : list, optional
+      Tags from which at least one must match the files processed by the
+      hook.
+
+    Returns
+    -------
+
+    list : Sparse checkout patterns or ``None`` if they can't be determined.
+    """
+    types = set(types or []) - {"file"}
+    types_or = set(types_or or [])
+    if not types and not types_or:
+        return None
+    if types & _CONTENT_TAGS or types_or & _CONTENT_TAGS:
+        return None
+
+    def tags_match(tags):
+        if not types.issubset(tags):
+            return False
+        return not types_or or bool(types_or & tags)
+
+    response = [
+        f"*.{extension}"
+        for extension, tags in sorted(extensions.EXTENSIONS.items())
+        if tags_match(tags)
+    ]
+    response.extend(
+        name for name, tags in sorted(extensions.NAMES.items()) if tags_match(tags)
+    )
+    return response or None
+
+
+def sparse_checkout_patterns(updater_content):
+    """Compute the sparse checkout patterns needed to run the hooks of a
+    pre-commit updater configuration against a repository.
+
+    The patterns are computed from the ``files`` or ``types``/``types_or``
+    filters defined for each hook in the configuration. Hooks defined
+    without them, or which are always run or don't receive files names,
+    could need any file of the repository.
+
+    Parameters
+    ----------
+
+    updater_content : str
+      Content of the pre-commit updater configuration file.
+
+    Returns
+    -------
+
+    list : Sparse checkout patterns or ``None`` if a full checkout is needed.
+    """
+    response = set()
+    for hook in updater_hooks(updater_content):
+        if hook.get("always_run") or hook.get("pass_filenames") is False:
+            return None
+
+        patterns = None
+        if hook.get("files"):
+            patterns = files_regex_sparse_patterns(hook["files"])
+        if patterns is None:
+            patterns = types_sparse_patterns(
+                types=hook.get("types"),
+                types_or=hook.get("types_or"),
+            )
+        if patterns is None:
+            return None
+        response.update(patterns)
+    return sorted(response) or None
+
+
+def _load_config(content):
+    # parse a pre-commit configuration, returning ``None`` if it's invalid
+    try:
+        config = load_yaml(content)
+    except yaml.YAMLError:
+        return None
+    return config if isinstance(config, dict) else None
+
+
+def parse_hooks_manifest(content):
+    """Parse the manifest of the hooks of a repository, its
+    ``.pre-commit-hooks.yaml`` file.
+
+    Parameters
+    ----------
+
+    content : str
+      Content of the manifest.
+
+    Returns
+    -------
+
+    list : Hooks definitions, as dictionaries, or ``None`` if the manifest
+      is invalid.
+    """
+    try:
+        hooks = load_yaml(content)
+    except yaml.YAMLError:
+        return None
+    if not isinstance(hooks, list) or not all(isinstance(h, dict) for h in hooks):
+        return None
+    return hooks
+
+
+def hooks_manifests_locations(updater_content):
+    """Get the Github repositories and revisions of the hooks of a pre-commit
+    updater configuration, where their manifests are defined.
+
+    Parameters
+    ----------
+
+    updater_content : str
+      Content of the pre-commit updater configuration file.
+
+    Returns
+    -------
+
+    list : Full names and revisions of the repositories hosted at Github, as
+      tuples. Local hooks don't need manifests and the rest of repositories
+      are not included.
+    """
+    response = []
+    for repo in (_load_config(updater_content) or {}).get("repos", []):
+        match = _GITHUB_REPO_URL_RE.match(str(repo.get("repo", "")))
+        if match and repo.get("rev"):
+            location = (match.group(1), str(repo["rev"]))
+            if location not in response:
+                response.append(location)
+    return response
+
+
+def hooks_filters(updater_content, manifests):
+    """Compute the filters that select the files processed by the hooks of a
+    pre-commit updater configuration.
+
+    The filters of each hook are the ones defined in the configuration,
+    falling back to the ones defined in the manifest of its repository.
+
+    Parameters
+    ----------
+
+    updater_content : str
+      Content of the pre-commit updater configuration file.
+
+    manifests : dict
+      Hooks defined by the manifests (``.pre-commit-hooks.yaml`` files) of
+      the repositories of the configuration, being the keys the locations
+      returned by :py:func:`hooks_manifests_locations` and the values lists
+      of hooks definitions or ``None`` if they are not known.
+
+    Returns
+    -------
+
+    dict : Global ``files`` and ``exclude`` regexes of the configuration and
+      filters of each hook under ``hooks``, or ``None`` if the filters of
+      some hook can't be known.
+    """
+    config = _load_config(updater_content)
+    if config is None:
+        return None
+    response = {
+        "files": config.get("files", _HOOK_FILTERS_DEFAULTS["files"]),
+        "exclude": config.get("exclude", _HOOK_FILTERS_DEFAULTS["exclude"]),
+        "hooks": [],
+    }
+    for repo in config.get("repos", []):
+        if repo.get("repo") == "local":
+            manifest_hooks = {}
+        else:
+            match = _GITHUB_REPO_URL_RE.match(str(repo.get("repo", "")))
+            if not match or not repo.get("rev"):
+                return None
+            hooks = manifests.get((match.group(1), str(repo["rev"])))
+            if hooks is None:
+                return None
+            manifest_hooks = {hook.get("id"): hook for hook in hooks}
+
+        for hook in repo.get("hooks", []):
+            if repo.get("repo") != "local" and hook.get("id") not in manifest_hooks:
+                return None
+            definition = {**manifest_hooks.get(hook.get("id"), {}), **hook}
+            response["hooks"].append(
+                {
+                    name: definition.get(name, default)
+                    for name, default in _HOOK_FILTERS_DEFAULTS.items()
+                }
+            )
+    return response
+
+
+def _tree_entry_tags(entry):
+    # tags that pre-commit could identify for the file of a tree entry,
+    # returning the ones that are known and the ones that are possible, or
+    # ``None`` if any tag is possible
+    if entry["mode"] == _SYMLINK_MODE:
+        return ({"symlink"}, {"symlink"})
+    if entry["mode"] == _SUBMODULE_MODE:
+        return ({"directory"}, {"directory"})
+
+    executable = entry["mode"] == _EXECUTABLE_MODE
+    tags = {"file", "executable" if executable else "non-executable"}
+    tags.update(identify.tags_from_filename(posixpath.basename(entry["path"])))
+    if executable and tags <= {"file", "executable", "text", "binary"}:
+        # could be identified by its shebang
+        return (tags, None)
+    if "text" in tags or "binary" in tags:
+        return (tags, tags)
+    # text or binary depending on the content
+    return (tags, tags | {"text", "binary"})
+
+
+def _hook_can_process(hook, path, known_tags, possible_tags):
+    if not hook["files"].search(path) or hook["exclude"].search(path):
+        return False
+    if set(hook["exclude_types"]) & known_tags:
+        return False
+    if possible_tags is None:
+        return True
+    if not set(hook["types"]) <= possible_tags:
+        return False
+    return not hook["types_or"] or bool(set(hook["types_or"]) & possible_tags)
+
+
+def hooks_can_apply(filters, tree):
+    """Check if any hook could be run by pre-commit against a repository,
+    given the filters of the hooks and the tree of the repository.
+
+    The result is conservative, files whose tags depend on their contents
+    are considered to match all of them.
+
+    Parameters
+    ----------
+
+    filters : dict
+      Filters of the hooks, as returned by :py:func:`hooks_filters`.
+
+    tree : list
+      Entries of the recursive tree of the repository, as dictionaries with
+      the fields ``path``, ``mode`` and ``type``, like the ones returned by
+      the Github API.
+
+    Returns
+    -------
+
+    bool : If at least one hook would be run.
+    """
+    hooks = []
+    for hook in filters["hooks"]:
+        if hook["always_run"]:
+            return True
+        try:
+            hooks.append(
+                {
+                    **hook,
+                    "files": re.compile(hook["files"]),
+                    "exclude": re.compile(hook["exclude"]),
+                }
+            )
+        except (re.error, TypeError):
+            return True
+    if not hooks:
+        return False
+
+    try:
+        files_re = re.compile(filters["files"])
+        exclude_re = re.compile(filters["exclude"])
+    except (re.error, TypeError):
+        return True
+
+    for entry in tree:
+        if entry["type"] == "tree":
+            continue
+        path = entry["path"]
+        if not files_re.search(path) or exclude_re.search(path):
+            continue
+        known_tags, possible_tags = _tree_entry_tags(entry)
+        for hook in hooks:
+            if _hook_can_process(hook, path, known_tags, possible_tags):
+                return True
+    return False
@@ -0,0 +1,264 @@
+"""Progress journal of repo-stream updates, used to resume interrupted runs."""
+
+import json
+import os
+import sys
+import threading
+import time
+
+from repo_stream.records import NOT_FETCHED, RepoRecord
+from repo_stream.scanner import REPO_STREAM_HOOK_ID
+
+
+# fields of the discovered repositories needed to resume their updates
+REPO_FIELDS = (
+    "full_name",
+    "default_branch",
+    "pushed_at",
+    "size",
+    "head_sha",
+    "pre_commit_config_sha",
+)
+
+
+def _read_records(path):
+    # returns the records and the size of the file up to the last one
+    records, size = ([], 0)
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError
+                    records.append(json.loads(line.decode("utf-8")))
+                except ValueError:
+                    # incomplete line written by a process that died
+                    break
+                size += len(line)
+    except FileNotFoundError:
+        pass
+    return (records, size)
+
+
+class Journal:
+    """Append-only file recording the progress of an update run.
+
+    Each line is a JSON record: the parameters of the run, the repositories
+    discovered for each user, the repositories without repo-stream hooks and
+    the final outcome of each update. Every record is flushed as soon as it
+    is written, so the journal survives the crash of the process and a new
+    run can resume the interrupted one.
+    """
+
+    def __init__(self, path, run, resume=False):
+        """Open a journal.
+
+        Parameters
+        ----------
+
+        path : str
+          Path to the journal file.
+
+        run : dict
+          JSON serializable parameters identifying the run, like the users
+          updated. A journal can only be resumed by a run with the same
+          parameters.
+
+        resume : bool, optional
+          Resume the run recorded in the journal, if it was interrupted and
+          was executed with the same parameters. Otherwise, the journal is
+          started from scratch.
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        dirpath = os.path.dirname(self.path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+
+        self.resumed = False
+        self._discovering_users = {}
+        self._discovered_users = {}
+        self._checked_repos = set()
+        self._updates = {}
+        self._lock = threading.Lock()
+
+        header = {"type": "run", **json.loads(json.dumps(run))}
+        records, size = _read_records(self.path) if resume else ([], 0)
+        if records and records[0] == header:
+            if records[-1]["type"] != "finished":
+                self._load(records[1:])
+                self.resumed = True
+        elif records:
+            sys.stderr.write(
+                f"Journal '{self.path}' was written by a run with other"
+                " parameters, starting from the beginning.\n"
+            )
+
+        if self.resumed:
+            self._file = open(self.path, "a")
+            self._file.truncate(size)
+        else:
+            self._file = open(self.path, "w")
+            self._write(header)
+
+    def _load(self, records):
+        for record in records:
+            if record["type"] == "repo":
+                self._discovering_users.setdefault(record["user"], []).append(
+                    RepoRecord.from_dict(record["repo"])
+                )
+            elif record["type"] == "discovered":
+                self._discovered_users[record["user"]] = self._discovering_users.pop(
+                    record["user"], []
+                )
+            elif record["type"] == "checked":
+                self._checked_repos.add(record["repo"])
+            elif record["type"] == "update":
+                key = (record["repo"], record["config"], record["updater"])
+                self._updates[key] = record["outcome"]
+        # users whose discovery was interrupted are discovered again
+        self._discovering_users = {}
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def discovered_repos(self, username):
+        """Get the repositories discovered for a user in the resumed run.
+
+        Parameters
+        ----------
+
+        username : str
+          User whose repositories were discovered.
+
+        Returns
+        -------
+
+        list : Repositories of the user or ``None`` if their discovery was
+          not completed.
+        """
+        return self._discovered_users.get(username)
+
+    def add_repo(self, username, repo):
+        """Record a discovered repository.
+
+        Parameters
+        ----------
+
+        username : str
+          User whose repositories are being discovered.
+
+        repo : repo_stream.records.RepoRecord
+          Discovered repository.
+        """
+        journal_repo = {field: getattr(repo, field) for field in REPO_FIELDS}
+        if repo.pre_commit_config is not NOT_FETCHED:
+            # configurations without repo-stream hooks are not needed
+            pc_config = repo.pre_commit_config
+            journal_repo["pre_commit_config"] = (
+                pc_config
+                if pc_config is not None and REPO_STREAM_HOOK_ID in pc_config
+                else None
+            )
+        self._write({"type": "repo", "user": username, "repo": journal_repo})
+
+    def user_discovered(self, username):
+        """Record that all the repositories of a user have been discovered.
+
+        Parameters
+        ----------
+
+        username : str
+          User whose repositories have been discovered.
+        """
+        self._write({"type": "discovered", "user": username})
+
+    def is_checked(self, repo):
+        """Check if a repository was found without repo-stream hooks in the
+        resumed run.
+
+        Parameters
+        ----------
+
+        repo : str
+          Full name of the repository.
+
+        Returns
+        -------
+
+        bool : If the repository doesn't need to be checked again.
+        """
+        return repo in self._checked_repos
+
+    def repo_checked(self, repo):
+        """Record that a repository doesn't define repo-stream hooks.
+
+        Parameters
+        ----------
+
+        repo : str
+          Full name of the repository.
+        """
+        self._write({"type": "checked", "repo": repo})
+
+    def update_outcome(self, repo, config, updater):
+        """Get the outcome of an update completed in the resumed run.
+
+        Parameters
+        ----------
+
+        repo : str
+          Full name of the updated repository.
+
+        config : str
+          Full name of the repo-stream configuration repository.
+
+        updater : str
+          Name of the updater configuration file, without extension.
+
+        Returns
+        -------
+
+        str : Outcome of the update or ``None`` if it was not completed.
+        """
+        return self._updates.get((repo, config, updater))
+
+    def add_update(self, repo, config, updater, outcome):
+        """Record the final outcome of an update.
+
+        Parameters
+        ----------
+
+        repo : str
+          Full name of the updated repository.
+
+        config : str
+          Full name of the repo-stream configuration repository.
+
+        updater : str
+          Name of the updater configuration file, without extension.
+
+        outcome : str
+          Outcome of the update.
+        """
+        self._write(
+            {
+                "type": "update",
+                "repo": repo,
+                "config": config,
+                "updater": updater,
+                "outcome": outcome,
+                "at": time.time(),
+            }
+        )
+
+    def finish(self):
+        """Record that the run has been completed, so it is not resumed."""
+        self._write({"type": "finished"})
+
+    def close(self):
+        """Close the journal file."""
+        with self._lock:
+            os.fsync(self._file.fileno())
+            self._file.close()
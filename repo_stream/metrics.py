@@ -0,0 +1,460 @@
+"""Instrumentation of repo-stream executions."""
+
+import bisect
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+DEFAULT_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+METRICS_FORMATS = ("json", "prometheus")
+PROMETHEUS_PREFIX = "repo_stream_"
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _prometheus_labels(labels_key, **extra_labels):
+    labels = [*labels_key, *extra_labels.items()]
+    if not labels:
+        return ""
+    escaped_labels = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped_labels) + "}"
+
+
+class Metrics:
+    """Timing spans, counters, gauges and histograms of an execution.
+
+    Spans measure the time spent in each stage, optionally for a repository.
+    All the methods are thread safe.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=time.perf_counter):
+        """Create an empty set of metrics.
+
+        Parameters
+        ----------
+
+        buckets : tuple, optional
+          Upper bounds of the buckets of the histograms.
+
+        clock : callable, optional
+          Function returning the current time in seconds.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.clock = clock
+
+        self._spans = {}
+        self._repos_spans = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, repo=None):
+        """Measure the time spent inside a ``with`` block.
+
+        Parameters
+        ----------
+
+        name : str
+          Name of the span, like the name of the stage measured.
+
+        repo : str, optional
+          Full name of the repository processed inside the span.
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add_span(name, self.clock() - start, repo=repo)
+
+    @contextlib.contextmanager
+    def subprocess_span(self, program, command):
+        """Count a subprocess execution and measure its duration.
+
+        Parameters
+        ----------
+
+        program : str
+          Name of the executed program, like ``git``.
+
+        command : str
+          Subcommand executed, like ``clone``.
+        """
+        self.inc("subprocesses", program=program, command=command)
+        with self.span(f"{program}_{command}"):
+            yield
+
+    def add_span(self, name, seconds, repo=None):
+        """Record the duration of a span measured externally.
+
+        Parameters
+        ----------
+
+        name : str
+          Name of the span.
+
+        seconds : float
+          Duration of the span.
+
+        repo : str, optional
+          Full name of the repository processed inside the span.
+        """
+        with self._lock:
+            span = self._spans.setdefault(name, {"count": 0, "sum": 0, "max": 0})
+            span["count"] += 1
+            span["sum"] += seconds
+            span["max"] = max(span["max"], seconds)
+            if repo is not None:
+                repo_spans = self._repos_spans.setdefault(repo, {})
+                repo_spans[name] = repo_spans.get(name, 0) + seconds
+
+    def inc(self, name, value=1, **labels):
+        """Increase a counter.
+
+        Parameters
+        ----------
+
+        name : str
+          Name of the counter.
+
+        value : float, optional
+          Amount added to the counter.
+
+        labels : dict
+          Labels of the counter.
+        """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set the value of a gauge.
+
+        Parameters
+        ----------
+
+        name : str
+          Name of the gauge.
+
+        value : float
+          Value of the gauge.
+
+        labels : dict
+          Labels of the gauge.
+        """
+        with self._lock:
+            self._gauges[(name, _labels_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        """Add an observation to a histogram.
+
+        Parameters
+        ----------
+
+        name : str
+          Name of the histogram.
+
+        value : float
+          Observed value.
+
+        labels : dict
+          Labels of the histogram.
+        """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"buckets": [0] * len(self.buckets), "sum": 0, "count": 0}
+                self._histograms[key] = histogram
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def to_dict(self):
+        """Get the metrics as a JSON serializable dictionary.
+
+        Returns
+        -------
+
+        dict : Metrics with the fields ``spans``, ``repos`` (spans of each
+          repository), ``counters``, ``gauges`` and ``histograms``, being
+          the buckets of the histograms cumulative.
+        """
+        with self._lock:
+            histograms = []
+            for (name, labels_key), histogram in sorted(self._histograms.items()):
+                cumulative, buckets = (0, {})
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                buckets["+Inf"] = histogram["count"]
+                histograms.append(
+                    {
+                        "name": name,
+                        "labels": dict(labels_key),
+                        "buckets": buckets,
+                        "sum": histogram["sum"],
+                        "count": histogram["count"],
+                    }
+                )
+
+            return {
+                "spans": {name: dict(span) for name, span in self._spans.items()},
+                "repos": {
+                    repo: dict(spans) for repo, spans in self._repos_spans.items()
+                },
+                "counters": [
+                    {"name": name, "labels": dict(labels_key), "value": value}
+                    for (name, labels_key), value in sorted(self._counters.items())
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(labels_key), "value": value}
+                    for (name, labels_key), value in sorted(self._gauges.items())
+                ],
+                "histograms": histograms,
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create metrics from a dictionary returned by :py:meth:`to_dict`.
+
+        Parameters
+        ----------
+
+        data : dict
+          Metrics as a dictionary.
+
+        Returns
+        -------
+
+        Metrics : Metrics with the values of the dictionary.
+        """
+        buckets = DEFAULT_BUCKETS
+        if data["histograms"]:
+            buckets = [
+                json.loads(bound)
+                for bound in data["histograms"][0]["buckets"]
+                if bound != "+Inf"
+            ]
+        metrics = cls(buckets=buckets)
+
+        for name, span in data["spans"].items():
+            metrics._spans[name] = dict(span)
+        for repo, spans in data["repos"].items():
+            metrics._repos_spans[repo] = dict(spans)
+        for kind, values in (
+            ("counters", metrics._counters),
+            ("gauges", metrics._gauges),
+        ):
+            for metric in data[kind]:
+                key = (metric["name"], _labels_key(metric["labels"]))
+                values[key] = metric["value"]
+        for histogram in data["histograms"]:
+            cumulative_counts = [
+                count
+                for bound, count in histogram["buckets"].items()
+                if bound != "+Inf"
+            ]
+            metrics._histograms[
+                (histogram["name"], _labels_key(histogram["labels"]))
+            ] = {
+                "buckets": [
+                    count - previous
+                    for previous, count in zip(
+                        [0, *cumulative_counts], cumulative_counts
+                    )
+                ],
+                "sum": histogram["sum"],
+                "count": histogram["count"],
+            }
+        return metrics
+
+    def merge(self, other):
+        """Add the metrics of another execution, like another shard.
+
+        Spans, counters and histograms are added and gauges take the minimum
+        value of both executions.
+
+        Parameters
+        ----------
+
+        other : Metrics
+          Metrics to add. If both have histograms, their buckets must be
+          the same.
+        """
+        # copy of the other metrics, so only one lock is held at a time
+        other = Metrics.from_dict(other.to_dict())
+
+        with self._lock:
+            if other._histograms and other.buckets != self.buckets:
+                if self._histograms:
+                    raise ValueError(
+                        "Metrics with different histogram buckets can't be merged"
+                    )
+                self.buckets = other.buckets
+            for name, span in other._spans.items():
+                merged_span = self._spans.setdefault(
+                    name, {"count": 0, "sum": 0, "max": 0}
+                )
+                merged_span["count"] += span["count"]
+                merged_span["sum"] += span["sum"]
+                merged_span["max"] = max(merged_span["max"], span["max"])
+            for repo, spans in other._repos_spans.items():
+                repo_spans = self._repos_spans.setdefault(repo, {})
+                for name, seconds in spans.items():
+                    repo_spans[name] = repo_spans.get(name, 0) + seconds
+            for key, value in other._counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, value in other._gauges.items():
+                self._gauges[key] = min(self._gauges.get(key, value), value)
+            for key, histogram in other._histograms.items():
+                merged_histogram = self._histograms.setdefault(
+                    key,
+                    {"buckets": [0] * len(self.buckets), "sum": 0, "count": 0},
+                )
+                merged_histogram["buckets"] = [
+                    a + b
+                    for a, b in zip(merged_histogram["buckets"], histogram["buckets"])
+                ]
+                merged_histogram["sum"] += histogram["sum"]
+                merged_histogram["count"] += histogram["count"]
+
+    def to_prometheus(self):
+        """Get the metrics in the Prometheus text exposition format, suitable
+        for the node exporter textfile collector.
+
+        Spans of each repository are not included, their durations are
+        measured by histograms.
+
+        Returns
+        -------
+
+        str : Metrics exposition.
+        """
+        data = self.to_dict()
+        lines = []
+
+        if data["spans"]:
+            name = f"{PROMETHEUS_PREFIX}span_seconds"
+            lines.append(f"# HELP {name} Time spent in each stage.")
+            lines.append(f"# TYPE {name} summary")
+            for span_name, span in sorted(data["spans"].items()):
+                labels = _prometheus_labels((("span", span_name),))
+                lines.append(f"{name}_sum{labels} {span['sum']}")
+                lines.append(f"{name}_count{labels} {span['count']}")
+            lines.append(f"# TYPE {name}_max gauge")
+            for span_name, span in sorted(data["spans"].items()):
+                labels = _prometheus_labels((("span", span_name),))
+                lines.append(f"{name}_max{labels} {span['max']}")
+
+        for kind, suffix in (("counters", "_total"), ("gauges", "")):
+            previous_name = None
+            for metric in data[kind]:
+                name = f"{PROMETHEUS_PREFIX}{metric['name']}{suffix}"
+                if name != previous_name:
+                    lines.append(f"# TYPE {name} {kind[:-1]}")
+                    previous_name = name
+                labels = _prometheus_labels(tuple(metric["labels"].items()))
+                lines.append(f"{name}{labels} {metric['value']}")
+
+        previous_name = None
+        for histogram in data["histograms"]:
+            name = f"{PROMETHEUS_PREFIX}{histogram['name']}"
+            if name != previous_name:
+                lines.append(f"# TYPE {name} histogram")
+                previous_name = name
+            labels_key = tuple(histogram["labels"].items())
+            for bound, count in histogram["buckets"].items():
+                labels = _prometheus_labels(labels_key, le=bound)
+                lines.append(f"{name}_bucket{labels} {count}")
+            labels = _prometheus_labels(labels_key)
+            lines.append(f"{name}_sum{labels} {histogram['sum']}")
+            lines.append(f"{name}_count{labels} {histogram['count']}")
+
+        return "".join(f"{line}\n" for line in lines)
+
+    def write(self, filepath, format=None):
+        """Write the metrics to a file.
+
+        Parameters
+        ----------
+
+        filepath : str
+          Path to the file.
+
+        format : str, optional
+          Format of the file, ``"json"`` or ``"prometheus"``. By default,
+          ``"prometheus"`` for files with extension ``.prom`` and ``"json"``
+          otherwise.
+
+        The content is written to a temporary file which then replaces the
+        file, so readers like the textfile collector of the Prometheus node
+        exporter never see a partially written file.
+        """
+        if format is None:
+            format = "prometheus" if filepath.endswith(".prom") else "json"
+        if format == "prometheus":
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2) + "\n"
+        fd, tmp_filepath = tempfile.mkstemp(
+            prefix=f".{os.path.basename(filepath)}.",
+            dir=os.path.dirname(os.path.abspath(filepath)),
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            # temporary files are only readable by their owner
+            os.chmod(tmp_filepath, 0o644)
+            os.replace(tmp_filepath, filepath)
+        except BaseException:
+            os.remove(tmp_filepath)
+            raise
+
+
+_active_metrics = Metrics()
+
+
+def get_metrics():
+    """Get the metrics where the current execution is being instrumented.
+
+    Returns
+    -------
+
+    Metrics : Active metrics.
+    """
+    return _active_metrics
+
+
+@contextlib.contextmanager
+def activate_metrics(metrics):
+    """Instrument the executions inside a ``with`` block in some metrics.
+
+    Parameters
+    ----------
+
+    metrics : Metrics
+      Metrics that will be returned by :py:func:`get_metrics` inside the
+      block.
+    """
+    global _active_metrics
+    previous_metrics, _active_metrics = (_active_metrics, metrics)
+    try:
+        yield metrics
+    finally:
+        _active_metrics = previous_metrics
@@ -0,0 +1,149 @@
+"""Pipelines of concurrent stages connected by bounded queues."""
+
+import asyncio
+
+
+# marks the end of the items of a queue
+_DONE = object()
+
+
+class Stage:
+    """Step of a pipeline processing items concurrently."""
+
+    def __init__(self, worker, concurrency=1, queue_size=None):
+        """Define a stage of a pipeline.
+
+        Parameters
+        ----------
+
+        worker : callable
+          Asynchronous generator function which receives an item and yields
+          the items that will be passed to the next stage, if any.
+
+        concurrency : int, optional
+          Number of items processed concurrently by the stage.
+
+        queue_size : int, optional
+          Maximum number of items waiting to be processed by the stage. When
+          the queue is full, the previous stage waits until the stage takes
+          an item from it. By default, the double of the concurrency.
+        """
+        self.worker = worker
+        self.concurrency = max(concurrency, 1)
+        self.queue_size = queue_size or 2 * self.concurrency
+
+
+async def run_pipeline(source, stages):
+    """Pass the items of a source through a sequence of stages.
+
+    Each stage starts to process items as soon as the previous one produces
+    them, so a slow stage doesn't prevent the rest from progressing until
+    its queue is full. If a stage raises an exception, the whole pipeline is
+    cancelled and the exception is propagated.
+
+    Parameters
+    ----------
+
+    source : AsyncIterable
+      Items processed by the first stage.
+
+    stages : list
+      Stages of the pipeline, as :py:class:`Stage` instances.
+
+    Returns
+    -------
+
+    list : Items yielded by the last stage.
+    """
+    queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in stages]
+    results = []
+
+    async def feed():
+        async for item in source:
+            await queues[0].put(item)
+        await queues[0].put(_DONE)
+
+    async def work(stage, inbox, outbox, running_workers):
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                # let the other workers of the stage know that it's done
+                await inbox.put(_DONE)
+                break
+            async for result in stage.worker(item):
+                if outbox is None:
+                    results.append(result)
+                else:
+                    await outbox.put(result)
+
+        # the last worker of the stage to finish notifies the next stage
+        running_workers[0] -= 1
+        if not running_workers[0] and outbox is not None:
+            await outbox.put(_DONE)
+
+    tasks = [asyncio.ensure_future(feed())]
+    for i, stage in enumerate(stages):
+        outbox = queues[i + 1] if i + 1 < len(stages) else None
+        running_workers = [stage.concurrency]
+        tasks.extend(
+            asyncio.ensure_future(work(stage, queues[i], outbox, running_workers))
+            for _ in range(stage.concurrency)
+        )
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+
+async def merge_sources(sources, queue_size=None):
+    """Iterate concurrently over several sources, yielding their items as soon
+    as any of them produces one.
+
+    If a source raises an exception, the rest of them are cancelled and the
+    exception is propagated.
+
+    Parameters
+    ----------
+
+    sources : list
+      Asynchronous iterables merged.
+
+    queue_size : int, optional
+      Maximum number of items produced by the sources waiting to be yielded.
+      By default, the number of sources.
+
+    Yields
+    ------
+
+    Items of the sources, in the order they are produced.
+    """
+    queue = asyncio.Queue(maxsize=queue_size or max(len(sources), 1))
+
+    async def feed(source):
+        try:
+            async for item in source:
+                await queue.put((None, item))
+        except Exception as err:
+            await queue.put((err, None))
+        else:
+            await queue.put((_DONE, None))
+
+    tasks = [asyncio.ensure_future(feed(source)) for source in sources]
+    running_sources = len(tasks)
+    try:
+        while running_sources:
+            error, item = await queue.get()
+            if error is _DONE:
+                running_sources -= 1
+            elif error is not None:
+                raise error
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,384 @@
+"""pre-commit executions utilities."""
+
+import concurrent.futures
+import hashlib
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+
+from repo_stream.metrics import get_metrics
+
+
+def pre_commit_env(pre_commit_home=None):
+    """Build the environment for pre-commit executions.
+
+    Parameters
+    ----------
+
+    pre_commit_home : str, optional
+      Directory where pre-commit stores the hook environments. By default,
+      the directory configured in the current environment.
+
+    Returns
+    -------
+
+    dict : Environment variables.
+    """
+    env = dict(os.environ)
+    if pre_commit_home is not None:
+        env["PRE_COMMIT_HOME"] = os.path.abspath(os.path.expanduser(pre_commit_home))
+    return env
+
+
+def run_pre_commit(config_filepath, repo_dirpath, pre_commit_home=None):
+    """Run pre-commit inside a repository using a configuration file.
+
+    Parameters
+    ----------
+
+    config_filepath : str
+      Path to the pre-commit configuration file.
+
+    repo_dirpath : str
+      Path to the repository against which pre-commit will be run.
+
+    pre_commit_home : str, optional
+      Directory where pre-commit stores the hook environments.
+
+    Returns
+    -------
+
+    int : Exit code of pre-commit.
+    """
+    with get_metrics().subprocess_span("pre-commit", "run"):
+        return subprocess.call(
+            [sys.executable, "-m", "pre_commit", "run", "-c", config_filepath],
+            cwd=repo_dirpath,
+            env=pre_commit_env(pre_commit_home),
+        )
+
+
+def _install_hooks(updater_content, pre_commit_home):
+    env = pre_commit_env(pre_commit_home)
+    metrics = get_metrics()
+    with tempfile.TemporaryDirectory() as dirname:
+        config_filepath = os.path.join(dirname, "._pre-commit-config.yaml")
+        with open(config_filepath, "w") as f:
+            f.write(updater_content)
+
+        # hooks can only be installed from inside a GIT repository
+        repo_dirpath = os.path.join(dirname, "repo")
+        with metrics.subprocess_span("git", "init"):
+            subprocess.check_call(["git", "init", "--quiet", repo_dirpath])
+
+        for args in (
+            ["validate-config", config_filepath],
+            ["install-hooks", "-c", config_filepath],
+        ):
+            with metrics.subprocess_span("pre-commit", args[0]):
+                proc = subprocess.run(
+                    [sys.executable, "-m", "pre_commit", *args],
+                    cwd=repo_dirpath,
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                )
+            if proc.returncode != 0:
+                return proc.stdout.decode("utf-8", errors="replace")
+    return None
+
+
+def warm_up_hook_environments(updater_contents, pre_commit_home=None, jobs=1):
+    """Validate updater configurations and install their hook environments.
+
+    Each distinct configuration is validated and its hooks environments are
+    installed once, concurrently for several configurations, so the
+    environments are ready before any repository is updated.
+
+    Parameters
+    ----------
+
+    updater_contents : list
+      Contents of pre-commit updater configuration files. Can be repeated.
+
+    pre_commit_home : str, optional
+      Directory where pre-commit stores the hook environments.
+
+    jobs : int, optional
+      Number of configurations processed concurrently.
+
+    Returns
+    -------
+
+    dict : Errors found for invalid configurations or configurations whose
+      hooks could not be installed, being the keys the contents of the
+      configurations and the values the output of pre-commit.
+    """
+    distinct_contents = sorted(set(updater_contents))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        results = executor.map(
+            lambda content: _install_hooks(content, pre_commit_home),
+            distinct_contents,
+        )
+        return {
+            content: error
+            for content, error in zip(distinct_contents, results)
+            if error is not None
+        }
+
+
+def pre_commit_home_cache_key(updater_contents, prefix="repo-stream-pre-commit"):
+    """Build a cache key for a pre-commit hook environments directory.
+
+    The key identifies the hook environments installed for a set of updater
+    configurations, so it can be used to persist the directory between runs,
+    for example using the ``actions/cache`` Github action.
+
+    Parameters
+    ----------
+
+    updater_contents : list
+      Contents of pre-commit updater configuration files. Can be repeated.
+
+    prefix : str, optional
+      Prefix of the key.
+
+    Returns
+    -------
+
+    str : Cache key.
+    """
+    from pre_commit.constants import VERSION as pre_commit_version
+
+    hasher = hashlib.sha256()
+    for value in (
+        platform.system(),
+        platform.machine(),
+        platform.python_version(),
+        pre_commit_version,
+        *sorted(set(updater_contents)),
+    ):
+        hasher.update(value.encode("utf-8"))
+        hasher.update(b"\0")
+    return f"{prefix}-{hasher.hexdigest()[:32]}"
+
+
+def _run_pre_commit_job(pre_commit_main, config_filepath, repo_dirpath):
+    # runs inside a worker process, capturing the output written to the file
+    # descriptors, also by the hooks subprocesses
+    os.chdir(repo_dirpath)
+    with tempfile.TemporaryFile() as output_file:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_fds = (os.dup(1), os.dup(2))
+        os.dup2(output_file.fileno(), 1)
+        os.dup2(output_file.fileno(), 2)
+        try:
+            exitcode = pre_commit_main(["run", "-c", config_filepath])
+        except SystemExit as exc:
+            exitcode = exc.code if isinstance(exc.code, int) else 1
+        except Exception:
+            import traceback
+
+            traceback.print_exc()
+            exitcode = 3
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            os.close(saved_fds[0])
+            os.close(saved_fds[1])
+        output_file.seek(0)
+        output = output_file.read().decode("utf-8", errors="replace")
+
+    changed_files = subprocess.check_output(
+        ["git", "diff", "--name-only", "-z"],
+        cwd=repo_dirpath,
+    ).decode("utf-8")
+    return {
+        "exitcode": exitcode,
+        "changed_files": [
+            filepath for filepath in changed_files.split("\0") if filepath
+        ],
+        "output": output,
+    }
+
+
+def _pre_commit_worker(conn, pre_commit_home):
+    if pre_commit_home is not None:
+        os.environ.update(pre_commit_env(pre_commit_home))
+    # already imported by the fork server, if available
+    from pre_commit.main import main as pre_commit_main
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        conn.send(_run_pre_commit_job(pre_commit_main, *job))
+
+
+class _PreCommitWorker:
+    def __init__(self, context, pre_commit_home):
+        self.context = context
+        self.pre_commit_home = pre_commit_home
+        self.process, self.conn, self.jobs = (None, None, 0)
+
+    def start(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_pre_commit_worker,
+            args=(child_conn, self.pre_commit_home),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        get_metrics().inc("pre_commit_worker_starts")
+
+    def run(self, job, timeout):
+        if self.process is None:
+            self.start()
+        self.jobs += 1
+        self.conn.send(job)
+        if not self.conn.poll(timeout):
+            raise subprocess.TimeoutExpired(["pre-commit", "run"], timeout)
+        return self.conn.recv()
+
+    def stop(self, kill=False):
+        if self.process is None:
+            return
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process, self.conn = (None, None)
+
+
+class PreCommitPool:
+    """Pool of worker processes running pre-commit.
+
+    Workers import pre-commit once and run several jobs each, so every
+    execution is isolated in its own process without paying the start of
+    an interpreter for each one. Where available, workers are forked from a
+    server process which has already imported pre-commit.
+
+    The pool can be used from several threads, running as many jobs in
+    parallel as worker processes.
+    """
+
+    def __init__(
+        self,
+        processes=1,
+        pre_commit_home=None,
+        max_jobs_per_worker=100,
+        timeout=None,
+        restarts=1,
+    ):
+        """Create a pool of workers, which are started on demand.
+
+        Parameters
+        ----------
+
+        processes : int, optional
+          Number of worker processes.
+
+        pre_commit_home : str, optional
+          Directory where pre-commit stores the hook environments.
+
+        max_jobs_per_worker : int, optional
+          Number of jobs after which a worker is replaced by a new one, so
+          the state left by pre-commit and the hooks doesn't accumulate.
+
+        timeout : float, optional
+          Seconds after which a job is considered hung and its worker is
+          killed.
+
+        restarts : int, optional
+          Number of times that a job is retried in a new worker if its
+          worker dies while running it.
+        """
+        import multiprocessing
+
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self.context = multiprocessing.get_context("forkserver")
+            self.context.set_forkserver_preload(["pre_commit.main"])
+        else:
+            self.context = multiprocessing.get_context("spawn")
+
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.timeout = timeout
+        self.restarts = restarts
+
+        self._workers = [
+            _PreCommitWorker(self.context, pre_commit_home)
+            for _ in range(max(processes, 1))
+        ]
+        self._idle_workers = queue.Queue()
+        for worker in self._workers:
+            self._idle_workers.put(worker)
+
+    def run(self, config_filepath, repo_dirpath):
+        """Run pre-commit inside a repository using a configuration file.
+
+        Parameters
+        ----------
+
+        config_filepath : str
+          Path to the pre-commit configuration file.
+
+        repo_dirpath : str
+          Path to the repository against which pre-commit will be run.
+
+        Returns
+        -------
+
+        dict : Result of the execution with the fields ``exitcode``,
+          ``changed_files`` (files modified in the repository) and
+          ``output`` (output of pre-commit and the hooks).
+
+        Raises
+        ------
+
+        subprocess.TimeoutExpired : The execution took more than the
+          ``timeout`` of the pool.
+
+        subprocess.CalledProcessError : The worker died running the job
+          more times than the ``restarts`` of the pool.
+        """
+        job = (os.path.abspath(config_filepath), os.path.abspath(repo_dirpath))
+        worker = self._idle_workers.get()
+        try:
+            for attempt in range(self.restarts + 1):
+                if worker.jobs >= self.max_jobs_per_worker:
+                    worker.stop()
+                try:
+                    with get_metrics().span("pre_commit_job"):
+                        return worker.run(job, self.timeout)
+                except subprocess.TimeoutExpired:
+                    worker.stop(kill=True)
+                    raise
+                except (EOFError, OSError):
+                    worker.process.join(5)
+                    exitcode = worker.process.exitcode
+                    worker.stop(kill=True)
+            raise subprocess.CalledProcessError(exitcode, ["pre-commit", "run"])
+        finally:
+            self._idle_workers.put(worker)
+
+    def close(self):
+        """Stop the worker processes."""
+        for worker in self._workers:
+            worker.stop()
@@ -0,0 +1,244 @@
+"""Github API rate limits scheduling."""
+
+import threading
+import time
+import urllib.parse
+
+from repo_stream.resilience import parse_retry_after
+
+
+CONTENT_CREATION_METHODS = ("POST", "PATCH", "PUT", "DELETE")
+
+
+class _RateLimitBudget:
+    """Known state of the rate limit for a token and a resource."""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.used = 0
+        self.next_request_at = 0
+
+
+class RateLimitScheduler:
+    """Schedule Github API requests honoring the rate limits of the API.
+
+    The remaining budget is tracked for each token and resource class
+    (``core``, ``search``, ``graphql``...) from the ``X-RateLimit-*``
+    headers of the responses. When the remaining budget for a resource
+    drops below a fraction of its limit, requests are spaced evenly until
+    the budget is reset and, when exhausted, requests wait until the reset
+    time. Content creating requests are spaced to stay under the secondary
+    rate limits.
+
+    All methods are thread safe and block the calling thread while waiting.
+    """
+
+    def __init__(
+        self,
+        slowdown_ratio=0.1,
+        content_creation_interval=1,
+        max_wait=3600,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        """Configure the scheduler.
+
+        Parameters
+        ----------
+
+        slowdown_ratio : float, optional
+          Fraction of the rate limit below which requests are spaced evenly
+          until the budget is reset.
+
+        content_creation_interval : float, optional
+          Minimum number of seconds between content creating requests
+          performed with the same token.
+
+        max_wait : float, optional
+          Maximum number of seconds that a request will wait for the
+          reset of a budget or the time indicated by a ``Retry-After``
+          header.
+
+        clock : callable, optional
+          Function returning the current epoch time in seconds.
+
+        sleep : callable, optional
+          Function used to wait a number of seconds.
+        """
+        self.slowdown_ratio = slowdown_ratio
+        self.content_creation_interval = content_creation_interval
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+
+        self._budgets = {}
+        self._next_content_creation_at = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resource_class(method, url, api_url):
+        """Guess the rate limit resource class of a request before sending it.
+
+        Parameters
+        ----------
+
+        method : str
+          HTTP method of the request.
+
+        url : str
+          Requested URL.
+
+        api_url : str
+          Base URL of the Github API.
+
+        Returns
+        -------
+
+        str : Resource class of the request or ``None`` if the request is not
+          sent to the Github API.
+        """
+        if not url.startswith(api_url):
+            return None
+        path = urllib.parse.urlsplit(url[len(api_url) :]).path
+        if path == "/graphql":
+            return "graphql"
+        elif path.startswith("/search/code"):
+            return "code_search"
+        elif path.startswith("/search/"):
+            return "search"
+        return "core"
+
+    def _budget(self, identity, resource):
+        budget = self._budgets.get((identity, resource))
+        if budget is None:
+            budget = _RateLimitBudget()
+            self._budgets[(identity, resource)] = budget
+        return budget
+
+    def _wait_until(self, timestamp):
+        delay = min(timestamp - self.clock(), self.max_wait)
+        if delay > 0:
+            self.sleep(delay)
+
+    def before_request(self, identity, resource, method):
+        """Wait until a request can be sent without exceeding the rate limits.
+
+        Parameters
+        ----------
+
+        identity : str
+          Authentication identity of the request.
+
+        resource : str
+          Resource class of the request.
+
+        method : str
+          HTTP method of the request.
+        """
+        with self._lock:
+            now = self.clock()
+            budget = self._budget(identity, resource)
+            send_at = max(now, budget.next_request_at)
+
+            if budget.remaining is not None and budget.reset is not None:
+                if budget.reset <= now:
+                    # the budget has been reset since the last response
+                    budget.remaining = budget.limit
+                elif budget.remaining <= 0:
+                    send_at = max(send_at, budget.reset + 1)
+                elif (
+                    budget.limit
+                    and budget.remaining <= budget.limit * self.slowdown_ratio
+                ):
+                    interval = (budget.reset - now) / budget.remaining
+                    budget.next_request_at = send_at + interval
+                if budget.remaining:
+                    # reserve the request, concurrent requests will see it
+                    budget.remaining -= 1
+
+            if resource == "core" and method in CONTENT_CREATION_METHODS:
+                send_at = max(send_at, self._next_content_creation_at.get(identity, 0))
+                self._next_content_creation_at[identity] = (
+                    send_at + self.content_creation_interval
+                )
+
+            budget.used += 1
+
+        self._wait_until(send_at)
+
+    def after_response(self, identity, resource, status, headers):
+        """Update the state of the budgets from the headers of a response.
+
+        Parameters
+        ----------
+
+        identity : str
+          Authentication identity of the request.
+
+        resource : str
+          Resource class guessed for the request.
+
+        status : int
+          HTTP status code of the response.
+
+        headers : dict
+          Response headers, with lowercased names.
+
+        Returns
+        -------
+
+        float : Number of seconds to wait before retrying the request if it
+          has been rejected by a rate limit, ``None`` otherwise.
+        """
+        now = self.clock()
+        resource = headers.get("x-ratelimit-resource", resource)
+
+        with self._lock:
+            budget = self._budget(identity, resource)
+            if "x-ratelimit-remaining" in headers:
+                budget.limit = int(headers.get("x-ratelimit-limit", 0)) or None
+                budget.remaining = int(headers["x-ratelimit-remaining"])
+                budget.reset = int(headers.get("x-ratelimit-reset", now))
+
+            if status not in (403, 429):
+                return None
+
+            retry_after = headers.get("retry-after")
+            delay = None
+            if retry_after is not None:
+                delay = parse_retry_after(retry_after, now)
+            if delay is not None:
+                # secondary rate limit, stop sending requests with this token
+                budget.next_request_at = max(budget.next_request_at, now + delay)
+            elif budget.remaining == 0 and budget.reset is not None:
+                delay = budget.reset - now + 1
+            else:
+                return None  # not a rate limit error
+        return min(max(delay, 0), self.max_wait)
+
+    def usage(self):
+        """Get the budgets consumed by the requests sent.
+
+        Returns
+        -------
+
+        dict : For each resource class, the number of requests sent
+          (``used``) and the last known ``limit`` and ``remaining`` budgets
+          of the token, with the reset epoch time (``reset``). If several
+          tokens have been used, the requests sent are added up.
+        """
+        response = {}
+        with self._lock:
+            for (_, resource), budget in sorted(self._budgets.items()):
+                usage = response.setdefault(
+                    resource,
+                    {"used": 0, "limit": None, "remaining": None, "reset": None},
+                )
+                usage["used"] += budget.used
+                if budget.remaining is not None:
+                    usage["limit"] = budget.limit
+                    usage["remaining"] = budget.remaining
+                    usage["reset"] = budget.reset
+        return response
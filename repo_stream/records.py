@@ -0,0 +1,201 @@
+"""Compact records of the repositories and updates handled by repo-stream."""
+
+
+class _NotFetched:
+    def __repr__(self):
+        return "NOT_FETCHED"
+
+
+# value of the fields that have not been retrieved for a record
+NOT_FETCHED = _NotFetched()
+
+
+class _Record:
+    """Record storing its fields in slots, so it takes less memory than a
+    dictionary with the same fields.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a record from a dictionary, ignoring unknown fields.
+
+        Parameters
+        ----------
+
+        data : dict
+          Fields of the record.
+
+        Returns
+        -------
+
+        Record : New record.
+        """
+        return cls(**{field: data[field] for field in cls.__slots__ if field in data})
+
+    def to_dict(self):
+        """Get the fields of the record, except those not fetched.
+
+        Returns
+        -------
+
+        dict : Fields of the record.
+        """
+        response = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is not NOT_FETCHED:
+                response[field] = value
+        return response
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(
+            getattr(self, field) == getattr(other, field) for field in self.__slots__
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{field}={getattr(self, field)!r}" for field in self.__slots__
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+class RepoRecord(_Record):
+    """Repository of a user, with the fields needed to update it."""
+
+    __slots__ = (
+        "full_name",
+        "default_branch",
+        "pushed_at",
+        "size",
+        "fork",
+        "archived",
+        "head_sha",
+        "pre_commit_config_sha",
+        "pre_commit_config",
+    )
+
+    def __init__(
+        self,
+        full_name,
+        default_branch,
+        pushed_at=None,
+        size=0,
+        fork=False,
+        archived=False,
+        head_sha=None,
+        pre_commit_config_sha=None,
+        pre_commit_config=NOT_FETCHED,
+    ):
+        """Define a repository.
+
+        Parameters
+        ----------
+
+        full_name : str
+          Repository full name, like ``"owner/name"``.
+
+        default_branch : str
+          Name of the default branch.
+
+        pushed_at : str, optional
+          Date of the last push to the repository.
+
+        size : int, optional
+          Size of the repository in kilobytes.
+
+        fork : bool, optional
+          If the repository is a fork.
+
+        archived : bool, optional
+          If the repository is archived.
+
+        head_sha : str, optional
+          SHA of the HEAD commit of the default branch, if known.
+
+        pre_commit_config_sha : str, optional
+          Blob SHA of the pre-commit configuration file, if known.
+
+        pre_commit_config : str, optional
+          Content of the pre-commit configuration file, ``None`` if the
+          repository doesn't have one. By default :py:data:`NOT_FETCHED`,
+          so it will be downloaded when needed.
+        """
+        self.full_name = full_name
+        self.default_branch = default_branch
+        self.pushed_at = pushed_at
+        self.size = size
+        self.fork = fork
+        self.archived = archived
+        self.head_sha = head_sha
+        self.pre_commit_config_sha = pre_commit_config_sha
+        self.pre_commit_config = pre_commit_config
+
+
+class Target(_Record):
+    """Update of a repository by a repo-stream updater configuration."""
+
+    __slots__ = (
+        "repo",
+        "default_branch_name",
+        "pushed_at",
+        "size",
+        "head_sha",
+        "config",
+        "updater",
+        "updater_content",
+    )
+
+    def __init__(
+        self,
+        repo,
+        default_branch_name,
+        config,
+        updater,
+        pushed_at=None,
+        size=0,
+        head_sha=None,
+        updater_content=None,
+    ):
+        """Define an update.
+
+        Parameters
+        ----------
+
+        repo : str
+          Full name of the updated repository.
+
+        default_branch_name : str
+          Default branch of the updated repository.
+
+        config : str
+          Full name of the repo-stream configuration repository.
+
+        updater : str
+          Name of the updater configuration file, without extension.
+
+        pushed_at : str, optional
+          Date of the last push to the updated repository.
+
+        size : int, optional
+          Size of the updated repository in kilobytes.
+
+        head_sha : str, optional
+          SHA of the HEAD commit of the default branch, if known.
+
+        updater_content : str, optional
+          Content of the updater configuration, once downloaded.
+        """
+        self.repo = repo
+        self.default_branch_name = default_branch_name
+        self.config = config
+        self.updater = updater
+        self.pushed_at = pushed_at
+        self.size = size
+        self.head_sha = head_sha
+        self.updater_content = updater_content
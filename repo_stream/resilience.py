@@ -0,0 +1,348 @@
+"""Recovery from transient failures of the hosts requested by repo-stream."""
+
+import collections
+import datetime
+import email.utils
+import http.client
+import math
+import random
+import threading
+import time
+from urllib.error import HTTPError
+
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# errors of the requests that could not be completed, even after retrying
+# them: HTTP error responses, rejections by an open circuit, connection
+# errors and timeouts
+REQUEST_ERRORS = (OSError, http.client.HTTPException)
+
+
+def parse_retry_after(value, now):
+    """Get the number of seconds indicated by a ``Retry-After`` header.
+
+    Parameters
+    ----------
+
+    value : str
+      Value of the header, a number of seconds or an HTTP date.
+
+    now : float
+      Current epoch time in seconds, used to convert dates to delays.
+
+    Returns
+    -------
+
+    float : Seconds to wait, ``0`` if the date has passed, ``None`` if the
+      value is not valid.
+    """
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(date.timestamp() - now, 0)
+
+
+class CircuitOpenError(HTTPError):
+    """Request rejected without being sent because its endpoint is failing.
+
+    Is a ``503 Service Unavailable`` HTTP error, so it's handled like the
+    errors answered by the host.
+    """
+
+    def __init__(self, url, host, resource):
+        """Define the error.
+
+        Parameters
+        ----------
+
+        url : str
+          URL of the rejected request.
+
+        host : str
+          Host of the rejected request.
+
+        resource : str
+          Resource of the host requested, like a rate limit resource class
+          of the Github API.
+        """
+        self.host = host
+        self.resource = resource
+        super().__init__(
+            url,
+            503,
+            f"Circuit open for '{resource}' requests to host '{host}' after"
+            " consecutive failures",
+            {},
+            None,
+        )
+
+
+class RetryPolicy:
+    """Retries of the requests failed by transient errors.
+
+    Requests that could not be sent or answered with a server error are
+    retried waiting an exponential backoff between attempts, capped and
+    with full jitter, so the retries of concurrent requests failed at the
+    same time are spread instead of hitting the host together again.
+    """
+
+    def __init__(
+        self,
+        retries=3,
+        backoff=0.5,
+        max_backoff=30,
+        statuses=RETRY_STATUSES,
+        random=random.random,
+        sleep=time.sleep,
+        clock=time.time,
+    ):
+        """Configure the policy.
+
+        Parameters
+        ----------
+
+        retries : int, optional
+          Maximum number of retries of a request.
+
+        backoff : float, optional
+          Base of the backoff, in seconds. The maximum delay before the
+          retry ``n`` (starting at 0) is ``backoff * 2 ** n``.
+
+        max_backoff : float, optional
+          Maximum delay before a retry, in seconds. Also caps the delays
+          indicated by ``Retry-After`` headers.
+
+        statuses : tuple, optional
+          Response status codes for which requests are retried.
+
+        random : callable, optional
+          Function returning a random float in the interval ``[0, 1)``.
+
+        sleep : callable, optional
+          Function used to wait a number of seconds.
+
+        clock : callable, optional
+          Function returning the current epoch time in seconds, used to
+          convert the dates of ``Retry-After`` headers to delays.
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.random = random
+        self.sleep = sleep
+        self.clock = clock
+
+    def delay(self, attempt, retry_after=None):
+        """Get the number of seconds to wait before retrying a request.
+
+        Parameters
+        ----------
+
+        attempt : int
+          Number of retries already performed for the request.
+
+        retry_after : str, optional
+          Value of the ``Retry-After`` header of the failed response. The
+          number of seconds or the time until the date that it indicates is
+          used as minimum delay.
+
+        Returns
+        -------
+
+        float : Seconds to wait.
+        """
+        delay = self.random() * min(self.max_backoff, self.backoff * 2**attempt)
+        if retry_after is not None:
+            seconds = parse_retry_after(retry_after, self.clock())
+            if seconds is not None:
+                delay = max(delay, min(seconds, self.max_backoff))
+        return delay
+
+
+class _Circuit:
+    """Known state of the requests to an endpoint."""
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+
+
+class CircuitBreaker:
+    """Circuit breaker of the requests to each endpoint.
+
+    After a number of consecutive failures of the requests to an endpoint,
+    its circuit is opened and its requests are rejected, failing fast
+    instead of waiting for an endpoint that is down. Once the reset timeout
+    has passed, a request is let through to probe the endpoint: if succeeds,
+    the circuit is closed, otherwise it stays open for another timeout.
+
+    Endpoints are identified by hashable keys, like a tuple with the host
+    and the resource requested, so an outage of a resource of a host does
+    not reject the requests to its other resources.
+
+    All methods are thread safe.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        """Configure the breaker.
+
+        Parameters
+        ----------
+
+        failure_threshold : int, optional
+          Number of consecutive failures that opens the circuit of an
+          endpoint.
+
+        reset_timeout : float, optional
+          Seconds that the circuit of an endpoint stays open before probing
+          it.
+
+        clock : callable, optional
+          Function returning the current time in seconds.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self._circuits = collections.defaultdict(_Circuit)
+        self._lock = threading.Lock()
+
+    def allow(self, endpoint):
+        """Check if a request can be sent to an endpoint.
+
+        Parameters
+        ----------
+
+        endpoint : hashable
+          Endpoint of the request.
+
+        Returns
+        -------
+
+        bool : ``False`` if the circuit of the endpoint is open.
+        """
+        with self._lock:
+            circuit = self._circuits[endpoint]
+            if circuit.opened_at is None:
+                return True
+            now = self.clock()
+            if now - circuit.opened_at < self.reset_timeout:
+                return False
+            # let a single request probe the endpoint in this timeout
+            circuit.opened_at = now
+            return True
+
+    def is_open(self, endpoint):
+        """Check if the circuit of an endpoint is open.
+
+        Parameters
+        ----------
+
+        endpoint : hashable
+          Endpoint to check.
+
+        Returns
+        -------
+
+        bool : If the requests to the endpoint are being rejected.
+        """
+        with self._lock:
+            return self._circuits[endpoint].opened_at is not None
+
+    def record_success(self, endpoint):
+        """Record a request answered by an endpoint, closing its circuit.
+
+        Parameters
+        ----------
+
+        endpoint : hashable
+          Endpoint of the request.
+        """
+        with self._lock:
+            circuit = self._circuits[endpoint]
+            circuit.failures = 0
+            circuit.opened_at = None
+
+    def record_failure(self, endpoint):
+        """Record a request failed by an endpoint.
+
+        Parameters
+        ----------
+
+        endpoint : hashable
+          Endpoint of the request.
+
+        Returns
+        -------
+
+        bool : If the failure has opened the circuit of the endpoint.
+        """
+        with self._lock:
+            circuit = self._circuits[endpoint]
+            circuit.failures += 1
+            if circuit.failures < self.failure_threshold:
+                return False
+            opened = circuit.opened_at is None
+            circuit.opened_at = self.clock()
+            return opened
+
+
+class LatencyTracker:
+    """Latencies of the last requests, to estimate their quantiles."""
+
+    def __init__(self, window=200, min_samples=20):
+        """Configure the tracker.
+
+        Parameters
+        ----------
+
+        window : int, optional
+          Number of latest latencies kept.
+
+        min_samples : int, optional
+          Minimum number of latencies needed to estimate quantiles.
+        """
+        self.min_samples = min_samples
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        """Record the latency of a request.
+
+        Parameters
+        ----------
+
+        seconds : float
+          Latency of the request.
+        """
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def quantile(self, q):
+        """Estimate a quantile of the latencies recorded.
+
+        Parameters
+        ----------
+
+        q : float
+          Quantile to estimate, between 0 and 1.
+
+        Returns
+        -------
+
+        float : Latency in seconds, ``None`` if there are not enough samples.
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(math.ceil(q * len(latencies)), len(latencies)) - 1]
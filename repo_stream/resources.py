@@ -0,0 +1,107 @@
+"""Concurrency limits for each class of work performed by an update."""
+
+import contextlib
+import threading
+
+from repo_stream.github import DEFAULT_MAX_REQUESTS_IN_FLIGHT
+from repo_stream.metrics import get_metrics
+
+
+RESOURCE_API = "api"
+RESOURCE_NETWORK = "network"
+RESOURCE_CPU = "cpu"
+RESOURCES = (RESOURCE_API, RESOURCE_NETWORK, RESOURCE_CPU)
+
+DEFAULT_API_SLOTS = DEFAULT_MAX_REQUESTS_IN_FLIGHT
+DEFAULT_NETWORK_SLOTS = 4
+DEFAULT_CPU_SLOTS = 1
+
+
+class ResourceScheduler:
+    """Slots available for each class of work of an update.
+
+    Requests to the Github API, transfers of repositories (clones and
+    pushes) and pre-commit executions have separate limits, so a kind of
+    work waiting for its slots doesn't hold the slots of the others. For
+    example, the repositories are cloned while pre-commit is running over
+    the previously cloned ones, using only as many processes as CPU slots.
+
+    All methods are thread safe.
+    """
+
+    def __init__(
+        self,
+        api=DEFAULT_API_SLOTS,
+        network=DEFAULT_NETWORK_SLOTS,
+        cpu=DEFAULT_CPU_SLOTS,
+    ):
+        """Configure the limits.
+
+        Parameters
+        ----------
+
+        api : int, optional
+          Maximum number of requests to the Github API performed
+          concurrently.
+
+        network : int, optional
+          Maximum number of repositories being cloned or pushed
+          concurrently.
+
+        cpu : int, optional
+          Maximum number of pre-commit executions running concurrently.
+        """
+        self.limits = {
+            RESOURCE_API: max(api, 1),
+            RESOURCE_NETWORK: max(network, 1),
+            RESOURCE_CPU: max(cpu, 1),
+        }
+        self._semaphores = {
+            resource: threading.BoundedSemaphore(limit)
+            for resource, limit in self.limits.items()
+        }
+
+    @property
+    def api(self):
+        """Maximum number of concurrent requests to the Github API."""
+        return self.limits[RESOURCE_API]
+
+    @property
+    def network(self):
+        """Maximum number of repositories transferred concurrently."""
+        return self.limits[RESOURCE_NETWORK]
+
+    @property
+    def cpu(self):
+        """Maximum number of concurrent pre-commit executions."""
+        return self.limits[RESOURCE_CPU]
+
+    @property
+    def repositories_in_flight(self):
+        """Number of repositories that can be updated concurrently.
+
+        Each repository being updated takes a slot of a single class at a
+        time, so all the network and CPU slots can be busy at once.
+        """
+        return self.network + self.cpu
+
+    @contextlib.contextmanager
+    def slot(self, resource):
+        """Take a slot of a class of resource inside a ``with`` block,
+        waiting until one is free.
+
+        The time spent waiting is measured by the span ``<resource>_wait``.
+
+        Parameters
+        ----------
+
+        resource : str
+          Class of resource, ``"api"``, ``"network"`` or ``"cpu"``.
+        """
+        semaphore = self._semaphores[resource]
+        with get_metrics().span(f"{resource}_wait"):
+            semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
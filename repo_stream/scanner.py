@@ -0,0 +1,174 @@
+"""Fast detection of repo-stream hooks in pre-commit configurations."""
+
+import hashlib
+from urllib.error import HTTPError
+
+import yaml
+
+from repo_stream.github import repo_url_to_full_name
+
+
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:  # libyaml not available
+    from yaml import SafeLoader as _SafeLoader
+
+
+PRE_COMMIT_CONFIG_FILENAME = ".pre-commit-config.yaml"
+REPO_STREAM_REPO = "mondeja/repo-stream"
+REPO_STREAM_HOOK_ID = "repo-stream"
+
+# repo-stream hooks arguments of the configurations already parsed, by
+# blob SHA of the configuration
+_HOOKS_ARGS_CACHE = {}
+
+
+def load_yaml(content):
+    """Parse a YAML document using libyaml if is available.
+
+    Parameters
+    ----------
+
+    content : str
+      YAML document.
+
+    Returns
+    -------
+
+    object : Parsed document.
+    """
+    return yaml.load(content, Loader=_SafeLoader)
+
+
+def git_blob_sha(content):
+    """Compute the SHA that Git assigns to a blob with certain content.
+
+    Parameters
+    ----------
+
+    content : str
+      Content of the file.
+
+    Returns
+    -------
+
+    str : SHA1 hexadecimal digest of the blob.
+    """
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _parse_repo_stream_hook_args(args):
+    response = {}
+
+    _next_is_config, _next_is_updater = (False, False)
+    for arg in args:
+        if _next_is_config:
+            response["config"] = repo_url_to_full_name(arg)
+            _next_is_config = False
+        elif _next_is_updater:
+            response["updater"] = arg
+            _next_is_updater = False
+        else:
+            arg_without_script = arg.replace("-", "")
+            if arg_without_script == "config":
+                _next_is_config = True
+            elif arg_without_script == "updater":
+                _next_is_updater = True
+            elif "=" in arg:
+                argname, value = arg.split("=")
+                argname = argname.replace("-", "")
+                response[argname] = (
+                    repo_url_to_full_name(value) if argname == "config" else value
+                )
+                _next_is_config = False
+                _next_is_updater = False
+    return response
+
+
+def _parse_repo_stream_hooks_args(pc_config):
+    try:
+        document = load_yaml(pc_config)
+    except yaml.YAMLError:
+        return []
+    if not isinstance(document, dict):
+        return []
+
+    response = []
+    for pc_repo in document.get("repos") or []:
+        if repo_url_to_full_name(pc_repo.get("repo", "")) != REPO_STREAM_REPO:
+            continue
+        for hook in pc_repo.get("hooks") or []:
+            if hook.get("id") == REPO_STREAM_HOOK_ID:
+                response.append(_parse_repo_stream_hook_args(hook.get("args", [])))
+    return response
+
+
+def repo_stream_hooks_args(pc_config, blob_sha=None):
+    """Get the arguments of the repo-stream hooks defined in a pre-commit
+    configuration.
+
+    Configurations that don't mention repo-stream are discarded without
+    parsing them and the results are memoized by blob SHA, so identical
+    configurations shared by several repositories are parsed only once.
+    Invalid configurations are considered without repo-stream hooks.
+
+    Parameters
+    ----------
+
+    pc_config : str
+      Content of the pre-commit configuration file.
+
+    blob_sha : str, optional
+      Git blob SHA of the configuration file. If not defined, is computed
+      from the content.
+
+    Returns
+    -------
+
+    list : Arguments of each repo-stream hook as dictionaries with the fields
+      ``config`` and ``updater``.
+    """
+    if REPO_STREAM_HOOK_ID not in pc_config:
+        return []
+
+    if blob_sha is None:
+        blob_sha = git_blob_sha(pc_config)
+    try:
+        return _HOOKS_ARGS_CACHE[blob_sha]
+    except KeyError:
+        response = _parse_repo_stream_hooks_args(pc_config)
+        _HOOKS_ARGS_CACHE[blob_sha] = response
+        return response
+
+
+async def fetch_pre_commit_config(client, repo):
+    """Download the pre-commit configuration file of a repository.
+
+    Parameters
+    ----------
+
+    client : repo_stream.github.GithubClient
+      Client used to perform the request.
+
+    repo : repo_stream.records.RepoRecord
+      Repository record.
+
+    Returns
+    -------
+
+    str : Content of the file or ``None`` if the repository doesn't have one.
+    """
+    try:
+        response = await client.request(
+            "GET",
+            (
+                f"{client.raw_url}/{repo.full_name}/"
+                f"{repo.default_branch}/{PRE_COMMIT_CONFIG_FILENAME}"
+            ),
+        )
+    except HTTPError as err:
+        if err.code == 404:
+            return None
+        raise err
+    return response.text()
@@ -0,0 +1,212 @@
+"""Split of repo-stream executions across several processes."""
+
+import argparse
+import hashlib
+import json
+import sys
+
+
+SHARD_SEPARATOR = "/"
+
+
+def parse_shard(value):
+    """Parse a shard definition like ``INDEX/COUNT``.
+
+    Shards are numbered from 1 to ``COUNT``.
+
+    Parameters
+    ----------
+
+    value : str
+      Shard definition.
+
+    Returns
+    -------
+
+    tuple : Index and number of shards.
+    """
+    try:
+        index, count = (int(part) for part in value.split(SHARD_SEPARATOR))
+    except ValueError:
+        raise ValueError(
+            f"Invalid shard '{value}', must be defined as 'INDEX/COUNT'"
+        ) from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(
+            f"Invalid shard '{value}', index must be between 1 and {max(count, 1)}"
+        )
+    return (index, count)
+
+
+def repo_shard_index(repo, count):
+    """Get the shard to which a repository belongs.
+
+    The shard only depends on the name of the repository, so each one is
+    handled by the same shard in all the executions.
+
+    Parameters
+    ----------
+
+    repo : str
+      Repository full name, like ``"owner/name"``.
+
+    count : int
+      Number of shards.
+
+    Returns
+    -------
+
+    int : Index of the shard, between 1 and ``count``.
+    """
+    digest = hashlib.sha1(repo.lower().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def in_shard(repo, shard):
+    """Check if a repository must be handled by a shard.
+
+    Parameters
+    ----------
+
+    repo : str
+      Repository full name, like ``"owner/name"``.
+
+    shard : tuple
+      Index and number of shards, as returned by :py:func:`parse_shard`.
+      If ``None``, all the repositories are handled.
+
+    Returns
+    -------
+
+    bool : If the repository belongs to the shard.
+    """
+    if shard is None:
+        return True
+    index, count = shard
+    return repo_shard_index(repo, count) == index
+
+
+def merge_results(results):
+    """Merge the results of several shards of an update.
+
+    Parameters
+    ----------
+
+    results : list
+      Results of each shard as dictionaries with the fields ``exitcode``
+      and ``updates``, as written by the ``results_file`` argument of
+      :py:func:`repo_stream.update.update`.
+
+    Returns
+    -------
+
+    dict : Merged results, which exit code is the maximum of the exit codes of
+      the shards.
+    """
+    updates = [update for result in results for update in result["updates"]]
+    return {
+        "exitcode": max((result["exitcode"] for result in results), default=0),
+        "updates": sorted(
+            updates,
+            key=lambda update: (update["repo"], update["config"], update["updater"]),
+        ),
+    }
+
+
+def build_merge_parser():
+    """Build the parser of the arguments of the merge command.
+
+    Returns
+    -------
+
+    argparse.ArgumentParser : Parser of the arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description=(
+            "Merge the results and metrics files written by the shards of a"
+            " repo-stream execution."
+        ),
+    )
+    parser.add_argument(
+        "--results",
+        nargs="+",
+        default=[],
+        metavar="PATH",
+        help="Results files of the shards.",
+    )
+    parser.add_argument(
+        "--results-output",
+        default=None,
+        metavar="PATH",
+        help="File where the merged results are written. By default, STDOUT.",
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="+",
+        default=[],
+        metavar="PATH",
+        help="Metrics files of the shards, in JSON format.",
+    )
+    parser.add_argument(
+        "--metrics-output",
+        default=None,
+        metavar="PATH",
+        help=(
+            "File where the merged metrics are written. The format is"
+            " Prometheus for files with extension '.prom', JSON otherwise."
+        ),
+    )
+    return parser
+
+
+def main(argv=None):
+    """Merge the results and metrics files of the shards of an execution.
+
+    Parameters
+    ----------
+
+    argv : list, optional
+      Command line arguments. By default, the arguments of the process.
+
+    Returns
+    -------
+
+    int : Exit code of the command.
+    """
+    from repo_stream.metrics import Metrics
+
+    parser = build_merge_parser()
+    args = parser.parse_args(argv)
+    if not args.results and not args.metrics:
+        parser.error("at least one of --results or --metrics is required")
+    if args.metrics and args.metrics_output is None:
+        parser.error("--metrics-output is required to merge metrics files")
+
+    if args.results:
+        results = []
+        for filepath in args.results:
+            with open(filepath) as f:
+                results.append(json.load(f))
+        content = json.dumps(merge_results(results), indent=2) + "\n"
+        if args.results_output is None:
+            sys.stdout.write(content)
+        else:
+            with open(args.results_output, "w") as f:
+                f.write(content)
+
+    if args.metrics:
+        metrics = None
+        for filepath in args.metrics:
+            with open(filepath) as f:
+                shard_metrics = Metrics.from_dict(json.load(f))
+            if metrics is None:
+                metrics = shard_metrics
+            else:
+                metrics.merge(shard_metrics)
+        metrics.write(args.metrics_output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
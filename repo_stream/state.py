@@ -0,0 +1,175 @@
+"""Persistent state of repo-stream updates between runs."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+def updater_content_hash(updater_content):
+    """Compute the hash of the content of an updater configuration.
+
+    Parameters
+    ----------
+
+    updater_content : str
+      Content of the pre-commit updater configuration file.
+
+    Returns
+    -------
+
+    str : SHA256 hexadecimal digest of the content.
+    """
+    return hashlib.sha256(updater_content.encode("utf-8")).hexdigest()
+
+
+class StateStore:
+    """SQLite database storing the result of the last update of each
+    repository for each repo-stream updater configuration.
+
+    For each repository, configuration and updater, the store records the
+    SHA of the default branch HEAD, the hash of the updater configuration
+    content used and the outcome of the update.
+    """
+
+    def __init__(self, path):
+        """Open or create a state database.
+
+        Parameters
+        ----------
+
+        path : str
+          Path to the SQLite database file.
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        dirpath = os.path.dirname(self.path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS updates ("
+                " repo TEXT NOT NULL,"
+                " config TEXT NOT NULL,"
+                " updater TEXT NOT NULL,"
+                " head_sha TEXT,"
+                " updater_hash TEXT NOT NULL,"
+                " outcome TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (repo, config, updater)"
+                ")"
+            )
+
+    def get(self, repo, config, updater):
+        """Get the state of the last update of a repository.
+
+        Parameters
+        ----------
+
+        repo : str
+          Full name of the updated repository.
+
+        config : str
+          Full name of the repo-stream configuration repository.
+
+        updater : str
+          Name of the updater configuration file, without extension.
+
+        Returns
+        -------
+
+        dict : State of the last update, with the fields ``head_sha``,
+          ``updater_hash``, ``outcome`` and ``updated_at``, or ``None`` if
+          the repository has not been updated yet.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT head_sha, updater_hash, outcome, updated_at FROM updates"
+                " WHERE repo = ? AND config = ? AND updater = ?",
+                (repo, config, updater),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("head_sha", "updater_hash", "outcome", "updated_at"), row))
+
+    def set(self, repo, config, updater, head_sha, updater_hash, outcome):
+        """Store the state of an update of a repository.
+
+        Parameters
+        ----------
+
+        repo : str
+          Full name of the updated repository.
+
+        config : str
+          Full name of the repo-stream configuration repository.
+
+        updater : str
+          Name of the updater configuration file, without extension.
+
+        head_sha : str
+          SHA of the HEAD of the default branch of the repository updated.
+
+        updater_hash : str
+          Hash of the updater configuration content, as returned by
+          :py:func:`updater_content_hash`.
+
+        outcome : str
+          Outcome of the update.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO updates"
+                " (repo, config, updater, head_sha, updater_hash, outcome,"
+                " updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (repo, config, updater, head_sha, updater_hash, outcome, time.time()),
+            )
+
+    def is_unchanged(self, repo, config, updater, head_sha, updater_hash, outcome):
+        """Check if a repository and its updater configuration have not
+        changed since its last update and this had certain outcome.
+
+        Parameters
+        ----------
+
+        repo : str
+          Full name of the repository.
+
+        config : str
+          Full name of the repo-stream configuration repository.
+
+        updater : str
+          Name of the updater configuration file, without extension.
+
+        head_sha : str
+          Current SHA of the HEAD of the default branch of the repository.
+          If is ``None``, the repository is considered changed.
+
+        updater_hash : str
+          Hash of the current updater configuration content.
+
+        outcome : str
+          Outcome that the last update must have.
+
+        Returns
+        -------
+
+        bool : ``True`` if nothing has changed, ``False`` otherwise.
+        """
+        if head_sha is None:
+            return False
+        state = self.get(repo, config, updater)
+        return (
+            state is not None
+            and state["head_sha"] == head_sha
+            and state["updater_hash"] == updater_hash
+            and state["outcome"] == outcome
+        )
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
@@ -1,86 +1,131 @@
 """repo-stream update command"""
 
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
 import json
-import multiprocessing
 import os
 import subprocess
 import sys
-import urllib.request
 from urllib.error import HTTPError
 
-import yaml
-from pre_commit.main import main as pre_commit_run
-
+from repo_stream.cache import HTTPCache
 from repo_stream.git import (
+    DEFAULT_MIRROR_MAX_AGE,
+    GITHUB_GIT_URL,
+    MirrorCache,
     git_add_all_commit,
     git_add_remote,
+    git_head_commit_tree,
     git_push,
     git_random_checkout,
     git_set_remote_url,
-    repo_default_branch_name,
+    git_working_tree_changes,
     there_are_untracked_changes,
     tmp_repo,
 )
 from repo_stream.github import (
-    add_github_auth_headers,
-    create_github_pr,
-    download_raw_githubusercontent,
+    GITHUB_API_URL,
+    GITHUB_RAW_URL,
+    GithubClient,
+    get_github_client,
     get_github_prs_number_head_body,
-    get_user_repos,
-    repo_url_to_full_name,
+    run_sync,
 )
+from repo_stream.graphql import iter_discover_user_repos
+from repo_stream.hooks import (
+    hooks_can_apply,
+    hooks_filters,
+    hooks_manifests_locations,
+    parse_hooks_manifest,
+    sparse_checkout_patterns,
+)
+from repo_stream.journal import Journal
+from repo_stream.metrics import Metrics, activate_metrics, get_metrics
+from repo_stream.pipeline import Stage, merge_sources, run_pipeline
+from repo_stream.precommit import (
+    PreCommitPool,
+    pre_commit_home_cache_key,
+    run_pre_commit,
+    warm_up_hook_environments,
+)
+from repo_stream.records import NOT_FETCHED, Target
+from repo_stream.resilience import REQUEST_ERRORS
+from repo_stream.resources import (
+    DEFAULT_API_SLOTS,
+    DEFAULT_NETWORK_SLOTS,
+    RESOURCE_CPU,
+    RESOURCE_NETWORK,
+    ResourceScheduler,
+)
+from repo_stream.scanner import fetch_pre_commit_config, repo_stream_hooks_args
+from repo_stream.shard import in_shard
+from repo_stream.state import StateStore, updater_content_hash
+
+
+OUTCOME_UP_TO_DATE = "up-to-date"
+OUTCOME_PR_ALREADY_OPENED = "pr-already-opened"
+OUTCOME_PR_DRY_RUN = "pr-dry-run"
+OUTCOME_PR_OPENED = "pr-opened"
+OUTCOME_FAILED = "failed"
+OUTCOME_SKIPPED = "skipped"
+
+COMMIT_MESSAGE = "repo-stream update"
+COMMIT_MODE_PUSH = "push"
+COMMIT_MODE_API = "api"
+COMMIT_MODES = (COMMIT_MODE_PUSH, COMMIT_MODE_API)
+
+
+async def _repo_stream_targets(client, repo):
+    # updates defined by the repo-stream hooks of a repository, ``None`` if
+    # its pre-commit configuration can't be downloaded
+    if repo.pre_commit_config is not NOT_FETCHED:
+        pc_config = repo.pre_commit_config
+    else:
+        try:
+            pc_config = await fetch_pre_commit_config(client, repo)
+        except REQUEST_ERRORS as err:
+            sys.stderr.write(
+                "Error downloading the pre-commit configuration of"
+                f" repository '{repo.full_name}': {err}\n"
+            )
+            return None
+    if pc_config is None:
+        return []
 
-
-def _parse_repo_stream_hook_args(args):
-    response = {}
-
-    _next_is_config, _next_is_updater = (False, False)
-    for arg in args:
-        if _next_is_config:
-            response["config"] = repo_url_to_full_name(arg)
-            _next_is_config = False
-        elif _next_is_updater:
-            response["updater"] = arg
-            _next_is_updater = False
-        else:
-            arg_without_script = arg.replace("-", "")
-            if arg_without_script == "config":
-                _next_is_config = True
-            elif arg_without_script == "updater":
-                _next_is_updater = True
-            elif "=" in arg:
-                argname, value = arg.split("=")
-                argname = argname.replace("-", "")
-                response[argname] = (
-                    repo_url_to_full_name(value) if argname == "config" else value
-                )
-                _next_is_config = False
-                _next_is_updater = False
+    response = []
+    for hook_args in repo_stream_hooks_args(
+        pc_config,
+        blob_sha=repo.pre_commit_config_sha,
+    ):
+        sys.stdout.write(
+            f" - repo={repo.full_name}"
+            f" config={hook_args['config']}"
+            f" updater={hook_args['updater']}\n"
+        )
+        response.append(
+            Target(
+                repo.full_name,
+                repo.default_branch,
+                hook_args["config"],
+                hook_args["updater"],
+                pushed_at=repo.pushed_at,
+                size=repo.size,
+                head_sha=repo.head_sha,
+            )
+        )
     return response
 
 
-def _get_repo_tree(repo):
-    default_branch_name = repo_default_branch_name(repo)
-
-    repo_tree_url = (
-        f"https://api.github.com/repos/{repo}/git/trees/"
-        f"{default_branch_name}?recursive=0"
+async def _filter_repos_with_repo_stream_hook(client, repos):
+    repos_targets = await asyncio.gather(
+        *[_repo_stream_targets(client, repo) for repo in repos]
     )
-    req = urllib.request.Request(repo_tree_url)
-    add_github_auth_headers(req)
-    tree_req = urllib.request.urlopen(req)
-    return (repo, json.loads(tree_req.read().decode("utf-8"))["tree"])
-
+    return [target for targets in repos_targets for target in targets or []]
 
-def _get_file(args):
-    repo, default_branch_name, url = args
-    file_req = urllib.request.urlopen(url)
-    file_content = file_req.read().decode("utf-8")
-    pc_config = yaml.safe_load(file_content)
-    return (repo, default_branch_name, pc_config["repos"])
 
-
-def filter_repos_with_repo_stream_hook(repos):
+def filter_repos_with_repo_stream_hook(repos, client=None):
     """Filter repositories which have a pre-commit configuration file and
     repo-stream hook defined inside it.
 
@@ -88,60 +133,30 @@ def filter_repos_with_repo_stream_hook(repos):
     ----------
 
     repos : list
-      Repositories of a Github user.
-    """
-    sys.stdout.write("Searching repo-stream hooks...\n")
-    cpu_cores = multiprocessing.cpu_count()
-    pool = multiprocessing.Pool(processes=cpu_cores)
-
-    trees = pool.map(_get_repo_tree, repos)
-
-    response = []
+      Records of the repositories of a Github user, as returned by
+      :py:func:`repo_stream.github.get_user_repos`, for which the pre-commit
+      configuration will be downloaded, or by
+      :py:func:`repo_stream.graphql.discover_user_repos`, which already
+      include it.
 
-    repo_file_urls = []
+    client : repo_stream.github.GithubClient, optional
+      Client used to perform the requests. By default the shared client.
 
-    for repo, tree in trees:
-        default_branch_name = repo_default_branch_name(repo)
-
-        for file in tree:
-            if file["path"] == ".pre-commit-config.yaml":
-                file_url = (
-                    f"https://raw.githubusercontent.com/{repo}/"
-                    f"{default_branch_name}/.pre-commit-config.yaml"
-                )
-                repo_file_urls.append((repo, default_branch_name, file_url))
-                break
-
-    files_results = pool.map(_get_file, repo_file_urls)
-
-    for repo, default_branch_name, pc_repos in files_results:
-        for pc_repo in pc_repos:
-            pc_repo_full_name = repo_url_to_full_name(pc_repo["repo"])
-            if pc_repo_full_name == "mondeja/repo-stream":
-                for hook in pc_repo["hooks"]:
-                    if hook["id"] == "repo-stream":
-                        hook_args = _parse_repo_stream_hook_args(hook["args"])
-
-                        sys.stdout.write(
-                            f" - repo={repo}"
-                            f" config={hook_args['config']}"
-                            f" updater={hook_args['updater']}\n"
-                        )
-                        response.append(
-                            {
-                                "repo": repo,
-                                "default_branch_name": default_branch_name,
-                                **hook_args,
-                            }
-                        )
+    Returns
+    -------
 
-    return response
+    list : Updates defined by the repo-stream hooks of the repositories, as
+      :py:class:`repo_stream.records.Target` instances.
+    """
+    sys.stdout.write("Searching repo-stream hooks...\n")
+    return run_sync(
+        _filter_repos_with_repo_stream_hook(client or get_github_client(), repos)
+    )
 
 
-def _get_stream_pc_config(args):
-    index, config, default_branch_name, updater, repo = args
+async def _get_stream_pc_config(client, config, default_branch_name, updater, repo):
     try:
-        content = download_raw_githubusercontent(
+        content = await client.download_raw_githubusercontent(
             config,
             default_branch_name,
             updater,
@@ -156,87 +171,916 @@ def _get_stream_pc_config(args):
             )
             return None
         raise err
-    return (index, content)
+    return content
+
+
+async def _get_hooks_manifest(client, repo, rev):
+    # hooks defined by a repository, ``None`` if they can't be known
+    try:
+        content = await client.download_raw_githubusercontent(
+            repo,
+            rev,
+            ".pre-commit-hooks",
+        )
+    except REQUEST_ERRORS:
+        return None
+    return parse_hooks_manifest(content)
+
+
+async def _get_stream_config_pre_commit_configurations(client, repos_stream_config):
+    results = await asyncio.gather(
+        *[
+            _get_stream_pc_config(
+                client,
+                repo.config,
+                repo.default_branch_name,
+                repo.updater,
+                repo.repo,
+            )
+            for repo in repos_stream_config
+        ]
+    )
 
+    response = []
+    for repo, content in zip(repos_stream_config, results):
+        if content is not None:
+            repo.updater_content = content
+            response.append(repo)
+    return response
 
-def get_stream_config_pre_commit_configurations(repos_stream_config):
+
+def get_stream_config_pre_commit_configurations(repos_stream_config, client=None):
     """Add to repo-stream configurations for all collected repositories the
     content of the pre-commit configuration file that will be used to perform
     the update.
 
+    Repositories whose updater configuration file can't be found are
+    discarded.
+
     Parameters
     ----------
 
     repos_stream_config : list
       Collected repositories with repo-stream configurations searching in
       Github repositories for users.
+
+    client : repo_stream.github.GithubClient, optional
+      Client used to perform the requests. By default the shared client.
     """
-    cpu_cores = multiprocessing.cpu_count()
-    if len(repos_stream_config) < cpu_cores:
-        cpu_cores = len(repos_stream_config) or 1
-    pool = multiprocessing.Pool(processes=cpu_cores)
-
-    args = [
-        (
-            i,
-            repo["config"],
-            repo["default_branch_name"],
-            repo["updater"],
-            repo["repo"],
+    return run_sync(
+        _get_stream_config_pre_commit_configurations(
+            client or get_github_client(),
+            repos_stream_config,
         )
-        for i, repo in enumerate(repos_stream_config)
-    ]
-    results = pool.map(_get_stream_pc_config, args)
-    for i, content in results:
-        repos_stream_config[i]["updater_content"] = content
-    return repos_stream_config
+    )
+
+
+def _parse_pr_body_config_updater(body):
+    config, updater = (None, None)
+    for line in (body or "").splitlines():
+        if "config=" in line:
+            config = line.split("config=")[1].strip()
+        elif "updater=" in line:
+            updater = line.split("updater=")[1].strip()
+    return (config, updater)
+
+
+async def _search_user_prs(client, username, branch_prefix):
+    # the ``head:`` qualifier matches the pull requests whose head branch
+    # name starts with the prefix, so the search results don't include the
+    # head references to check them
+    try:
+        total_count, prs = await client.search_issues(
+            f"is:pr is:open head:{branch_prefix} user:{username}",
+            total_count=True,
+        )
+    except HTTPError as err:
+        if err.code == 422:  # user does not exist
+            return []
+        raise err
+    if total_count > len(prs):
+        return None  # more than the 1000 results returned by the search API
+    return prs
+
+
+async def _get_opened_prs_index(client, usernames, branch_prefix):
+    try:
+        users_prs = await asyncio.gather(
+            *[
+                _search_user_prs(client, username, branch_prefix)
+                for username in usernames
+            ]
+        )
+    except REQUEST_ERRORS as err:
+        # the search API has its own stricter rate limit
+        sys.stderr.write(
+            f"Error searching opened pull requests ({err}), they will be"
+            " checked for each repository.\n"
+        )
+        return None
+    if None in users_prs:
+        sys.stderr.write(
+            "Too many opened pull requests found by the search API, they"
+            " will be checked for each repository.\n"
+        )
+        return None
+
+    response = {}
+    for prs in users_prs:
+        for pr in prs:
+            config, updater = _parse_pr_body_config_updater(pr["body"])
+            repo = "/".join(pr["repository_url"].split("/")[-2:])
+            response.setdefault((repo, config, updater), []).append(pr["number"])
+    return response
 
 
-def check_pr_already_opened(repo, branch_prefix):
+def get_opened_prs_index(usernames, branch_prefix="repo-stream--", client=None):
+    """Build an index of the repo-stream update pull requests opened for the
+    repositories of some users.
+
+    The pull requests are retrieved using the Github search API, so all the
+    pull requests of a user are obtained in a few requests. Their head
+    references are not checked, the search only matches the pull requests
+    whose head branch name starts with ``branch_prefix``.
+
+    Parameters
+    ----------
+
+    usernames : list
+      Users whose repositories pull requests will be indexed.
+
+    branch_prefix : str, optional
+      Prefix that must starts with the head reference of the pull requests to
+      consider that are repo-stream update pull requests.
+
+    client : repo_stream.github.GithubClient, optional
+      Client used to perform the requests. By default the shared client.
+
+    Returns
+    -------
+
+    dict : Numbers of the opened pull requests, by tuples of repository full
+      name, configuration repository and updater. ``None`` if the index
+      can't be built completely, because the search fails or finds more
+      than the 1000 pull requests that returns for a user, so the pull
+      requests must be checked for each repository.
+    """
+    return run_sync(
+        _get_opened_prs_index(client or get_github_client(), usernames, branch_prefix)
+    )
+
+
+def check_pr_already_opened(repo, branch_prefix, client=None, prs_index=None):
     """Check if a repo-stream update pull request is already opened given a
     configuration.
 
     Parameters
     ----------
 
-    repo : dict
-      Repository object. This must contain the fields ``repo`` with the name
-      of the repository to check, a ``config`` with the repository used to
-      extract the pre-commit configuration for this update and a ``updater``
-      value with a file path where the configuration is located.
+    repo : repo_stream.records.Target
+      Update of the repository to check, defined by the name of the
+      repository, the repository used to extract the pre-commit
+      configuration for this update and the updater configuration file.
 
     branch_prefix : str
       Prefix that must starts with the head reference of the pull request to
       consider that is a repo-stream update pull request.
 
+    client : repo_stream.github.GithubClient, optional
+      Client used to perform the requests. By default the shared client.
+
+    prs_index : dict, optional
+      Index of opened pull requests, as returned by
+      :py:func:`get_opened_prs_index`. If defined, the pull requests are
+      checked against it instead of requesting them for the repository.
+
     Returns
     -------
 
     bool : Indicates if the pull request is already opened, so there is no
       need to open another.
     """
-    # get pull requests to see if there is one already open
-    response = False
-    prs = get_github_prs_number_head_body(repo["repo"])
-    for number, head, body in prs:
-        if not head.startswith(branch_prefix):
-            continue
-
-        config, updater = (None, None)
-        for line in body.splitlines():
-            if "config=" in line:
-                config = line.split("config=")[1].strip()
-            elif "updater=" in line:
-                updater = line.split("updater=")[1].strip()
-        if config == repo["config"] and updater == repo["updater"]:
+    if prs_index is not None:
+        numbers = prs_index.get((repo.repo, repo.config, repo.updater), [])
+    else:
+        # get pull requests to see if there is one already open
+        numbers = []
+        prs = get_github_prs_number_head_body(repo.repo, client=client)
+        for number, head, body in prs:
+            if not head.startswith(branch_prefix):
+                continue
+            config, updater = _parse_pr_body_config_updater(body)
+            if config == repo.config and updater == repo.updater:
+                numbers.append(number)
+
+    for number in numbers:
+        sys.stdout.write(
+            f"Pull request #{number} already opened"
+            f" for update using '{repo.config}/"
+            f"{repo.updater}.yaml' configuration.\n"
+        )
+    return bool(numbers)
+
+
+def _update_repo_branch(
+    repo,
+    branch_prefix="repo-stream--",
+    clone_depth=1,
+    client=None,
+    mirror_cache=None,
+    sparse_clone=False,
+    pre_commit_home=None,
+    prs_index=None,
+    git_url=GITHUB_GIT_URL,
+    pre_commit_pool=None,
+    commit_mode=COMMIT_MODE_PUSH,
+    scheduler=None,
+):
+    # clone the repository, run pre-commit and push the changes to a new
+    # branch, returning the outcome of the update if it has finished
+    scheduler = scheduler or ResourceScheduler()
+    gh_username = os.environ.get("GITHUB_USERNAME")
+    gh_token = os.environ.get("GITHUB_TOKEN")
+    metrics = get_metrics()
+
+    sys.stdout.write(f"Cloning '{repo.repo}'...\n")
+
+    tmp_repo_kwargs = dict(
+        username=gh_username,
+        token=gh_token,
+        clone_depth=clone_depth,
+        mirror_cache=mirror_cache,
+        branch=repo.default_branch_name,
+        sparse_patterns=(
+            sparse_checkout_patterns(repo.updater_content) if sparse_clone else None
+        ),
+        base_url=git_url,
+        # the branches are created through the API, so the credentials are
+        # not stored in the remote URL of the clone
+        store_credentials=commit_mode != COMMIT_MODE_API,
+    )
+
+    try:
+        with contextlib.ExitStack() as stack:
+            with scheduler.slot(RESOURCE_NETWORK):
+                clone_start = metrics.clock()
+                repo_dirpath = stack.enter_context(
+                    tmp_repo(repo.repo, **tmp_repo_kwargs)
+                )
+                metrics.add_span("clone", metrics.clock() - clone_start, repo=repo.repo)
+
+            config_filepath = os.path.join(
+                os.path.abspath(os.path.dirname(repo_dirpath)),
+                "._pre-commit-config.yaml",
+            )
+
+            with open(config_filepath, "w") as f:
+                f.write(repo.updater_content)
+
+            new_branch_name = git_random_checkout(
+                prefix=branch_prefix,
+                cwd=repo_dirpath,
+            )
+
             sys.stdout.write(
-                f"Pull request #{number} already opened"
-                f" for update using '{config}/"
-                f"{updater}.yaml' configuration.\n"
+                f"Running pre-commit for '{repo.repo}' using"
+                f" '{repo.config}/{repo.updater}.yaml' config\n"
             )
-            response = True
+            with scheduler.slot(RESOURCE_CPU), metrics.span(
+                "pre_commit", repo=repo.repo
+            ):
+                if pre_commit_pool is not None:
+                    result = pre_commit_pool.run(config_filepath, repo_dirpath)
+                    sys.stdout.write(result["output"])
+                    pre_commit_exitcode = result["exitcode"]
+                    changed = bool(result["changed_files"])
+                else:
+                    pre_commit_exitcode = run_pre_commit(
+                        config_filepath,
+                        repo_dirpath,
+                        pre_commit_home=pre_commit_home,
+                    )
+                    changed = pre_commit_exitcode != 0 and (
+                        there_are_untracked_changes(cwd=repo_dirpath)
+                    )
+            if pre_commit_exitcode == 0 or not changed:
+                sys.stdout.write(f"Repository '{repo.repo}' is updated\n")
+                return (OUTCOME_UP_TO_DATE, None)
+
+            # get pull requests to see if there is one already open
+            if check_pr_already_opened(
+                repo,
+                branch_prefix,
+                client=client,
+                prs_index=prs_index,
+            ):
+                return (OUTCOME_PR_ALREADY_OPENED, None)
+
+            if commit_mode == COMMIT_MODE_API:
+                with metrics.span("api_commit", repo=repo.repo):
+                    base_sha, base_tree = git_head_commit_tree(cwd=repo_dirpath)
+                    run_sync(
+                        client.create_branch_commit(
+                            repo.repo,
+                            new_branch_name,
+                            base_sha,
+                            base_tree,
+                            COMMIT_MESSAGE,
+                            git_working_tree_changes(cwd=repo_dirpath),
+                        )
+                    )
+                sys.stdout.write(f"Created branch '{new_branch_name}'\n")
+                return (None, new_branch_name)
+
+            # pull request
+            with scheduler.slot(RESOURCE_NETWORK), metrics.span("push", repo=repo.repo):
+                try:
+                    git_add_remote(
+                        repo.repo,
+                        gh_username,
+                        gh_token,
+                        remote="origin",
+                        cwd=repo_dirpath,
+                        base_url=git_url,
+                    )
+                except subprocess.CalledProcessError:
+                    pass
+                git_set_remote_url(
+                    repo.repo,
+                    gh_username,
+                    gh_token,
+                    remote="origin",
+                    cwd=repo_dirpath,
+                    base_url=git_url,
+                )
+                git_add_all_commit(title=COMMIT_MESSAGE, cwd=repo_dirpath)
+                git_push("origin", new_branch_name, cwd=repo_dirpath)
+            sys.stdout.write(f"Pushed branch '{new_branch_name}'\n")
+    except (subprocess.SubprocessError, *REQUEST_ERRORS) as err:
+        sys.stderr.write(f"Error updating repository '{repo.repo}': {err}\n")
+        return (OUTCOME_FAILED, None)
+    return (None, new_branch_name)
+
+
+async def _open_update_pr(client, repo, new_branch_name, dry_run=False):
+    if dry_run:
+        sys.stdout.write(
+            "Pull request would be created for repository"
+            f" '{repo.repo}' (triggered by"
+            f" '{repo.config}/{repo.updater}.yaml')\n"
+        )
+        return OUTCOME_PR_DRY_RUN
 
-    return response
+    sys.stdout.write(
+        f"Creating pull request for repository"
+        f" '{repo.repo}' (triggered by"
+        f" '{repo.config}/{repo.updater}.yaml')\n"
+    )
+    try:
+        created_pr = await client.create_github_pr(
+            repo.repo,
+            "repo-stream update",
+            (
+                "<!--\nThis comment is autogenerated."
+                " Please, don't edit it.\n\n"
+                f"config={repo.config}\n"
+                f"updater={repo.updater}\n"
+                "-->\n\n"
+                f"> Opened by {repo.config}/"
+                f"{repo.updater}.yaml using"
+                "[repo-stream](https://github.com/mondeja/"
+                "repo-stream#readme)."
+            ),
+            new_branch_name,
+            repo.default_branch_name,
+        )
+    except REQUEST_ERRORS as err:
+        sys.stderr.write(
+            f"Error creating pull request for repository '{repo.repo}': {err}\n"
+        )
+        return OUTCOME_FAILED
+    sys.stdout.write(
+        "Pull request created by user"
+        f" '{created_pr['user']['login']}'.\n  You can"
+        f" see it at {created_pr['html_url']}\n"
+    )
+    return OUTCOME_PR_OPENED
+
+
+def update_repo(
+    repo,
+    branch_prefix="repo-stream--",
+    dry_run=False,
+    clone_depth=1,
+    client=None,
+    mirror_cache=None,
+    sparse_clone=False,
+    pre_commit_home=None,
+    prs_index=None,
+    git_url=GITHUB_GIT_URL,
+    pre_commit_pool=None,
+    commit_mode=COMMIT_MODE_PUSH,
+    scheduler=None,
+):
+    """Update a repository running pre-commit with its repo-stream updater
+    configuration and opening a pull request with the changes.
+
+    All the operations are performed inside a temporal clone of the
+    repository, without changing the current working directory, so several
+    repositories can be updated concurrently.
+
+    Parameters
+    ----------
+
+    repo : repo_stream.records.Target
+      Update of the repository, as returned by
+      :py:func:`get_stream_config_pre_commit_configurations`.
+
+    branch_prefix : str, optional
+      Branch name prefix used for creating the patches.
+
+    dry_run : bool, optional
+      Don't make pull requests, just prints to STDOUT when pull requests would
+      be opened.
+
+    clone_depth : int, optional
+      Value for argument ``--depth`` of ``git clone`` command.
+
+    client : repo_stream.github.GithubClient, optional
+      Client used to perform the requests. By default the shared client.
+
+    mirror_cache : repo_stream.git.MirrorCache, optional
+      Cache of mirrors from which the repository is cloned.
+
+    sparse_clone : bool, optional
+      Only checkout the files that the hooks of the updater configuration
+      could process, fetching the contents of the files lazily. If the files
+      can't be determined from the configuration, the full repository is
+      checked out.
+
+    pre_commit_home : str, optional
+      Directory where pre-commit stores the hook environments.
+
+    prs_index : dict, optional
+      Index of opened pull requests, as returned by
+      :py:func:`get_opened_prs_index`, used to check if an update pull
+      request is already opened.
+
+    git_url : str, optional
+      URL under which the repository is hosted, used to clone it and push
+      the changes.
+
+    pre_commit_pool : repo_stream.precommit.PreCommitPool, optional
+      Pool of worker processes where pre-commit is executed. By default,
+      pre-commit is executed in a new process.
+
+    commit_mode : str, optional
+      How the branch with the changes is created. ``"push"`` commits the
+      changes and pushes them and ``"api"`` creates the commit and the
+      branch through the Git Data API of Github, without pushing, which
+      requires a Github token.
+
+    scheduler : repo_stream.resources.ResourceScheduler, optional
+      Scheduler whose network and CPU slots are taken to clone and push the
+      repository and to run pre-commit, shared by the repositories updated
+      concurrently.
+
+    Returns
+    -------
+
+    str : Outcome of the update, one of ``OUTCOME_UP_TO_DATE``,
+      ``OUTCOME_PR_ALREADY_OPENED``, ``OUTCOME_PR_DRY_RUN``,
+      ``OUTCOME_PR_OPENED`` or ``OUTCOME_FAILED``.
+    """
+    client = client or get_github_client()
+    outcome, new_branch_name = _update_repo_branch(
+        repo,
+        branch_prefix=branch_prefix,
+        clone_depth=clone_depth,
+        client=client,
+        mirror_cache=mirror_cache,
+        sparse_clone=sparse_clone,
+        pre_commit_home=pre_commit_home,
+        prs_index=prs_index,
+        git_url=git_url,
+        pre_commit_pool=pre_commit_pool,
+        commit_mode=commit_mode,
+        scheduler=scheduler,
+    )
+    if outcome is not None:
+        return outcome
+    return run_sync(_open_update_pr(client, repo, new_branch_name, dry_run=dry_run))
+
+
+async def _update_pipeline(
+    client,
+    usernames,
+    include_forks=False,
+    branch_prefix="repo-stream--",
+    repositories_to_ignore=[],
+    dry_run=False,
+    clone_depth=1,
+    discovery="rest",
+    scheduler=None,
+    mirror_cache=None,
+    sparse_clone=False,
+    state_store=None,
+    pre_commit_home=None,
+    git_url=GITHUB_GIT_URL,
+    shard=None,
+    journal=None,
+    pre_commit_pool=None,
+    commit_mode=COMMIT_MODE_PUSH,
+    preflight=False,
+    resolve_only=False,
+):
+    # discovery, configurations fetching, clone, pre-commit execution and pull
+    # request creation are connected stages, so the first repositories are
+    # being updated while the rest are still being discovered
+    loop = asyncio.get_event_loop()
+    scheduler = scheduler or ResourceScheduler(api=client.max_requests_in_flight)
+    # each repository being cloned, processed by pre-commit or pushed takes
+    # a thread, but only holds the slot of the resource that it is using
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=scheduler.repositories_in_flight
+    )
+    metrics = get_metrics()
+    fork = False if not include_forks else None
+    update_exitcode = 0
+    # usernames are case insensitive in Github
+    unique_usernames = {}
+    for username in usernames:
+        unique_usernames.setdefault(username.lower(), username)
+    usernames = list(unique_usernames.values())
+
+    # opened update pull requests, searched once for all the users
+    prs_index = (
+        asyncio.ensure_future(_get_opened_prs_index(client, usernames, branch_prefix))
+        if not resolve_only
+        else None
+    )
+    # updater configurations downloads and hooks warm ups, by configuration
+    updater_contents, warm_ups = ({}, {})
+    # filters of the hooks by configuration, hooks manifests by repository
+    # and revision and trees by repository, used by the pre-flight checks
+    contents_hooks_filters, hooks_manifests, repos_trees = ({}, {}, {})
+    # outcomes of the updates of each repository and updater
+    updates = []
+
+    def add_update(target, outcome, resumed=False):
+        nonlocal update_exitcode
+
+        if resumed:
+            metrics.inc("updates_resumed", outcome=outcome)
+            if outcome == OUTCOME_FAILED:
+                update_exitcode = 1
+        else:
+            metrics.inc("updates", outcome=outcome)
+            if journal is not None:
+                journal.add_update(target.repo, target.config, target.updater, outcome)
+        updates.append(
+            {
+                "repo": target.repo,
+                "config": target.config,
+                "updater": target.updater,
+                "outcome": outcome,
+            }
+        )
+
+    async def discover_user(username):
+        nonlocal update_exitcode
+
+        sys.stdout.write(f"Processing @{username} user...\n")
+        journal_repos = (
+            journal.discovered_repos(username) if journal is not None else None
+        )
+        if journal_repos is not None:
+            sys.stdout.write(
+                f"{len(journal_repos)} repositories of @{username} resumed"
+                " from the journal.\n"
+            )
+            for repo in journal_repos:
+                yield repo
+            return
+
+        if discovery == "graphql":
+            user_repos = iter_discover_user_repos(
+                client,
+                username,
+                fork=fork,
+                repositories_to_ignore=repositories_to_ignore,
+            )
+        else:
+            user_repos = client.iter_user_repos(
+                username,
+                fork=fork,
+                repositories_to_ignore=repositories_to_ignore,
+            )
+
+        n_user_repos = 0
+        try:
+            # the time waiting for the next stages is not measured
+            start = metrics.clock()
+            async for repo in user_repos:
+                metrics.add_span("discovery", metrics.clock() - start)
+                if not in_shard(repo.full_name, shard):
+                    start = metrics.clock()
+                    continue
+                metrics.inc("repositories_discovered")
+                n_user_repos += 1
+                if journal is not None:
+                    journal.add_repo(username, repo)
+                yield repo
+                start = metrics.clock()
+        except REQUEST_ERRORS as err:
+            if isinstance(err, HTTPError) and err.code == 404:
+                sys.stderr.write(f"User '{username}' does not exists in Github.\n")
+            else:
+                # the repositories of the other users are still updated
+                sys.stderr.write(
+                    f"Error discovering the repositories of @{username}: {err}\n"
+                )
+            update_exitcode = 1
+            return
+
+        if journal is not None:
+            journal.user_discovered(username)
+        sys.stdout.write(
+            f"{n_user_repos}{' non forked' if not include_forks else ''}"
+            f" repositories of @{username} checked.\n"
+        )
+
+    async def discover():
+        # the users are discovered concurrently, sharing the requests budget
+        # of the client, and the repositories reachable from several of them
+        # are only updated once
+        discovered_repos = set()
+        async for repo in merge_sources(
+            [discover_user(username) for username in usernames]
+        ):
+            repo_key = repo.full_name.lower()
+            if repo_key in discovered_repos:
+                metrics.inc("repositories_duplicated")
+                continue
+            discovered_repos.add(repo_key)
+            yield repo
+
+    def request_failed(target, action, err):
+        # a failed request only fails the update of its repository
+        nonlocal update_exitcode
+
+        sys.stderr.write(
+            f"Error {action} for repository '{target.repo}' and"
+            f" '{target.config}/{target.updater}.yaml': {err}\n"
+        )
+        add_update(target, OUTCOME_FAILED)
+        update_exitcode = 1
+
+    async def find_hooks(repo):
+        nonlocal update_exitcode
+
+        if journal is not None and journal.is_checked(repo.full_name):
+            return
+        with metrics.span("find_hooks", repo=repo.full_name):
+            targets = await _repo_stream_targets(client, repo)
+        if targets is None:
+            # not marked as checked in the journal, so a resumed run retries it
+            metrics.inc("repositories_failed")
+            update_exitcode = 1
+            return
+        if not targets and journal is not None:
+            journal.repo_checked(repo.full_name)
+        for target in targets:
+            metrics.inc("repositories_with_hooks")
+            if journal is not None:
+                outcome = journal.update_outcome(
+                    target.repo, target.config, target.updater
+                )
+                if outcome is not None:
+                    add_update(target, outcome, resumed=True)
+                    continue
+            yield target
+
+    async def fetch_updater(target):
+        key = (target.config, target.default_branch_name, target.updater)
+        if key not in updater_contents:
+            updater_contents[key] = asyncio.ensure_future(
+                _get_stream_pc_config(client, *key, target.repo)
+            )
+        try:
+            with metrics.span("fetch_updater", repo=target.repo):
+                content = await updater_contents[key]
+        except REQUEST_ERRORS as err:
+            request_failed(target, "downloading the updater configuration", err)
+            return
+        if content is not None:
+            target.updater_content = content
+            yield target
+
+    async def get_hooks_filters(content):
+        locations = hooks_manifests_locations(content)
+        for location in locations:
+            if location not in hooks_manifests:
+                hooks_manifests[location] = asyncio.ensure_future(
+                    _get_hooks_manifest(client, *location)
+                )
+        manifests = await asyncio.gather(
+            *[hooks_manifests[location] for location in locations]
+        )
+        return hooks_filters(content, dict(zip(locations, manifests)))
+
+    async def get_repo_tree(target):
+        try:
+            return await client.get_repo_tree(
+                target.repo,
+                target.head_sha or target.default_branch_name,
+            )
+        except REQUEST_ERRORS:
+            return None
+
+    async def can_apply(target):
+        # check if some hook of the updater configuration could process
+        # files of the repository, before cloning it
+        content = target.updater_content
+        if content not in contents_hooks_filters:
+            contents_hooks_filters[content] = asyncio.ensure_future(
+                get_hooks_filters(content)
+            )
+        filters = await contents_hooks_filters[content]
+        if filters is None:
+            return True
+
+        if target.repo not in repos_trees:
+            repos_trees[target.repo] = asyncio.ensure_future(get_repo_tree(target))
+        tree = await repos_trees[target.repo]
+        return tree is None or hooks_can_apply(filters, tree)
+
+    def warm_up(content):
+        # hook environments are installed cloning the repositories of the
+        # hooks and downloading their dependencies
+        with scheduler.slot(RESOURCE_NETWORK):
+            return warm_up_hook_environments([content], pre_commit_home=pre_commit_home)
+
+    async def prepare(target):
+        nonlocal update_exitcode
+
+        if state_store is not None:
+            if target.head_sha is None:
+                try:
+                    with metrics.span("head_sha", repo=target.repo):
+                        target.head_sha = await client.get_branch_head_sha(
+                            target.repo,
+                            target.default_branch_name,
+                        )
+                except REQUEST_ERRORS as err:
+                    request_failed(target, "getting the default branch HEAD", err)
+                    return
+            if state_store.is_unchanged(
+                target.repo,
+                target.config,
+                target.updater,
+                target.head_sha,
+                updater_content_hash(target.updater_content),
+                OUTCOME_UP_TO_DATE,
+            ):
+                sys.stdout.write(
+                    f"Skipping '{target.repo}' for '{target.config}/"
+                    f"{target.updater}.yaml', unchanged since its last update\n"
+                )
+                add_update(target, OUTCOME_SKIPPED)
+                return
+
+        if preflight:
+            with metrics.span("preflight", repo=target.repo):
+                applies = await can_apply(target)
+            if not applies:
+                sys.stdout.write(
+                    f"Skipping '{target.repo}' for '{target.config}/"
+                    f"{target.updater}.yaml', its hooks don't match any file"
+                    " of the repository\n"
+                )
+                metrics.inc("clones_avoided")
+                add_update(target, OUTCOME_SKIPPED)
+                if state_store is not None and target.head_sha is not None:
+                    # running pre-commit would not have changed it
+                    state_store.set(
+                        target.repo,
+                        target.config,
+                        target.updater,
+                        target.head_sha,
+                        updater_content_hash(target.updater_content),
+                        OUTCOME_UP_TO_DATE,
+                    )
+                return
+
+        # validate each distinct updater configuration and install its hooks
+        # environments once, before cloning any repository that uses it
+        content = target.updater_content
+        if content not in warm_ups:
+            warm_ups[content] = loop.run_in_executor(
+                executor, functools.partial(warm_up, content)
+            )
+        with metrics.span("warm_up", repo=target.repo):
+            warm_up_errors = await warm_ups[content]
+        if warm_up_errors:
+            sys.stderr.write(
+                f"Error preparing hooks of '{target.config}/"
+                f"{target.updater}.yaml' for repository '{target.repo}':\n"
+                f"{warm_up_errors[content]}\n"
+            )
+            add_update(target, OUTCOME_FAILED)
+            update_exitcode = 1
+            return
+        yield target
+
+    async def update_branch(target):
+        start = metrics.clock()
+        outcome, new_branch_name = await loop.run_in_executor(
+            executor,
+            functools.partial(
+                _update_repo_branch,
+                target,
+                branch_prefix=branch_prefix,
+                clone_depth=clone_depth,
+                client=client,
+                mirror_cache=mirror_cache,
+                sparse_clone=sparse_clone,
+                pre_commit_home=pre_commit_home,
+                prs_index=await prs_index,
+                git_url=git_url,
+                pre_commit_pool=pre_commit_pool,
+                commit_mode=commit_mode,
+                scheduler=scheduler,
+            ),
+        )
+        yield (target, outcome, new_branch_name, start)
+
+    async def open_pr(item):
+        nonlocal update_exitcode
+
+        target, outcome, new_branch_name, start = item
+        if outcome is None:
+            with metrics.span("pull_request", repo=target.repo):
+                outcome = await _open_update_pr(
+                    client,
+                    target,
+                    new_branch_name,
+                    dry_run=dry_run,
+                )
+        add_update(target, outcome)
+        metrics.observe("repo_update_seconds", metrics.clock() - start)
+        if outcome == OUTCOME_FAILED:
+            update_exitcode = 1
+        if state_store is not None:
+            state_store.set(
+                target.repo,
+                target.config,
+                target.updater,
+                target.head_sha,
+                updater_content_hash(target.updater_content),
+                outcome,
+            )
+        yield (target, outcome)
+
+    stages = [
+        Stage(find_hooks, concurrency=scheduler.api),
+        Stage(fetch_updater, concurrency=scheduler.api),
+    ]
+    if not resolve_only:
+        stages.extend(
+            [
+                Stage(prepare, concurrency=scheduler.api),
+                Stage(update_branch, concurrency=scheduler.repositories_in_flight),
+                Stage(open_pr, concurrency=scheduler.api),
+            ]
+        )
+    try:
+        await run_pipeline(discover(), stages)
+    finally:
+        if prs_index is not None:
+            prs_index.cancel()
+        executor.shutdown(wait=True)
+
+    # all the updater configurations used in the run, also those whose hooks
+    # have not been warmed up because their repositories were skipped
+    resolved_contents = [
+        content.result()
+        for content in updater_contents.values()
+        if content.done()
+        and not content.cancelled()
+        and content.exception() is None
+        and content.result() is not None
+    ]
+    return (update_exitcode, resolved_contents, updates)
+
+
+def _write_pre_commit_cache_key(filepath, updater_contents):
+    # the key is not written if no updater configuration has been resolved,
+    # so an empty set of hook environments is never persisted
+    if not updater_contents:
+        return
+    with open(filepath, "w") as f:
+        f.write(pre_commit_home_cache_key(updater_contents))
 
 
 def update(
@@ -246,6 +1090,32 @@ def update(
     repositories_to_ignore=[],
     dry_run=False,
     clone_depth=1,
+    cache_dir=None,
+    discovery="auto",
+    jobs=1,
+    network_jobs=DEFAULT_NETWORK_SLOTS,
+    api_jobs=DEFAULT_API_SLOTS,
+    mirror_cache_dir=None,
+    mirror_cache_max_age=DEFAULT_MIRROR_MAX_AGE,
+    mirror_cache_max_size=None,
+    sparse_clone=False,
+    state_file=None,
+    pre_commit_home=None,
+    pre_commit_cache_key_file=None,
+    api_url=GITHUB_API_URL,
+    raw_url=GITHUB_RAW_URL,
+    git_url=GITHUB_GIT_URL,
+    metrics_file=None,
+    metrics_format=None,
+    shard=None,
+    results_file=None,
+    journal_file=None,
+    resume=False,
+    pre_commit_timeout=None,
+    pre_commit_worker_max_jobs=100,
+    commit_mode=COMMIT_MODE_PUSH,
+    preflight=False,
+    only_pre_commit_cache_key=False,
 ):
     """Update repositories which have a repo-stream pre-commit config searching
     for certain users' repos, creating pull requests with the changes.
@@ -255,7 +1125,8 @@ def update(
     ----------
 
     usernames : list
-      Users for which to get repositories.
+      Users for which to get repositories. Their repositories are discovered
+      concurrently and those reachable from several users are updated once.
 
     include_forks : bool, optional
       Include forks of repositories stored by the user in its Github account.
@@ -275,150 +1146,280 @@ def update(
     clone_depth : Value for argument ``--depth`` of ``git clone`` commands
       used cloning the repositories.
 
+    cache_dir : str, optional
+      Directory where the responses of the Github API and raw files contents
+      are cached between runs. Cached responses are revalidated using
+      conditional requests, which don't count against the rate limit of
+      the Github API when the content has not changed.
+
+    discovery : str, optional
+      Backend used to discover the repositories of the users and their
+      pre-commit configurations. ``"graphql"`` retrieves them in batches
+      using the Github GraphQL API, which requires a Github token,
+      ``"rest"`` uses the REST API and raw files downloads and ``"auto"``
+      uses ``"graphql"`` if a Github token is defined, ``"rest"`` otherwise.
+
+    jobs : int, optional
+      Number of pre-commit executions running concurrently.
+
+    network_jobs : int, optional
+      Number of repositories being cloned or pushed concurrently. They are
+      cloned while pre-commit is running over the previous ones, so up to
+      ``jobs + network_jobs`` repositories are updated concurrently.
+
+    api_jobs : int, optional
+      Number of requests to the Github API performed concurrently.
+
+    mirror_cache_dir : str, optional
+      Directory where bare mirrors of the updated repositories are kept
+      between runs. If defined, mirrors are updated with incremental fetches
+      and each repository is cloned locally from its mirror.
+
+    mirror_cache_max_age : float, optional
+      Number of seconds after which unused mirrors are removed.
+
+    mirror_cache_max_size : int, optional
+      Maximum total size in bytes of the mirrors. When exceeded, the least
+      recently used mirrors are removed.
+
+    sparse_clone : bool, optional
+      Clone the repositories using partial clones and sparse checkouts
+      which only include the files that the hooks of the updater
+      configurations could process.
+
+    state_file : str, optional
+      Path to a SQLite database where the state of the updates is stored
+      between runs. If defined, repositories whose default branch HEAD and
+      updater configuration have not changed since their last update, which
+      didn't produce changes, are skipped.
+
+    pre_commit_home : str, optional
+      Directory where pre-commit stores the hook environments, shared by all
+      the updates. By default, the directory configured for pre-commit.
+
+    pre_commit_cache_key_file : str, optional
+      File where a key identifying the hook environments of all the updater
+      configurations used in the run is written, which can be used to
+      persist ``pre_commit_home`` between runs. Not written if no updater
+      configuration is found.
+
+    api_url : str, optional
+      URL of the Github API.
+
+    raw_url : str, optional
+      URL from which raw files contents of the repositories are downloaded.
+
+    git_url : str, optional
+      URL under which the repositories are hosted, used to clone them and
+      push the changes. Can be a local directory with bare repositories
+      named ``<owner>/<name>.git``.
+
+    metrics_file : str, optional
+      File where the timing spans of each stage and repository, counters
+      and histograms of the execution are written.
+
+    metrics_format : str, optional
+      Format of the metrics file, ``"json"`` or ``"prometheus"`` (text
+      format for the node exporter textfile collector). By default, it is
+      inferred from the extension of the file, being ``.prom`` files
+      written in the Prometheus format.
+
+    shard : tuple, optional
+      Index, starting at 1, and number of shards in which the repositories
+      are split, as returned by :py:func:`repo_stream.shard.parse_shard`.
+      Only the repositories of the shard are updated, so several processes
+      can update disjoint sets of repositories of the same users.
+
+    results_file : str, optional
+      JSON file where the exit code and the outcome of the update of each
+      repository and updater are written. The results of several shards
+      can be merged with :py:func:`repo_stream.shard.merge_results`.
+
+    journal_file : str, optional
+      Append-only file where the progress of the run is recorded: the
+      discovered repositories and the final outcome of each update.
+
+    resume : bool, optional
+      Resume the interrupted run recorded in ``journal_file``, if it was
+      executed with the same users and options. The discovery of the users
+      already discovered, the repositories without repo-stream hooks and
+      the completed updates are not repeated.
+
+    pre_commit_timeout : float, optional
+      Seconds after which a pre-commit execution is considered hung, its
+      worker process is killed and the update of the repository fails.
+
+    pre_commit_worker_max_jobs : int, optional
+      Number of pre-commit executions after which a worker process is
+      replaced by a new one.
+
+    commit_mode : str, optional
+      How the branches with the changes are created. ``"push"`` commits the
+      changes and pushes them, ``"api"`` creates the commits and the
+      branches through the Git Data API of Github using the persistent
+      connections of the client, without pushing nor including the token
+      in the remote URLs. ``"api"`` requires a Github token and sends three
+      more content creating requests for each changed repository, which are
+      spaced to honor the secondary rate limits of Github, so it is faster
+      when pushes are slow compared to that spacing.
+
+    preflight : bool, optional
+      Before cloning each repository, check in its tree, listed through the
+      Github API, if some hook of the updater configuration could process
+      any of its files, considering the ``files``, ``exclude`` and
+      ``types`` filters of the hooks and the manifests of their
+      repositories. Repositories whose files can't be processed by any hook
+      are skipped without cloning them.
+
+    only_pre_commit_cache_key : bool, optional
+      Only discover the repositories and download their updater
+      configurations to write the key of their hook environments in
+      ``pre_commit_cache_key_file``, without updating any repository. Allows
+      to restore the persisted ``pre_commit_home`` before the run.
+
     Returns
     -------
 
     int : ``0`` if no errors happened, ``1`` otherwise.
     """
-    update_exitcode = 0
-
-    gh_username = os.environ.get("GITHUB_USERNAME")
-    gh_token = os.environ.get("GITHUB_TOKEN")
+    # separate limits for each class of work, so slow transfers of
+    # repositories don't leave the pre-commit processes idle and the
+    # requests to the API don't depend on the number of processes
+    scheduler = ResourceScheduler(api=api_jobs, network=network_jobs, cpu=jobs)
+    client = GithubClient(
+        max_requests_in_flight=scheduler.api,
+        api_url=api_url,
+        raw_url=raw_url,
+        cache=HTTPCache(cache_dir) if cache_dir is not None else None,
+    )
 
-    for user_i, username in enumerate(usernames):
-        sys.stdout.write(f"Processing @{username} user: ")
-        try:
-            user_repos = get_user_repos(
-                username,
-                fork=False if not include_forks else None,
-                repositories_to_ignore=repositories_to_ignore,
+    # the resources are released also when the execution is interrupted by
+    # an error, the journal is only finished after a complete run
+    with contextlib.ExitStack() as stack:
+        stack.callback(client.close)
+        if commit_mode == COMMIT_MODE_API and not client.token:
+            sys.stderr.write(
+                "A Github token is required to create the branches through the"
+                " Github API.\n"
             )
-        except HTTPError as err:
-            if err.code == 404:
-                sys.stderr.write(f"User '{username}' does not exists in Github.\n")
-                update_exitcode = 1
-                continue
-            raise err
-
-        n_user_repos = len(user_repos)
-        if n_user_repos:
-            msg = f"{n_user_repos}"
-            if not include_forks:
-                msg += " non forked"
-            msg += " repositories will be checked.\n"
-            sys.stdout.write(msg)
-        else:
-            msg = "No repositories will be checked.\n"
-            sys.stdout.write(msg)
-            continue
-
-        # get repositories repo-stream pre-commit hook configurations
-        repos_stream_config = get_stream_config_pre_commit_configurations(
-            filter_repos_with_repo_stream_hook(user_repos)
-        )
-        if repos_stream_config is None:
-            update_exitcode = 1  # error
-            continue
-
-        sys.stdout.write("\n")
-
-        for repo in repos_stream_config:
-            sys.stdout.write(f"Cloning '{repo['repo']}'...\n")
-
-            tmp_repo_kwargs = dict(
-                username=gh_username,
-                token=gh_token,
-                clone_depth=clone_depth,
+            return 1
+
+        if discovery == "auto":
+            discovery = "graphql" if client.token else "rest"
+
+        if only_pre_commit_cache_key:
+            update_exitcode, updater_contents, _ = run_sync(
+                _update_pipeline(
+                    client,
+                    usernames,
+                    include_forks=include_forks,
+                    repositories_to_ignore=repositories_to_ignore,
+                    discovery=discovery,
+                    scheduler=scheduler,
+                    shard=shard,
+                    resolve_only=True,
+                )
             )
+            _write_pre_commit_cache_key(pre_commit_cache_key_file, updater_contents)
+            return update_exitcode
+
+        mirror_cache = None
+        if mirror_cache_dir is not None:
+            mirror_cache = MirrorCache(
+                mirror_cache_dir,
+                max_age=mirror_cache_max_age,
+                max_size=mirror_cache_max_size,
+            )
+            mirror_cache.prune()
+
+        state_store = None
+        if state_file is not None:
+            state_store = StateStore(state_file)
+            stack.callback(state_store.close)
+
+        journal = None
+        if journal_file is not None:
+            journal = Journal(
+                journal_file,
+                {
+                    "usernames": list(usernames),
+                    "include_forks": include_forks,
+                    "repositories_to_ignore": list(repositories_to_ignore),
+                    "dry_run": dry_run,
+                    "discovery": discovery,
+                    "shard": shard,
+                },
+                resume=resume,
+            )
+            stack.callback(journal.close)
+            if journal.resumed:
+                sys.stdout.write(f"Resuming the run recorded in '{journal_file}'\n")
+
+        # pre-commit is executed in worker processes which import it only once
+        pre_commit_pool = PreCommitPool(
+            processes=scheduler.cpu,
+            pre_commit_home=pre_commit_home,
+            max_jobs_per_worker=pre_commit_worker_max_jobs,
+            timeout=pre_commit_timeout,
+        )
 
-            with tmp_repo(repo["repo"], **tmp_repo_kwargs) as repo_dirpath:
-                config_filepath = os.path.join(
-                    os.path.abspath(os.path.dirname(repo_dirpath)),
-                    "._pre-commit-config.yaml",
+        metrics = Metrics()
+        with activate_metrics(metrics), metrics.span("total"):
+            try:
+                update_exitcode, updater_contents, updates = run_sync(
+                    _update_pipeline(
+                        client,
+                        usernames,
+                        include_forks=include_forks,
+                        branch_prefix=branch_prefix,
+                        repositories_to_ignore=repositories_to_ignore,
+                        dry_run=dry_run,
+                        clone_depth=clone_depth,
+                        discovery=discovery,
+                        scheduler=scheduler,
+                        mirror_cache=mirror_cache,
+                        sparse_clone=sparse_clone,
+                        state_store=state_store,
+                        pre_commit_home=pre_commit_home,
+                        git_url=git_url,
+                        shard=shard,
+                        journal=journal,
+                        pre_commit_pool=pre_commit_pool,
+                        commit_mode=commit_mode,
+                        preflight=preflight,
+                    )
                 )
-
-                with open(config_filepath, "w") as f:
-                    f.write(repo["updater_content"])
-
-                new_branch_name = git_random_checkout(prefix=branch_prefix)
-
-                sys.stdout.write(
-                    f"Running pre-commit using '{repo['config']}/"
-                    f"{repo['updater']}.yaml' config\n"
+            finally:
+                pre_commit_pool.close()
+
+        for resource, usage in client.scheduler.usage().items():
+            metrics.inc("rate_limit_used", usage["used"], resource=resource)
+            if usage["remaining"] is not None:
+                metrics.set(
+                    "rate_limit_remaining", usage["remaining"], resource=resource
                 )
-                pre_commit_exitcode = pre_commit_run(
-                    [
-                        "run",
-                        "-c",
-                        config_filepath,
-                    ]
+            sys.stdout.write(
+                f"Github API '{resource}' budget: {usage['used']} requests sent"
+                + (
+                    f", {usage['remaining']}/{usage['limit']} remaining.\n"
+                    if usage["remaining"] is not None
+                    else ".\n"
                 )
-                if pre_commit_exitcode != 0 and there_are_untracked_changes():
-                    # get pull requests to see if there is one already open
-                    _pull_request_opened = check_pr_already_opened(
-                        repo,
-                        branch_prefix,
-                    )
+            )
 
-                    if not _pull_request_opened:
-                        # pull request
-                        try:
-                            git_add_remote(
-                                repo["repo"],
-                                gh_username,
-                                gh_token,
-                                remote="origin",
-                            )
-                        except subprocess.CalledProcessError:
-                            pass
-                        git_set_remote_url(
-                            repo["repo"],
-                            gh_username,
-                            gh_token,
-                            remote="origin",
-                        )
-                        git_add_all_commit(title="repo-stream update")
-                        git_push("origin", new_branch_name)
-                        sys.stdout.write(f"Pushed branch '{new_branch_name}'")
-
-                        if dry_run:
-                            sys.stdout.write(
-                                "Pull request would be created for repository"
-                                f" '{repo['repo']}' (triggered by"
-                                f" '{repo['config']}/{repo['updater']}.yaml')\n"
-                            )
-                        else:
-                            sys.stdout.write(
-                                f"Creating pull request for repository"
-                                f" '{repo['repo']}' (triggered by"
-                                f" '{repo['config']}/{repo['updater']}.yaml')\n"
-                            )
-                            created_pr = create_github_pr(
-                                repo["repo"],
-                                "repo-stream update",
-                                (
-                                    "<!--\nThis comment is autogenerated."
-                                    " Please, don't edit it.\n\n"
-                                    f"config={repo['config']}\n"
-                                    f"updater={repo['updater']}\n"
-                                    "-->\n\n"
-                                    f"> Opened by {repo['config']}/"
-                                    f"{repo['updater']}.yaml using"
-                                    "[repo-stream](https://github.com/mondeja/"
-                                    "repo-stream#readme)."
-                                ),
-                                new_branch_name,
-                                repo["default_branch_name"],
-                            )
-                            sys.stdout.write(
-                                "Pull request created by user"
-                                f" '{created_pr['user']['login']}'.\n  You can"
-                                f" see it at {created_pr['html_url']}\n"
-                            )
-                else:
-                    sys.stdout.write("Repository is updated\n")
+        if pre_commit_cache_key_file is not None:
+            _write_pre_commit_cache_key(pre_commit_cache_key_file, updater_contents)
 
-        if user_i < (len(usernames) - 1):
-            sys.stdout.write("\n")
+        if metrics_file is not None:
+            metrics.write(metrics_file, format=metrics_format)
+
+        if results_file is not None:
+            with open(results_file, "w") as f:
+                json.dump(
+                    {"exitcode": update_exitcode, "updates": updates}, f, indent=2
+                )
+                f.write("\n")
 
-    return update_exitcode
+        if journal is not None:
+            journal.finish()
+        return update_exitcode
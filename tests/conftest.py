@@ -0,0 +1,96 @@
+"""Shared fixtures for repo-stream tests."""
+
+import http.server
+import json
+import socketserver
+import threading
+
+import pytest
+
+from repo_stream.github import GithubClient
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class FakeGithubServer:
+    """Local HTTP server answering requests with user defined routes.
+
+    Routes are registered by method and path (including the query string).
+    Values can be tuples ``(status, headers, body)`` or callables which
+    receive the request handler and return such tuple. Bodies that are not
+    bytes are encoded as JSON.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.connections = set()
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.body = self.rfile.read(length) if length else b""
+                server.requests.append((self.command, self.path, self.headers))
+                server.connections.add(self.client_address)
+
+                route = server.routes.get((self.command, self.path))
+                if route is None:
+                    status, headers, body = (404, {}, {"message": "Not Found"})
+                elif callable(route):
+                    status, headers, body = route(self)
+                else:
+                    status, headers, body = route
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PATCH = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def route(self, method, path, status=200, headers=None, body=b""):
+        self.routes[(method, path)] = (status, headers or {}, body)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fake_github():
+    server = FakeGithubServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def github_client(fake_github):
+    client = GithubClient(
+        token="fake",
+        max_requests_in_flight=4,
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+    )
+    yield client
+    client.close()
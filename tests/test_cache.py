@@ -0,0 +1,102 @@
+"""Tests for the persistent HTTP cache."""
+
+import os
+
+from repo_stream.cache import HTTPCache, auth_identity
+from repo_stream.github import GithubClient, run_sync
+
+
+def test_github_client_conditional_requests(fake_github, tmp_path):
+    def tree(handler):
+        if handler.headers.get("If-None-Match") == '"v1"':
+            return (304, {"ETag": '"v1"', "X-RateLimit-Remaining": "41"}, b"")
+        return (200, {"ETag": '"v1"', "X-RateLimit-Remaining": "42"}, [1, 2])
+
+    fake_github.routes[("GET", "/repos/foo/bar/git/trees/master")] = tree
+
+    responses = []
+    for _ in range(2):
+        client = GithubClient(
+            token="fake",
+            api_url=fake_github.url,
+            cache=HTTPCache(str(tmp_path)),
+        )
+        responses.append(
+            run_sync(
+                client.request(
+                    "GET",
+                    f"{fake_github.url}/repos/foo/bar/git/trees/master",
+                )
+            )
+        )
+        client.close()
+
+    assert [response.from_cache for response in responses] == [False, True]
+    assert [response.json() for response in responses] == [[1, 2], [1, 2]]
+    assert responses[1].getheader("X-RateLimit-Remaining") == "41"
+    assert "If-None-Match" not in fake_github.requests[0][2]
+    assert fake_github.requests[1][2]["If-None-Match"] == '"v1"'
+
+
+def test_http_cache_identity(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    url = "https://api.github.com/users/foo/repos"
+    cache.set(
+        cache.key(url, auth_identity("secret")),
+        200,
+        "OK",
+        {"etag": '"v1"'},
+        b"[]",
+    )
+
+    assert cache.get(cache.key(url, auth_identity("secret")))["body"] == b"[]"
+    assert cache.get(cache.key(url, auth_identity(None))) is None
+
+    # tokens are not written to disk
+    for dirpath, _, filenames in os.walk(str(tmp_path)):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename), "rb") as f:
+                assert b"secret" not in f.read()
+
+
+def test_http_cache_lru_eviction(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_size=1400)
+    body = b"x" * 300
+
+    keys = [cache.key(f"https://example.com/{i}", "anonymous") for i in range(4)]
+    for i, key in enumerate(keys[:3]):
+        cache.set(key, 200, "OK", {"etag": f'"{i}"'}, body)
+        os.utime(cache._path(key), (i, i))
+
+    # use the oldest entry, so the second one becomes the least recently used
+    assert cache.get(keys[0]) is not None
+
+    cache.set(keys[3], 200, "OK", {"etag": '"3"'}, body)
+
+    assert cache.size <= 1400
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[3]) is not None
+
+
+def test_http_cache_low_water_mark(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_size=4000, low_water_ratio=0.5)
+    keys = [cache.key(f"https://example.com/{i}", "anonymous") for i in range(10)]
+    for i, key in enumerate(keys):
+        cache.set(key, 200, "OK", {"etag": f'"{i}"'}, b"x" * 300)
+
+    # once exceeded, the cache is reduced to half of its maximum size
+    assert cache.size <= 2000
+    assert cache.get(keys[-1]) is not None
+    assert cache.get(keys[0]) is None
+
+    # the index is rebuilt from the directory when the cache is reopened
+    reopened_cache = HTTPCache(str(tmp_path), max_size=4000)
+    assert reopened_cache.size == cache.size
+
+
+def test_http_cache_requires_validators(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    key = cache.key("https://example.com", "anonymous")
+    cache.set(key, 200, "OK", {}, b"content")
+    assert cache.get(key) is None
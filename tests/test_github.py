@@ -1,14 +1,22 @@
 """Tests for Github related utilities."""
 
+import base64
+import json
 import os
+from urllib.error import HTTPError
 
 import pytest
 
 from repo_stream.github import (
+    GithubClient,
     add_github_auth_headers,
+    create_github_branch_commit,
+    get_repo_tree,
     get_user_repos,
     repo_url_to_full_name,
+    run_sync,
 )
+from repo_stream.records import RepoRecord
 
 
 @pytest.mark.parametrize(
@@ -41,13 +49,20 @@ def test_get_user_repos(username, fork):
     assert len(repos) > 0
 
     for repo in repos:
-        assert isinstance(repo, str)
-        assert repo.count("/") == 1
-        assert repo.startswith(f"{username}/")
+        assert isinstance(repo, RepoRecord)
+        full_name = repo.full_name
+        assert full_name.count("/") == 1
+        assert full_name.startswith(f"{username}/")
         assert (
-            len(repo.split("/", 1)[0] + repo.split("/", 1)[1].replace("/", ""))
-            == len(repo) - 1
+            len(
+                full_name.split("/", 1)[0] + full_name.split("/", 1)[1].replace("/", "")
+            )
+            == len(full_name) - 1
         )
+        assert repo.default_branch
+        assert repo.archived is False
+        if fork is not None:
+            assert repo.fork is fork
 
 
 @pytest.mark.parametrize(
@@ -85,3 +100,182 @@ def test_add_github_auth_headers(github_token):
             del os.environ["GITHUB_TOKEN"]
         except KeyError:
             pass
+
+
+@pytest.mark.parametrize(
+    "fork",
+    (None, True, False),
+    ids=("fork=None", "fork=True", "fork=False"),
+)
+def test_github_client_get_user_repos(fake_github, github_client, fork):
+    def repo_data(i):
+        return {
+            "full_name": f"foo/repo{i}",
+            "default_branch": "main",
+            "pushed_at": "2021-12-31T00:00:00Z",
+            "size": i,
+            "fork": i % 3 == 0,
+            "archived": i % 5 == 0,
+            "description": "unused",
+        }
+
+    n_pages, per_page = (4, 3)
+    for page in range(1, n_pages + 1):
+        url = f"/users/foo/repos?per_page={per_page}&sort=updated&page={page}"
+        fake_github.route(
+            "GET",
+            f"{url}&type=owner",
+            headers={
+                "Link": f'<{fake_github.url}/repos?page={n_pages}>; rel="last"',
+            },
+            body=[repo_data(i) for i in range((page - 1) * per_page, page * per_page)],
+        )
+
+    repos = get_user_repos(
+        "foo",
+        fork=fork,
+        repositories_to_ignore=["foo/repo1"],
+        per_page=per_page,
+        client=github_client,
+    )
+
+    expected_repos = [
+        RepoRecord.from_dict(repo)
+        for repo in map(repo_data, range(n_pages * per_page))
+        if not repo["archived"]
+        and repo["full_name"] != "foo/repo1"
+        and (fork is None or repo["fork"] is fork)
+    ]
+    assert repos == expected_repos
+
+    # connections are reused between requests
+    assert len(fake_github.requests) == n_pages
+    assert len(fake_github.connections) <= github_client.max_requests_in_flight
+    for _, _, headers in fake_github.requests:
+        assert headers["Authorization"] == "token fake"
+
+
+def test_github_client_download_raw_githubusercontent(fake_github, github_client):
+    fake_github.route("GET", "/raw/foo/config/master/upstream.yaml", body=b"repos: []")
+
+    content = run_sync(
+        github_client.download_raw_githubusercontent(
+            "foo/config",
+            "master",
+            "upstream",
+        )
+    )
+    assert content == "repos: []"
+
+    with pytest.raises(HTTPError) as exc:
+        run_sync(
+            github_client.download_raw_githubusercontent(
+                "foo/config",
+                "master",
+                "notfound",
+            )
+        )
+    assert exc.value.code == 404
+
+    # raw content requests are not authenticated
+    assert "Authorization" not in fake_github.requests[0][2]
+
+
+def test_create_github_branch_commit(fake_github, github_client):
+    payloads = {}
+
+    def route(path, sha):
+        def handler(handler):
+            payloads[path] = json.loads(handler.body)
+            return (201, {}, {"sha": sha})
+
+        fake_github.routes[("POST", f"/repos/foo/bar/git/{path}")] = handler
+
+    for path in ("blobs", "trees", "commits", "refs"):
+        route(path, f"{path}-sha")
+
+    commit_sha = create_github_branch_commit(
+        "foo/bar",
+        "repo-stream--abc",
+        "base-sha",
+        "base-tree-sha",
+        "repo-stream update",
+        [
+            {"path": "README.md", "mode": "100644", "content": b"foo\n"},
+            {"path": "logo.png", "mode": "100644", "content": b"\x89PNG\xff"},
+            {"path": "old.txt", "mode": "100644", "content": None},
+        ],
+        client=github_client,
+    )
+    assert commit_sha == "commits-sha"
+
+    # binary files are uploaded as blobs
+    assert base64.b64decode(payloads["blobs"]["content"]) == b"\x89PNG\xff"
+    assert payloads["trees"] == {
+        "base_tree": "base-tree-sha",
+        "tree": [
+            {"path": "README.md", "mode": "100644", "type": "blob", "content": "foo\n"},
+            {"path": "logo.png", "mode": "100644", "type": "blob", "sha": "blobs-sha"},
+            {"path": "old.txt", "mode": "100644", "type": "blob", "sha": None},
+        ],
+    }
+    assert payloads["commits"]["parents"] == ["base-sha"]
+    assert payloads["refs"] == {
+        "ref": "refs/heads/repo-stream--abc",
+        "sha": "commits-sha",
+    }
+
+
+def test_get_repo_tree(fake_github, github_client):
+    entry = {"path": "README.md", "mode": "100644", "type": "blob", "sha": "a"}
+    fake_github.route(
+        "GET",
+        "/repos/foo/bar/git/trees/main?recursive=1",
+        body={"sha": "tree-sha", "tree": [entry], "truncated": False},
+    )
+    fake_github.route(
+        "GET",
+        "/repos/foo/big/git/trees/main?recursive=1",
+        body={"sha": "tree-sha", "tree": [entry], "truncated": True},
+    )
+
+    assert get_repo_tree("foo/bar", "main", client=github_client) == [
+        {"path": "README.md", "mode": "100644", "type": "blob"}
+    ]
+    assert get_repo_tree("foo/big", "main", client=github_client) is None
+
+
+def test_github_client_get_branch_head_sha(fake_github, github_client):
+    fake_github.route("GET", "/repos/foo/bar/commits/main", body=b"sha-bar\n")
+
+    assert run_sync(github_client.get_branch_head_sha("foo/bar", "main")) == "sha-bar"
+    assert fake_github.requests[0][2]["Accept"] == "application/vnd.github.v3.sha"
+
+
+def test_github_client_iter_pages_bounded(fake_github):
+    n_pages = 10
+    for page in range(1, n_pages + 1):
+        fake_github.route(
+            "GET",
+            f"/pages?page={page}",
+            headers={"Link": f'<{fake_github.url}/pages?page={n_pages}>; rel="last"'},
+            body=[page],
+        )
+    client = GithubClient(
+        token="fake", api_url=fake_github.url, max_requests_in_flight=2
+    )
+
+    async def main():
+        pages = []
+        async for page in client._iter_pages(
+            lambda page: f"{fake_github.url}/pages?page={page}"
+        ):
+            # no more than the requests in flight are fetched ahead
+            assert len(fake_github.requests) <= len(pages) + 1 + 2
+            pages.append(page.json()[0])
+        return pages
+
+    try:
+        assert run_sync(main()) == list(range(1, n_pages + 1))
+    finally:
+        client.close()
@@ -0,0 +1,162 @@
+"""Tests for Github GraphQL API utilities."""
+
+import json
+from urllib.error import HTTPError
+
+import pytest
+
+from repo_stream.github import run_sync
+from repo_stream.graphql import GraphQLError, discover_user_repos
+from repo_stream.records import RepoRecord, Target
+from repo_stream.update import filter_repos_with_repo_stream_hook
+
+
+REPO_STREAM_PC_CONFIG = """repos:
+  - repo: https://github.com/mondeja/repo-stream
+    rev: v1.3.1
+    hooks:
+      - id: repo-stream
+        args:
+          - -config=https://github.com/foo/repo-stream-config
+          - -updater=upstream
+"""
+
+
+def _repository_node(i):
+    return {
+        "nameWithOwner": f"foo/repo{i}",
+        "isPrivate": False,
+        "isFork": False,
+        "isArchived": i == 3,
+        "pushedAt": "2021-12-31T00:00:00Z",
+        "diskUsage": i,
+        "defaultBranchRef": {
+            "name": "main" if i % 2 else "master",
+            "target": {"oid": f"sha{i}"},
+        },
+        "object": (
+            {"oid": "abc", "text": REPO_STREAM_PC_CONFIG, "isTruncated": False}
+            if i % 2
+            else None
+        ),
+    }
+
+
+def _fake_graphql_endpoint(n_repos):
+    def endpoint(handler):
+        payload = json.loads(handler.body)
+        variables = payload["variables"]
+        if variables["login"] != "foo":
+            return (200, {}, {"data": {"repositoryOwner": None}})
+        if variables["first"] > 100:
+            return (200, {}, {"errors": [{"message": "first limit exceeded"}]})
+
+        start = int(variables["after"] or 0)
+        end = min(start + variables["first"], n_repos)
+        return (
+            200,
+            {},
+            {
+                "data": {
+                    "repositoryOwner": {
+                        "repositories": {
+                            "pageInfo": {
+                                "hasNextPage": end < n_repos,
+                                "endCursor": str(end),
+                            },
+                            "nodes": [_repository_node(i) for i in range(start, end)],
+                        }
+                    }
+                }
+            },
+        )
+
+    return endpoint
+
+
+def test_discover_user_repos(fake_github, github_client):
+    fake_github.routes[("POST", "/graphql")] = _fake_graphql_endpoint(250)
+
+    repos = run_sync(
+        discover_user_repos(
+            github_client,
+            "foo",
+            repositories_to_ignore=["foo/repo5"],
+        )
+    )
+
+    # one query per each 100 repositories
+    assert len(fake_github.requests) == 3
+    assert len(repos) == 248
+    assert repos[0] == RepoRecord(
+        "foo/repo0",
+        "master",
+        pushed_at="2021-12-31T00:00:00Z",
+        size=0,
+        fork=False,
+        archived=False,
+        head_sha="sha0",
+        pre_commit_config_sha=None,
+        pre_commit_config=None,
+    )
+    assert repos[1].pre_commit_config == REPO_STREAM_PC_CONFIG
+    assert "foo/repo3" not in [repo.full_name for repo in repos]
+
+    repos_stream_config = filter_repos_with_repo_stream_hook(
+        repos,
+        client=github_client,
+    )
+    assert len(repos_stream_config) == 123
+    assert repos_stream_config[0] == Target(
+        "foo/repo1",
+        "main",
+        "foo/repo-stream-config",
+        "upstream",
+        pushed_at="2021-12-31T00:00:00Z",
+        size=1,
+        head_sha="sha1",
+    )
+
+    # configurations are not downloaded again
+    assert len(fake_github.requests) == 3
+
+
+def test_discover_user_repos_excludes_private(fake_github, github_client):
+    queries = []
+
+    def endpoint(handler):
+        queries.append(json.loads(handler.body)["query"])
+        private_node = _repository_node(1)
+        private_node.update({"nameWithOwner": "foo/private", "isPrivate": True})
+        return (
+            200,
+            {},
+            {
+                "data": {
+                    "repositoryOwner": {
+                        "repositories": {
+                            "pageInfo": {"hasNextPage": False, "endCursor": "2"},
+                            "nodes": [_repository_node(0), private_node],
+                        }
+                    }
+                }
+            },
+        )
+
+    fake_github.routes[("POST", "/graphql")] = endpoint
+
+    repos = run_sync(discover_user_repos(github_client, "foo"))
+
+    assert "privacy: PUBLIC" in queries[0]
+    assert [repo.full_name for repo in repos] == ["foo/repo0"]
+
+
+def test_discover_user_repos_errors(fake_github, github_client):
+    fake_github.routes[("POST", "/graphql")] = _fake_graphql_endpoint(10)
+
+    with pytest.raises(HTTPError) as exc:
+        run_sync(discover_user_repos(github_client, "bar"))
+    assert exc.value.code == 404
+
+    with pytest.raises(GraphQLError, match="first limit exceeded"):
+        run_sync(discover_user_repos(github_client, "foo", per_query=101))
@@ -0,0 +1,208 @@
+"""Tests for repo-stream updater configurations hooks utilities."""
+
+import pytest
+
+from repo_stream.hooks import (
+    files_regex_sparse_patterns,
+    hooks_can_apply,
+    hooks_filters,
+    hooks_manifests_locations,
+    parse_hooks_manifest,
+    sparse_checkout_patterns,
+    types_sparse_patterns,
+)
+
+
+@pytest.mark.parametrize(
+    ("regex", "expected_result"),
+    (
+        (r"^setup\.cfg$", ["/setup.cfg"]),
+        (r"\.py$", ["*.py"]),
+        (r"^docs/", ["/docs/*", "/docs/*/**"]),
+        (r"^docs/.*", ["/docs/*", "/docs/*/**"]),
+        (r"docs/conf\.py$", ["**/*docs/conf.py"]),
+        (
+            r"^setup\.cfg$|\.pre-commit-config\.yaml$",
+            ["/setup.cfg", "*.pre-commit-config.yaml"],
+        ),
+        (r"(^setup\.py$|^setup\.cfg$)", ["/setup.py", "/setup.cfg"]),
+        (r"\.(yml|yaml)$", None),
+        (r"setup", None),
+        (r"^src/.+\.py$", None),
+        ("", None),
+    ),
+)
+def test_files_regex_sparse_patterns(regex, expected_result):
+    assert files_regex_sparse_patterns(regex) == expected_result
+
+
+def test_types_sparse_patterns():
+    patterns = types_sparse_patterns(types=["python"])
+    assert "*.py" in patterns
+    assert "*.pyw" in patterns
+    assert "*.yaml" not in patterns
+
+    patterns = types_sparse_patterns(types_or=["yaml", "toml"])
+    assert "*.yaml" in patterns
+    assert "*.toml" in patterns
+    assert "*.py" not in patterns
+
+    assert types_sparse_patterns(types=["file"]) is None
+    assert types_sparse_patterns(types=["text"]) is None
+    assert types_sparse_patterns() is None
+
+
+@pytest.mark.parametrize(
+    ("hooks", "expected_result"),
+    (
+        (
+            """
+      - id: setup-cfg-fmt
+        files: ^setup\\.cfg$
+      - id: yamllint
+        types: [yaml]""",
+            ["*.yaml", "*.yml", "/setup.cfg"],
+        ),
+        (
+            """
+      - id: setup-cfg-fmt
+        files: ^setup\\.cfg$
+      - id: add-pre-commit-hook
+        pass_filenames: false""",
+            None,
+        ),
+        (
+            """
+      - id: foo""",
+            None,
+        ),
+    ),
+)
+def test_sparse_checkout_patterns(hooks, expected_result):
+    updater_content = (
+        "repos:\n  - repo: https://github.com/foo/bar\n    rev: v1.0.0\n    hooks:"
+        + hooks
+    )
+    patterns = sparse_checkout_patterns(updater_content)
+    if expected_result is None:
+        assert patterns is None
+    else:
+        assert set(expected_result).issubset(patterns)
+        assert "*.py" not in patterns
+
+
+PREFLIGHT_UPDATER_CONFIG = """exclude: ^vendor/
+repos:
+  - repo: https://github.com/foo/hooks
+    rev: v1.0.0
+    hooks:
+      - id: python-fmt
+      - id: cfg-fmt
+        files: ^setup\\.cfg$
+  - repo: local
+    hooks:
+      - id: shell-lint
+        name: shell-lint
+        entry: shellcheck
+        language: system
+        types: [shell]
+"""
+
+PREFLIGHT_MANIFESTS = {
+    ("foo/hooks", "v1.0.0"): [
+        {"id": "python-fmt", "types": ["python"], "exclude": "^docs/"},
+        {"id": "cfg-fmt", "types": ["ini"]},
+    ],
+}
+
+
+def _tree(*entries):
+    return [{"path": path, "mode": mode, "type": "blob"} for path, mode in entries]
+
+
+def test_hooks_manifests_locations():
+    assert hooks_manifests_locations(PREFLIGHT_UPDATER_CONFIG) == [
+        ("foo/hooks", "v1.0.0")
+    ]
+    assert hooks_manifests_locations("repos: [") == []
+
+
+def test_parse_hooks_manifest():
+    assert parse_hooks_manifest("- id: foo\n  types: [python]\n") == [
+        {"id": "foo", "types": ["python"]}
+    ]
+    assert parse_hooks_manifest("id: foo\n") is None
+    assert parse_hooks_manifest("- [") is None
+
+
+def test_hooks_filters():
+    filters = hooks_filters(PREFLIGHT_UPDATER_CONFIG, PREFLIGHT_MANIFESTS)
+    assert filters["files"] == ""
+    assert filters["exclude"] == "^vendor/"
+    python_fmt, cfg_fmt, shell_lint = filters["hooks"]
+    assert python_fmt["types"] == ["python"]
+    assert python_fmt["exclude"] == "^docs/"
+    # filters of the configuration take precedence over the manifest ones
+    assert cfg_fmt["files"] == "^setup\\.cfg$"
+    assert cfg_fmt["types"] == ["ini"]
+    assert shell_lint["types"] == ["shell"]
+
+    # unknown manifests or hooks
+    assert hooks_filters(PREFLIGHT_UPDATER_CONFIG, {}) is None
+    assert (
+        hooks_filters(
+            PREFLIGHT_UPDATER_CONFIG,
+            {("foo/hooks", "v1.0.0"): [{"id": "python-fmt"}]},
+        )
+        is None
+    )
+    assert (
+        hooks_filters(
+            "repos:\n  - repo: https://gitlab.com/foo/hooks\n    rev: v1\n"
+            "    hooks:\n      - id: foo\n",
+            {},
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize(
+    ("tree", "expected_result"),
+    (
+        (_tree(("README.md", "100644"), ("logo.png", "100644")), False),
+        (_tree(("README.md", "100644"), ("src/foo.py", "100644")), True),
+        (_tree(("docs/conf.py", "100644")), False),
+        (_tree(("vendor/foo.py", "100644")), False),
+        (_tree(("setup.cfg", "100644")), True),
+        (_tree(("tox.ini", "100644")), False),
+        (_tree(("build.sh", "100644")), True),
+        # could be a shell or python script identified by its shebang
+        (_tree(("bin/run", "100755")), True),
+        (_tree(("bin/run", "100644")), False),
+        (_tree(("link.py", "120000")), False),
+        ([], False),
+    ),
+)
+def test_hooks_can_apply(tree, expected_result):
+    filters = hooks_filters(PREFLIGHT_UPDATER_CONFIG, PREFLIGHT_MANIFESTS)
+    assert hooks_can_apply(filters, tree) is expected_result
+
+
+def test_hooks_can_apply_always_run():
+    filters = hooks_filters(
+        "repos:\n  - repo: local\n    hooks:\n      - id: foo\n"
+        "        types: [python]\n        always_run: true\n",
+        {},
+    )
+    assert hooks_can_apply(filters, _tree(("README.md", "100644")))
+
+
+def test_hooks_can_apply_exclude_types():
+    filters = hooks_filters(
+        "repos:\n  - repo: local\n    hooks:\n      - id: foo\n"
+        "        exclude_types: [markdown]\n",
+        {},
+    )
+    assert not hooks_can_apply(filters, _tree(("README.md", "100644")))
+    # files whose type depends on their content match
+    assert hooks_can_apply(filters, _tree(("LICENSE", "100644")))
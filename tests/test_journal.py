@@ -0,0 +1,102 @@
+"""Tests for repo-stream progress journal."""
+
+from repo_stream.journal import Journal
+from repo_stream.records import RepoRecord
+
+
+RUN = {"usernames": ["foo"], "shard": (1, 2)}
+
+
+def _write_run(path):
+    journal = Journal(path, RUN)
+    journal.add_repo(
+        "foo",
+        RepoRecord(
+            "foo/bar",
+            "main",
+            pushed_at="2021-01-01T00:00:00Z",
+            size=1,
+            pre_commit_config="repos: []\n",
+        ),
+    )
+    journal.user_discovered("foo")
+    journal.repo_checked("foo/bar")
+    journal.add_update("foo/baz", "foo/config", "upstream", "pr-opened")
+    return journal
+
+
+def test_resume(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    _write_run(path).close()
+
+    journal = Journal(path, RUN, resume=True)
+    assert journal.resumed
+    assert journal.discovered_repos("foo") == [
+        RepoRecord(
+            "foo/bar",
+            "main",
+            pushed_at="2021-01-01T00:00:00Z",
+            size=1,
+            # configurations without repo-stream hooks are discarded
+            pre_commit_config=None,
+        )
+    ]
+    assert journal.discovered_repos("bar") is None
+    assert journal.is_checked("foo/bar")
+    assert not journal.is_checked("foo/baz")
+    assert journal.update_outcome("foo/baz", "foo/config", "upstream") == "pr-opened"
+    assert journal.update_outcome("foo/bar", "foo/config", "upstream") is None
+    journal.close()
+
+
+def test_resume_incomplete_record(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    _write_run(path).close()
+    with open(path, "a") as f:
+        f.write('{"type": "update", "repo": "foo/')
+
+    journal = Journal(path, RUN, resume=True)
+    assert journal.resumed
+    journal.add_update("foo/qux", "foo/config", "upstream", "up-to-date")
+    journal.close()
+
+    # the incomplete record is overwritten
+    journal = Journal(path, RUN, resume=True)
+    assert journal.update_outcome("foo/baz", "foo/config", "upstream") == "pr-opened"
+    assert journal.update_outcome("foo/qux", "foo/config", "upstream") == "up-to-date"
+    journal.close()
+
+
+def test_not_resumed(tmp_path, capsys):
+    path = str(tmp_path / "journal.jsonl")
+
+    # without resume
+    _write_run(path).close()
+    journal = Journal(path, RUN)
+    assert not journal.resumed
+    assert journal.discovered_repos("foo") is None
+    journal.close()
+
+    # other run parameters
+    _write_run(path).close()
+    journal = Journal(path, {**RUN, "shard": (2, 2)}, resume=True)
+    assert not journal.resumed
+    assert "was written by a run with other parameters" in capsys.readouterr().err
+    journal.close()
+
+    # finished run
+    journal = _write_run(path)
+    journal.finish()
+    journal.close()
+    journal = Journal(path, RUN, resume=True)
+    assert not journal.resumed
+    journal.close()
+
+    # discovery not completed
+    journal = Journal(path, RUN)
+    journal.add_repo("foo", RepoRecord("foo/bar", "main"))
+    journal.close()
+    journal = Journal(path, RUN, resume=True)
+    assert journal.resumed
+    assert journal.discovered_repos("foo") is None
+    journal.close()
@@ -0,0 +1,40 @@
+"""Tests for repo-stream command line interface."""
+
+import subprocess
+import sys
+
+import pytest
+
+from repo_stream.__main__ import main
+
+
+HOOK_SCRIPT = """
+import sys
+from repo_stream.__main__ import main
+main(['--hook', '-config', 'foo/bar', '-updater', 'baz'])
+print(' '.join(sys.modules))
+"""
+
+
+@pytest.mark.parametrize(
+    ("argv", "expected_exitcode"),
+    (
+        (["--hook", "-config", "foo/bar", "-updater", "baz"], 0),
+        (["--hook", "--config=foo/bar", "--updater=baz"], 0),
+        (["--hook", "-updater", "baz"], 1),
+        (["--hook", "-config", "foo/bar"], 1),
+    ),
+)
+def test_hook(argv, expected_exitcode):
+    try:
+        exitcode = main(argv)
+    except SystemExit as exc:
+        exitcode = exc.code
+    assert exitcode == expected_exitcode
+
+
+def test_hook_does_not_import_update():
+    stdout = subprocess.check_output([sys.executable, "-c", HOOK_SCRIPT])
+    modules = stdout.decode("utf-8").split()
+    for module in ("repo_stream.update", "repo_stream.github", "yaml", "pre_commit"):
+        assert module not in modules
@@ -0,0 +1,170 @@
+"""Tests for repo-stream metrics."""
+
+import json
+import os
+
+import pytest
+
+from repo_stream.metrics import Metrics, activate_metrics, get_metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self):
+        return self.time
+
+
+def test_spans():
+    clock = FakeClock()
+    metrics = Metrics(clock=clock)
+
+    with metrics.span("clone", repo="foo/bar"):
+        clock.time += 2
+    with metrics.span("clone", repo="foo/baz"):
+        clock.time += 1
+    metrics.add_span("clone", 0.5, repo="foo/bar")
+
+    data = metrics.to_dict()
+    assert data["spans"] == {"clone": {"count": 3, "sum": 3.5, "max": 2}}
+    assert data["repos"] == {"foo/bar": {"clone": 2.5}, "foo/baz": {"clone": 1}}
+
+
+def test_span_exception():
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.span("pre_commit"):
+            raise ValueError
+    assert metrics.to_dict()["spans"]["pre_commit"]["count"] == 1
+
+
+def test_counters_gauges_histograms():
+    metrics = Metrics(buckets=(1, 10))
+    metrics.inc("http_requests", endpoint="pulls")
+    metrics.inc("http_requests", 2, endpoint="pulls")
+    metrics.inc("http_requests", endpoint="search")
+    metrics.set("rate_limit_remaining", 10, resource="core")
+    metrics.set("rate_limit_remaining", 5, resource="core")
+    for value in (0.5, 1, 5, 20):
+        metrics.observe("repo_update_seconds", value)
+
+    data = metrics.to_dict()
+    assert data["counters"] == [
+        {"name": "http_requests", "labels": {"endpoint": "pulls"}, "value": 3},
+        {"name": "http_requests", "labels": {"endpoint": "search"}, "value": 1},
+    ]
+    assert data["gauges"] == [
+        {"name": "rate_limit_remaining", "labels": {"resource": "core"}, "value": 5}
+    ]
+    assert data["histograms"] == [
+        {
+            "name": "repo_update_seconds",
+            "labels": {},
+            "buckets": {"1": 2, "10": 3, "+Inf": 4},
+            "sum": 26.5,
+            "count": 4,
+        }
+    ]
+
+
+def test_to_prometheus():
+    metrics = Metrics(buckets=(1,), clock=FakeClock())
+    metrics.add_span("clone", 2)
+    metrics.inc("subprocesses", program="git", command="clone")
+    metrics.set("rate_limit_remaining", 5, resource="core")
+    metrics.observe("repo_update_seconds", 3)
+
+    assert metrics.to_prometheus() == (
+        "# HELP repo_stream_span_seconds Time spent in each stage.\n"
+        "# TYPE repo_stream_span_seconds summary\n"
+        'repo_stream_span_seconds_sum{span="clone"} 2\n'
+        'repo_stream_span_seconds_count{span="clone"} 1\n'
+        "# TYPE repo_stream_span_seconds_max gauge\n"
+        'repo_stream_span_seconds_max{span="clone"} 2\n'
+        "# TYPE repo_stream_subprocesses_total counter\n"
+        'repo_stream_subprocesses_total{command="clone",program="git"} 1\n'
+        "# TYPE repo_stream_rate_limit_remaining gauge\n"
+        'repo_stream_rate_limit_remaining{resource="core"} 5\n'
+        "# TYPE repo_stream_repo_update_seconds histogram\n"
+        'repo_stream_repo_update_seconds_bucket{le="1"} 0\n'
+        'repo_stream_repo_update_seconds_bucket{le="+Inf"} 1\n'
+        "repo_stream_repo_update_seconds_sum 3\n"
+        "repo_stream_repo_update_seconds_count 1\n"
+    )
+
+
+@pytest.mark.parametrize(
+    ("filename", "format", "expected_format"),
+    (
+        ("metrics.json", None, "json"),
+        ("metrics.prom", None, "prometheus"),
+        ("metrics.txt", "prometheus", "prometheus"),
+    ),
+)
+def test_write(filename, format, expected_format, tmp_path):
+    metrics = Metrics()
+    metrics.inc("updates", outcome="pr-opened")
+
+    filepath = str(tmp_path / filename)
+    metrics.write(filepath, format=format)
+    with open(filepath) as f:
+        content = f.read()
+
+    if expected_format == "json":
+        assert json.loads(content) == metrics.to_dict()
+    else:
+        assert content == metrics.to_prometheus()
+
+
+def test_write_replaces_file(tmp_path, monkeypatch):
+    filepath = tmp_path / "metrics.prom"
+    filepath.write_text("previous\n")
+    metrics = Metrics()
+    metrics.inc("updates", outcome="pr-opened")
+
+    # a failed write keeps the previous file
+    def fail_replace(src, dst):
+        raise OSError("replace failed")
+
+    with monkeypatch.context() as m:
+        m.setattr("os.replace", fail_replace)
+        with pytest.raises(OSError, match="replace failed"):
+            metrics.write(str(filepath))
+    assert filepath.read_text() == "previous\n"
+    assert os.listdir(tmp_path) == ["metrics.prom"]
+
+    metrics.write(str(filepath))
+    assert filepath.read_text() == metrics.to_prometheus()
+    assert os.listdir(tmp_path) == ["metrics.prom"]
+    assert filepath.stat().st_mode & 0o777 == 0o644
+
+
+def test_from_dict_merge():
+    metrics = Metrics(buckets=(1, 10))
+    metrics.add_span("clone", 2, repo="foo/bar")
+    metrics.inc("updates", outcome="pr-opened")
+    metrics.set("rate_limit_remaining", 5, resource="core")
+    for value in (0.5, 5, 20):
+        metrics.observe("repo_update_seconds", value)
+
+    assert Metrics.from_dict(metrics.to_dict()).to_dict() == metrics.to_dict()
+
+    metrics.merge(Metrics.from_dict(metrics.to_dict()))
+    data = metrics.to_dict()
+    assert data["spans"] == {"clone": {"count": 2, "sum": 4, "max": 2}}
+    assert data["counters"][0]["value"] == 2
+    assert data["gauges"][0]["value"] == 5
+    assert data["histograms"][0]["buckets"] == {"1": 2, "10": 4, "+Inf": 6}
+
+    with pytest.raises(ValueError, match="different histogram buckets"):
+        other_metrics = Metrics(buckets=(2,))
+        other_metrics.observe("repo_update_seconds", 1)
+        metrics.merge(other_metrics)
+
+
+def test_activate_metrics():
+    previous_metrics = get_metrics()
+    with activate_metrics(Metrics()) as metrics:
+        assert get_metrics() is metrics
+    assert get_metrics() is previous_metrics
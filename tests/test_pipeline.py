@@ -0,0 +1,112 @@
+"""Tests for pipelines of concurrent stages."""
+
+import asyncio
+
+import pytest
+
+from repo_stream.github import run_sync
+from repo_stream.pipeline import Stage, merge_sources, run_pipeline
+
+
+async def _source(n, produced=None):
+    for i in range(n):
+        if produced is not None:
+            produced.append(i)
+        yield i
+
+
+def test_run_pipeline():
+    async def duplicate(item):
+        await asyncio.sleep(0.001 * (item % 3))
+        yield item
+        yield item
+
+    async def only_even(item):
+        if item % 2 == 0:
+            yield item * 10
+
+    results = run_sync(
+        run_pipeline(
+            _source(20),
+            [Stage(duplicate, concurrency=4), Stage(only_even, concurrency=2)],
+        )
+    )
+    assert sorted(results) == sorted([i * 10 for i in range(0, 20, 2)] * 2)
+
+
+def test_run_pipeline_backpressure():
+    produced, processed = ([], [])
+
+    async def main():
+        release = asyncio.Event()
+
+        async def forward(item):
+            yield item
+
+        async def slow(item):
+            await release.wait()
+            processed.append(item)
+            yield item
+
+        pipeline = asyncio.ensure_future(
+            run_pipeline(
+                _source(100, produced),
+                [
+                    Stage(forward, concurrency=1, queue_size=2),
+                    Stage(slow, concurrency=1, queue_size=2),
+                ],
+            )
+        )
+        await asyncio.sleep(0.05)
+
+        # the source is not consumed further than the queues allow
+        n_produced_while_blocked = len(produced)
+        assert not processed
+        release.set()
+        return (n_produced_while_blocked, await pipeline)
+
+    n_produced_while_blocked, results = run_sync(main())
+    assert n_produced_while_blocked < 10
+    assert results == list(range(100))
+
+
+def test_run_pipeline_error():
+    async def fail(item):
+        if item == 5:
+            raise ValueError("stage failed")
+        yield item
+
+    with pytest.raises(ValueError, match="stage failed"):
+        run_sync(run_pipeline(_source(100), [Stage(fail, concurrency=3)]))
+
+
+def test_merge_sources():
+    async def slow_source(items, delay):
+        for item in items:
+            await asyncio.sleep(delay)
+            yield item
+
+    async def main():
+        return [
+            item
+            async for item in merge_sources(
+                [slow_source("abc", 0.02), slow_source(range(3), 0.001)]
+            )
+        ]
+
+    results = run_sync(main())
+    assert sorted(results, key=str) == [0, 1, 2, "a", "b", "c"]
+    # the fast source is not blocked by the slow one
+    assert results[:3] == [0, 1, 2]
+
+
+def test_merge_sources_error():
+    async def failing_source():
+        yield 1
+        raise ValueError("source failed")
+
+    async def main():
+        return [item async for item in merge_sources([failing_source(), _source(3)])]
+
+    with pytest.raises(ValueError, match="source failed"):
+        run_sync(main())
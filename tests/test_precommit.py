@@ -0,0 +1,152 @@
+"""Tests for pre-commit executions utilities."""
+
+import os
+import subprocess
+
+import pytest
+
+from repo_stream.precommit import (
+    PreCommitPool,
+    pre_commit_home_cache_key,
+    warm_up_hook_environments,
+)
+
+
+LOCAL_UPDATER_CONFIG = """repos:
+  - repo: local
+    hooks:
+      - id: hello
+        name: hello
+        entry: echo hello
+        language: system
+"""
+
+
+def test_warm_up_hook_environments(tmp_path):
+    pre_commit_home = str(tmp_path / "pre-commit")
+    invalid_config = "repos:\n  - repo: local\n    hooks:\n      - id: foo\n"
+
+    errors = warm_up_hook_environments(
+        [LOCAL_UPDATER_CONFIG, invalid_config, LOCAL_UPDATER_CONFIG],
+        pre_commit_home=pre_commit_home,
+        jobs=2,
+    )
+    assert list(errors) == [invalid_config]
+    assert "name" in errors[invalid_config]
+
+    # hooks environments are installed in the shared directory
+    assert os.path.isfile(os.path.join(pre_commit_home, "db.db"))
+
+
+def test_pre_commit_home_cache_key():
+    other_config = LOCAL_UPDATER_CONFIG.replace("hello", "bye")
+
+    key = pre_commit_home_cache_key([LOCAL_UPDATER_CONFIG, other_config])
+    assert key.startswith("repo-stream-pre-commit-")
+
+    # independent of order and repetitions
+    assert key == pre_commit_home_cache_key(
+        [other_config, LOCAL_UPDATER_CONFIG, other_config],
+    )
+    assert key != pre_commit_home_cache_key([LOCAL_UPDATER_CONFIG])
+
+
+def _hook_config(entry):
+    return f"""repos:
+  - repo: local
+    hooks:
+      - id: hook
+        name: hook
+        entry: sh -c "{entry}"
+        language: system
+        always_run: true
+        pass_filenames: false
+"""
+
+
+@pytest.fixture
+def pre_commit_job(tmp_path):
+    # returns a function that writes a configuration with a hook, returning
+    # the arguments of the job that runs it in a GIT repository
+    repo_dirpath = str(tmp_path / "repo")
+    subprocess.check_call(["git", "init", "--quiet", repo_dirpath])
+    with open(os.path.join(repo_dirpath, "README.md"), "w") as f:
+        f.write("foo\n")
+    subprocess.check_call(["git", "add", "."], cwd=repo_dirpath)
+    subprocess.check_call(
+        [
+            "git",
+            "-c",
+            "user.name=foo",
+            "-c",
+            "user.email=foo@example.com",
+            "commit",
+            "--quiet",
+            "-m",
+            "init",
+        ],
+        cwd=repo_dirpath,
+    )
+
+    def job(entry):
+        config_filepath = str(tmp_path / "config.yaml")
+        with open(config_filepath, "w") as f:
+            f.write(_hook_config(entry))
+        return (config_filepath, repo_dirpath)
+
+    return job
+
+
+def test_pre_commit_pool(pre_commit_job, tmp_path):
+    pool = PreCommitPool(
+        processes=1,
+        pre_commit_home=str(tmp_path / "pre-commit"),
+        max_jobs_per_worker=2,
+    )
+    try:
+        result = pool.run(*pre_commit_job("echo bar >> README.md"))
+        assert result["exitcode"] == 1
+        assert result["changed_files"] == ["README.md"]
+        assert "files were modified by this hook" in result["output"]
+        pid = pool._workers[0].process.pid
+
+        subprocess.check_call(
+            ["git", "checkout", "--quiet", "README.md"],
+            cwd=pre_commit_job("")[1],
+        )
+        result = pool.run(*pre_commit_job("echo hello"))
+        assert result == {
+            "exitcode": 0,
+            "changed_files": [],
+            "output": result["output"],
+        }
+        assert pool._workers[0].process.pid == pid
+
+        # the worker is recycled after 2 jobs
+        pool.run(*pre_commit_job("echo hello"))
+        assert pool._workers[0].process.pid != pid
+    finally:
+        pool.close()
+
+
+def test_pre_commit_pool_timeout(pre_commit_job, tmp_path):
+    pool = PreCommitPool(pre_commit_home=str(tmp_path / "pre-commit"), timeout=1)
+    try:
+        with pytest.raises(subprocess.TimeoutExpired):
+            pool.run(*pre_commit_job("sleep 10"))
+
+        # a new worker runs the next jobs
+        assert pool.run(*pre_commit_job("echo hello"))["exitcode"] == 0
+    finally:
+        pool.close()
+
+
+def test_pre_commit_pool_worker_dies(pre_commit_job, tmp_path):
+    pool = PreCommitPool(pre_commit_home=str(tmp_path / "pre-commit"), restarts=1)
+    try:
+        # the hook kills the worker which runs pre-commit
+        with pytest.raises(subprocess.CalledProcessError):
+            pool.run(*pre_commit_job("kill -9 $PPID"))
+        assert pool.run(*pre_commit_job("echo hello"))["exitcode"] == 0
+    finally:
+        pool.close()
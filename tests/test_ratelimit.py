@@ -0,0 +1,148 @@
+"""Tests for Github API rate limits scheduling."""
+
+import pytest
+
+from repo_stream.github import GithubClient, run_sync
+from repo_stream.ratelimit import RateLimitScheduler
+
+
+class FakeClock:
+    def __init__(self, now=1000):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    return RateLimitScheduler(clock=clock, sleep=clock.sleep)
+
+
+@pytest.mark.parametrize(
+    ("method", "path", "expected_result"),
+    (
+        ("GET", "/users/foo/repos", "core"),
+        ("POST", "/graphql", "graphql"),
+        ("GET", "/search/issues?q=is:pr", "search"),
+        ("GET", "/search/code?q=foo", "code_search"),
+    ),
+)
+def test_resource_class(method, path, expected_result):
+    api_url = "https://api.github.com"
+    assert (
+        RateLimitScheduler.resource_class(method, f"{api_url}{path}", api_url)
+        == expected_result
+    )
+
+
+def test_wait_for_reset_when_exhausted(scheduler, clock):
+    scheduler.after_response(
+        "id",
+        "core",
+        200,
+        {
+            "x-ratelimit-limit": "5000",
+            "x-ratelimit-remaining": "0",
+            "x-ratelimit-reset": "1060",
+        },
+    )
+    scheduler.before_request("id", "core", "GET")
+    assert clock.sleeps == [61]
+
+    # other tokens and resources are not affected
+    scheduler.before_request("other", "core", "GET")
+    scheduler.before_request("id", "graphql", "POST")
+    assert clock.sleeps == [61]
+
+
+def test_slowdown_near_exhaustion(scheduler, clock):
+    scheduler.after_response(
+        "id",
+        "core",
+        200,
+        {
+            "x-ratelimit-limit": "5000",
+            "x-ratelimit-remaining": "10",
+            "x-ratelimit-reset": "1100",
+        },
+    )
+    for _ in range(3):
+        scheduler.before_request("id", "core", "GET")
+    assert clock.sleeps == [10, pytest.approx(100 / 9)]
+
+
+def test_content_creation_spacing(scheduler, clock):
+    for _ in range(3):
+        scheduler.before_request("id", "core", "POST")
+    assert clock.sleeps == [1, 1]
+
+    assert scheduler.usage()["core"]["used"] == 3
+
+
+def test_retry_after_date(scheduler, clock):
+    # "Wed, 21 Oct 2015 07:28:00 GMT" is 90 seconds after the current time
+    clock.now = 1445412390
+    delay = scheduler.after_response(
+        "id",
+        "core",
+        429,
+        {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"},
+    )
+    assert delay == 90
+
+    scheduler.before_request("id", "core", "GET")
+    assert clock.sleeps == [90]
+
+
+def test_github_client_retries_rate_limited_requests(fake_github, clock):
+    responses = [
+        (429, {"Retry-After": "30"}, {"message": "secondary rate limit"}),
+        (
+            403,
+            {
+                "X-RateLimit-Limit": "60",
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": "1100",
+                "X-RateLimit-Resource": "core",
+            },
+            {"message": "API rate limit exceeded"},
+        ),
+        (
+            200,
+            {
+                "X-RateLimit-Limit": "60",
+                "X-RateLimit-Remaining": "59",
+                "X-RateLimit-Reset": "4700",
+            },
+            [],
+        ),
+    ]
+    fake_github.routes[("GET", "/repos/foo/bar/pulls?per_page=100&page=1")] = (
+        lambda _: responses.pop(0)
+    )
+
+    client = GithubClient(
+        api_url=fake_github.url,
+        scheduler=RateLimitScheduler(clock=clock, sleep=clock.sleep),
+    )
+    assert run_sync(client.get_github_prs("foo/bar")) == []
+    client.close()
+
+    assert clock.sleeps == [30, 71]
+    assert client.scheduler.usage()["core"] == {
+        "used": 3,
+        "limit": 60,
+        "remaining": 59,
+        "reset": 4700,
+    }
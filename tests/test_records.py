@@ -0,0 +1,34 @@
+"""Tests for the records of repositories and updates."""
+
+import pytest
+
+from repo_stream.records import NOT_FETCHED, RepoRecord, Target
+
+
+def test_repo_record():
+    repo = RepoRecord("foo/bar", "main", size=3)
+    assert repo.pre_commit_config is NOT_FETCHED
+    # the fields not fetched are not included
+    assert repo.to_dict() == {
+        "full_name": "foo/bar",
+        "default_branch": "main",
+        "pushed_at": None,
+        "size": 3,
+        "fork": False,
+        "archived": False,
+        "head_sha": None,
+        "pre_commit_config_sha": None,
+    }
+    assert RepoRecord.from_dict({**repo.to_dict(), "description": "foo"}) == repo
+
+    # records don't store a dictionary of attributes
+    with pytest.raises(AttributeError):
+        repo.description = "foo"
+
+
+def test_target():
+    target = Target("foo/bar", "main", "foo/config", "upstream")
+    assert Target.from_dict(target.to_dict()) == target
+    assert target != Target("foo/bar", "main", "foo/config", "other")
+    assert target != target.to_dict()
+    assert repr(target).startswith("Target(repo='foo/bar', default_branch_name=")
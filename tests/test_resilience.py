@@ -0,0 +1,311 @@
+"""Tests for the recovery from transient failures of the requested hosts."""
+
+import asyncio
+import socket
+import time
+from urllib.error import HTTPError
+
+import pytest
+
+from repo_stream.github import GithubClient, run_sync
+from repo_stream.metrics import Metrics, activate_metrics
+from repo_stream.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    RetryPolicy,
+    parse_retry_after,
+)
+
+
+# epoch time of the date "Wed, 21 Oct 2015 07:28:00 GMT"
+RETRY_AFTER_DATE_EPOCH = 1445412480
+
+
+class FakeClock:
+    def __init__(self, now=1000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _no_sleep(seconds):
+    pass
+
+
+@pytest.mark.parametrize(
+    ("attempt", "retry_after", "expected_result"),
+    (
+        (0, None, 0.25),
+        (1, None, 0.5),
+        (3, None, 2),
+        (10, None, 5),  # capped
+        (0, "3", 3),
+        (0, "60", 10),
+        (0, "Wed, 21 Oct 2015 07:28:00 GMT", 4),
+        (0, "Wed, 21 Oct 2015 07:30:00 GMT", 10),
+        (0, "Wed, 21 Oct 2015 07:27:00 GMT", 0.25),  # date passed
+        (0, "soon", 0.25),
+    ),
+)
+def test_retry_policy_delay(attempt, retry_after, expected_result):
+    policy = RetryPolicy(
+        backoff=0.5,
+        max_backoff=10,
+        random=lambda: 0.5,
+        clock=FakeClock(RETRY_AFTER_DATE_EPOCH - 4),
+    )
+    assert policy.delay(attempt, retry_after) == expected_result
+
+
+@pytest.mark.parametrize(
+    ("value", "expected_result"),
+    (
+        ("120", 120),
+        ("1.5", 1.5),
+        ("-1", 0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 60),
+        ("Wed, 21 Oct 2015 07:26:00 GMT", 0),
+        ("", None),
+        ("tomorrow", None),
+    ),
+)
+def test_parse_retry_after(value, expected_result):
+    assert parse_retry_after(value, RETRY_AFTER_DATE_EPOCH - 60) == expected_result
+
+
+def test_circuit_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+
+    assert breaker.record_failure("a") is False
+    assert breaker.record_failure("a") is False
+    breaker.record_success("a")  # failures must be consecutive
+    assert breaker.record_failure("a") is False
+    assert breaker.record_failure("a") is False
+    assert breaker.record_failure("a") is True
+
+    assert breaker.is_open("a")
+    assert not breaker.allow("a")
+    assert breaker.allow("b")  # circuits are independent for each host
+
+    # after the timeout, a single request probes the host
+    clock.now += 30
+    assert breaker.allow("a")
+    assert not breaker.allow("a")
+
+    # the probe fails, so the circuit stays open for another timeout
+    assert breaker.record_failure("a") is False
+    clock.now += 29
+    assert not breaker.allow("a")
+    clock.now += 1
+    assert breaker.allow("a")
+    breaker.record_success("a")
+    assert not breaker.is_open("a")
+    assert breaker.allow("a")
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for latency in range(9):
+        tracker.add(latency)
+    assert tracker.quantile(0.95) is None
+
+    for latency in range(9, 200):
+        tracker.add(latency)
+    # only the latest latencies are kept
+    assert tracker.quantile(0.95) == 194
+    assert tracker.quantile(0.5) == 149
+
+
+def test_github_client_retries_server_errors(fake_github):
+    responses = [
+        (502, {}, {"message": "Bad Gateway"}),
+        (503, {"Retry-After": "2"}, {"message": "Service Unavailable"}),
+        (200, {}, []),
+    ]
+    fake_github.routes[("GET", "/repos/foo/bar/pulls?per_page=100&page=1")] = (
+        lambda _: responses.pop(0)
+    )
+    sleeps = []
+    client = GithubClient(
+        api_url=fake_github.url,
+        retry_policy=RetryPolicy(backoff=1, random=lambda: 0, sleep=sleeps.append),
+    )
+    try:
+        assert run_sync(client.get_github_prs("foo/bar")) == []
+    finally:
+        client.close()
+    assert sleeps == [0, 2]
+
+
+def test_github_client_retries_exhausted(fake_github):
+    fake_github.route("GET", "/raw/foo/bar/main/baz.yaml", status=500)
+    client = GithubClient(
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        retry_policy=RetryPolicy(retries=2, sleep=_no_sleep),
+    )
+    try:
+        with pytest.raises(HTTPError) as exc:
+            run_sync(client.download_raw_githubusercontent("foo/bar", "main", "baz"))
+    finally:
+        client.close()
+    assert exc.value.code == 500
+    assert len(fake_github.requests) == 3
+
+
+def test_github_client_does_not_retry_non_idempotent_requests(fake_github):
+    fake_github.route("POST", "/repos/foo/bar/pulls", status=502)
+    client = GithubClient(
+        api_url=fake_github.url,
+        retry_policy=RetryPolicy(sleep=_no_sleep),
+    )
+    try:
+        with pytest.raises(HTTPError) as exc:
+            run_sync(client.create_github_pr("foo/bar", "title", "", "head", "main"))
+    finally:
+        client.close()
+    assert exc.value.code == 502
+    assert len(fake_github.requests) == 1
+
+
+def test_github_client_circuit_breaker():
+    # nothing listens at the port of a closed socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        api_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    client = GithubClient(
+        api_url=api_url,
+        retry_policy=RetryPolicy(retries=1, sleep=_no_sleep),
+        circuit_breaker=CircuitBreaker(failure_threshold=3),
+    )
+    metrics = Metrics()
+    try:
+        with activate_metrics(metrics):
+            with pytest.raises(ConnectionError):
+                run_sync(client.get_github_prs("foo/bar"))
+            # the third failure opens the circuit, so the retry is rejected
+            for _ in range(2):
+                with pytest.raises(CircuitOpenError) as exc:
+                    run_sync(client.get_github_prs("foo/bar"))
+
+            # other resources of the host have their own circuits
+            with pytest.raises(ConnectionError):
+                run_sync(
+                    client.request(
+                        "POST",
+                        client.graphql_url,
+                        data=b"{}",
+                        idempotent=True,
+                    )
+                )
+
+            # requests with side effects are not rejected
+            with pytest.raises(ConnectionError):
+                run_sync(
+                    client.create_github_pr("foo/bar", "title", "", "head", "main")
+                )
+    finally:
+        client.close()
+
+    assert exc.value.code == 503
+    assert exc.value.resource == "core"
+    counters = metrics.to_dict()["counters"]
+    assert {
+        "name": "http_circuit_opened",
+        "labels": {"endpoint": "api"},
+        "value": 1,
+    } in counters
+    assert {
+        "name": "http_circuit_rejections",
+        "labels": {"endpoint": "api"},
+        "value": 2,
+    } in counters
+
+
+def test_github_client_hedged_reads(fake_github):
+    n_requests = []
+
+    def raw_content(_):
+        n_requests.append(None)
+        if len(n_requests) == 21:
+            time.sleep(1)
+        return (200, {}, b"repos: []")
+
+    fake_github.routes[("GET", "/raw/foo/bar/main/baz.yaml")] = raw_content
+    client = GithubClient(
+        max_requests_in_flight=4,
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+    )
+    metrics = Metrics()
+    try:
+        with activate_metrics(metrics):
+            for _ in range(20):
+                run_sync(
+                    client.download_raw_githubusercontent("foo/bar", "main", "baz")
+                )
+
+            start = time.monotonic()
+            content = run_sync(
+                client.download_raw_githubusercontent("foo/bar", "main", "baz")
+            )
+            elapsed = time.monotonic() - start
+    finally:
+        client.close()
+
+    assert content == "repos: []"
+    assert elapsed < 0.5
+    assert len(n_requests) == 22
+    assert {
+        "name": "http_hedged_requests",
+        "labels": {},
+        "value": 1,
+    } in metrics.to_dict()["counters"]
+    # the duplicates are accounted by the rate limit scheduler
+    assert client.scheduler.usage()["raw"]["used"] == 22
+
+
+def test_github_client_hedged_reads_bounded(fake_github):
+    n_requests = []
+
+    def raw_content(_):
+        n_requests.append(None)
+        if len(n_requests) in (21, 22):
+            time.sleep(1)
+        elif len(n_requests) == 23:
+            # the duplicate is still in flight when the other read is slow
+            time.sleep(0.3)
+        return (200, {}, b"repos: []")
+
+    fake_github.routes[("GET", "/raw/foo/bar/main/baz.yaml")] = raw_content
+    client = GithubClient(
+        max_requests_in_flight=4,
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        max_hedges_in_flight=1,
+    )
+
+    async def download():
+        return await client.download_raw_githubusercontent("foo/bar", "main", "baz")
+
+    async def download_concurrently():
+        return await asyncio.gather(download(), download())
+
+    metrics = Metrics()
+    try:
+        with activate_metrics(metrics):
+            for _ in range(20):
+                run_sync(download())
+            assert run_sync(download_concurrently()) == ["repos: []", "repos: []"]
+    finally:
+        client.close()
+
+    # only one of the slow reads has been duplicated
+    assert len(n_requests) == 23
+    counters = metrics.to_dict()["counters"]
+    assert {"name": "http_hedged_requests", "labels": {}, "value": 1} in counters
+    assert {"name": "http_hedges_skipped", "labels": {}, "value": 1} in counters
@@ -0,0 +1,68 @@
+"""Tests for the concurrency limits of each class of work."""
+
+import threading
+import time
+
+from repo_stream.metrics import Metrics, activate_metrics
+from repo_stream.resources import (
+    RESOURCE_CPU,
+    RESOURCE_NETWORK,
+    ResourceScheduler,
+)
+
+
+def _max_concurrency(scheduler, resource, n_threads, busy_resource=None):
+    # run threads that take a slot of a resource, returning the maximum
+    # number of them running at the same time
+    running, max_running = ([0], [0])
+    lock = threading.Lock()
+
+    def work():
+        with scheduler.slot(resource):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return max_running[0]
+
+
+def test_resource_scheduler_limits():
+    scheduler = ResourceScheduler(api=8, network=3, cpu=2)
+    assert scheduler.repositories_in_flight == 5
+    assert _max_concurrency(scheduler, RESOURCE_NETWORK, 10) == 3
+    assert _max_concurrency(scheduler, RESOURCE_CPU, 10) == 2
+
+
+def test_resource_scheduler_independent_classes():
+    scheduler = ResourceScheduler(network=1, cpu=1)
+    release = threading.Event()
+
+    def hold_cpu():
+        with scheduler.slot(RESOURCE_CPU):
+            release.wait()
+
+    thread = threading.Thread(target=hold_cpu)
+    thread.start()
+    try:
+        # network slots are available while all the CPU slots are busy
+        metrics = Metrics()
+        with activate_metrics(metrics):
+            with scheduler.slot(RESOURCE_NETWORK):
+                pass
+        assert metrics.to_dict()["spans"]["network_wait"]["count"] == 1
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_resource_scheduler_minimum_limits():
+    scheduler = ResourceScheduler(api=0, network=0, cpu=-1)
+    assert (scheduler.api, scheduler.network, scheduler.cpu) == (1, 1, 1)
@@ -0,0 +1,105 @@
+"""Tests for repo-stream hooks detection in pre-commit configurations."""
+
+import subprocess
+
+import pytest
+
+from repo_stream import scanner
+from repo_stream.github import run_sync
+from repo_stream.records import RepoRecord
+from repo_stream.scanner import (
+    fetch_pre_commit_config,
+    git_blob_sha,
+    repo_stream_hooks_args,
+)
+
+
+REPO_STREAM_PC_CONFIG = """repos:
+  - repo: https://github.com/pre-commit/pre-commit-hooks
+    rev: v4.1.0
+    hooks:
+      - id: trailing-whitespace
+  - repo: https://github.com/mondeja/repo-stream
+    rev: v1.3.1
+    hooks:
+      - id: repo-stream
+        args:
+          - -config=https://github.com/foo/repo-stream-config
+          - -updater=upstream
+      - id: repo-stream
+        args:
+          - -config
+          - https://github.com/foo/other-config
+          - -updater
+          - downstream
+"""
+
+
+def test_git_blob_sha(tmp_path):
+    filepath = tmp_path / "file.yaml"
+    filepath.write_text(REPO_STREAM_PC_CONFIG)
+    expected_sha = subprocess.check_output(
+        ["git", "hash-object", str(filepath)],
+        universal_newlines=True,
+    ).strip()
+    assert git_blob_sha(REPO_STREAM_PC_CONFIG) == expected_sha
+
+
+@pytest.mark.parametrize(
+    ("pc_config", "expected_result"),
+    (
+        pytest.param(
+            REPO_STREAM_PC_CONFIG,
+            [
+                {"config": "foo/repo-stream-config", "updater": "upstream"},
+                {"config": "foo/other-config", "updater": "downstream"},
+            ],
+            id="repo-stream",
+        ),
+        pytest.param(
+            "repos:\n  - repo: local\n    hooks:\n      - id: foo\n",
+            [],
+            id="without-repo-stream",
+        ),
+        pytest.param(
+            "# repo-stream\nrepos:\n  - repo: local\n",
+            [],
+            id="mention-without-hook",
+        ),
+        pytest.param("repo-stream: [", [], id="invalid"),
+    ),
+)
+def test_repo_stream_hooks_args(pc_config, expected_result):
+    assert repo_stream_hooks_args(pc_config) == expected_result
+
+
+def test_repo_stream_hooks_args_memoized(monkeypatch):
+    parsed = []
+    parse = scanner._parse_repo_stream_hooks_args
+
+    def counted_parse(pc_config):
+        parsed.append(pc_config)
+        return parse(pc_config)
+
+    monkeypatch.setattr(scanner, "_HOOKS_ARGS_CACHE", {})
+    monkeypatch.setattr(scanner, "_parse_repo_stream_hooks_args", counted_parse)
+
+    for _ in range(3):
+        assert len(repo_stream_hooks_args(REPO_STREAM_PC_CONFIG)) == 2
+    assert repo_stream_hooks_args("repos: []") == []
+    assert parsed == [REPO_STREAM_PC_CONFIG]
+
+
+def test_fetch_pre_commit_config(fake_github, github_client):
+    fake_github.route(
+        "GET",
+        "/raw/foo/bar/main/.pre-commit-config.yaml",
+        body=REPO_STREAM_PC_CONFIG.encode(),
+    )
+
+    def fetch(name):
+        repo = RepoRecord(f"foo/{name}", "main")
+        return run_sync(fetch_pre_commit_config(github_client, repo))
+
+    assert fetch("bar") == REPO_STREAM_PC_CONFIG
+    assert fetch("baz") is None
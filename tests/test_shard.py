@@ -0,0 +1,131 @@
+"""Tests for repo-stream shards."""
+
+import json
+
+import pytest
+
+from repo_stream.metrics import Metrics
+from repo_stream.shard import (
+    in_shard,
+    main,
+    merge_results,
+    parse_shard,
+    repo_shard_index,
+)
+
+
+@pytest.mark.parametrize(
+    ("value", "expected_result"),
+    (
+        ("1/1", (1, 1)),
+        ("2/4", (2, 4)),
+        ("4/4", (4, 4)),
+        ("0/4", ValueError),
+        ("5/4", ValueError),
+        ("1/0", ValueError),
+        ("1", ValueError),
+        ("a/b", ValueError),
+        ("1/2/3", ValueError),
+    ),
+)
+def test_parse_shard(value, expected_result):
+    if expected_result is ValueError:
+        with pytest.raises(ValueError, match="Invalid shard"):
+            parse_shard(value)
+    else:
+        assert parse_shard(value) == expected_result
+
+
+def test_repo_shard_index():
+    repos = [f"foo/bar{i}" for i in range(200)]
+    count = 4
+
+    shards = {index: [] for index in range(1, count + 1)}
+    for repo in repos:
+        shards[repo_shard_index(repo, count)].append(repo)
+
+    # disjoint shards that cover all the repositories
+    assert sorted(repo for shard in shards.values() for repo in shard) == sorted(repos)
+    for index, shard_repos in shards.items():
+        assert shard_repos
+        assert all(in_shard(repo, (index, count)) for repo in shard_repos)
+
+    # stable, case insensitive
+    assert repo_shard_index("Foo/Bar0", count) == repo_shard_index("foo/bar0", count)
+    assert in_shard("foo/bar0", None)
+
+
+def test_merge_results():
+    assert merge_results(
+        [
+            {
+                "exitcode": 0,
+                "updates": [
+                    {"repo": "foo/b", "config": "c", "updater": "u", "outcome": "a"},
+                ],
+            },
+            {
+                "exitcode": 1,
+                "updates": [
+                    {"repo": "foo/a", "config": "c", "updater": "u", "outcome": "b"},
+                ],
+            },
+        ]
+    ) == {
+        "exitcode": 1,
+        "updates": [
+            {"repo": "foo/a", "config": "c", "updater": "u", "outcome": "b"},
+            {"repo": "foo/b", "config": "c", "updater": "u", "outcome": "a"},
+        ],
+    }
+
+
+def test_main(tmp_path):
+    results_filepaths, metrics_filepaths = ([], [])
+    for index in (1, 2):
+        results_filepath = str(tmp_path / f"results-{index}.json")
+        with open(results_filepath, "w") as f:
+            json.dump({"exitcode": 0, "updates": []}, f)
+        results_filepaths.append(results_filepath)
+
+        metrics = Metrics()
+        metrics.inc("updates", outcome="pr-opened")
+        metrics.set("rate_limit_remaining", index * 10, resource="core")
+        metrics.add_span("clone", index, repo=f"foo/bar{index}")
+        metrics.observe("repo_update_seconds", index)
+        metrics_filepath = str(tmp_path / f"metrics-{index}.json")
+        metrics.write(metrics_filepath)
+        metrics_filepaths.append(metrics_filepath)
+
+    assert (
+        main(
+            [
+                "--results",
+                *results_filepaths,
+                "--results-output",
+                str(tmp_path / "results.json"),
+                "--metrics",
+                *metrics_filepaths,
+                "--metrics-output",
+                str(tmp_path / "metrics.json"),
+            ]
+        )
+        == 0
+    )
+
+    with open(tmp_path / "results.json") as f:
+        assert json.load(f) == {"exitcode": 0, "updates": []}
+
+    with open(tmp_path / "metrics.json") as f:
+        data = json.load(f)
+    assert data["counters"] == [
+        {"name": "updates", "labels": {"outcome": "pr-opened"}, "value": 2}
+    ]
+    assert data["gauges"] == [
+        {"name": "rate_limit_remaining", "labels": {"resource": "core"}, "value": 10}
+    ]
+    assert data["spans"] == {"clone": {"count": 2, "sum": 3, "max": 2}}
+    assert data["repos"] == {"foo/bar1": {"clone": 1}, "foo/bar2": {"clone": 2}}
+    assert data["histograms"][0]["count"] == 2
+    assert data["histograms"][0]["buckets"]["1"] == 1
+    assert data["histograms"][0]["buckets"]["2.5"] == 2
@@ -0,0 +1,75 @@
+"""Tests for the persistent state of repo-stream updates."""
+
+import pytest
+
+from repo_stream.state import StateStore, updater_content_hash
+
+
+@pytest.fixture
+def state_store(tmp_path):
+    store = StateStore(str(tmp_path / "state" / "repo-stream.db"))
+    yield store
+    store.close()
+
+
+def test_state_store(tmp_path):
+    state_store = StateStore(str(tmp_path / "state" / "repo-stream.db"))
+    assert state_store.get("foo/bar", "foo/config", "upstream") is None
+
+    updater_hash = updater_content_hash("repos: []")
+    state_store.set(
+        "foo/bar",
+        "foo/config",
+        "upstream",
+        "abc",
+        updater_hash,
+        "up-to-date",
+    )
+    state = state_store.get("foo/bar", "foo/config", "upstream")
+    assert state["head_sha"] == "abc"
+    assert state["updater_hash"] == updater_hash
+    assert state["outcome"] == "up-to-date"
+
+    # persisted between instances
+    state_store.close()
+    state_store = StateStore(str(tmp_path / "state" / "repo-stream.db"))
+    assert state_store.get("foo/bar", "foo/config", "upstream") == state
+    state_store.close()
+
+
+@pytest.mark.parametrize(
+    ("head_sha", "updater_content", "outcome", "expected_result"),
+    (
+        ("abc", "repos: []", "up-to-date", True),
+        ("def", "repos: []", "up-to-date", False),
+        (None, "repos: []", "up-to-date", False),
+        ("abc", "repos: [{}]", "up-to-date", False),
+        ("abc", "repos: []", "pr-opened", False),
+    ),
+)
+def test_state_store_is_unchanged(
+    state_store,
+    head_sha,
+    updater_content,
+    outcome,
+    expected_result,
+):
+    state_store.set(
+        "foo/bar",
+        "foo/config",
+        "upstream",
+        "abc",
+        updater_content_hash("repos: []"),
+        outcome,
+    )
+    assert (
+        state_store.is_unchanged(
+            "foo/bar",
+            "foo/config",
+            "upstream",
+            head_sha,
+            updater_content_hash(updater_content),
+            "up-to-date",
+        )
+        is expected_result
+    )
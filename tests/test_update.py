@@ -0,0 +1,693 @@
+"""Tests for repo-stream update command."""
+
+import contextlib
+import functools
+import json
+import os
+import subprocess
+
+import pytest
+
+import repo_stream.update as update_module
+from repo_stream.git import tmp_repo
+from repo_stream.precommit import pre_commit_home_cache_key
+from repo_stream.records import RepoRecord, Target
+from repo_stream.resilience import RetryPolicy
+from repo_stream.update import (
+    check_pr_already_opened,
+    filter_repos_with_repo_stream_hook,
+    get_opened_prs_index,
+    update,
+)
+
+
+REPO_STREAM_PC_CONFIG = b"""repos:
+  - repo: https://github.com/mondeja/repo-stream
+    rev: v1.3.1
+    hooks:
+      - id: repo-stream
+        args:
+          - -config=https://github.com/foo/repo-stream-config
+          - -updater=upstream
+"""
+
+
+def _pr_body(config, updater):
+    return (
+        "<!--\nThis comment is autogenerated. Please, don't edit it.\n\n"
+        f"config={config}\nupdater={updater}\n-->\n\n> Opened by repo-stream."
+    )
+
+
+def _repo_record(name, default_branch="main"):
+    return {
+        "full_name": f"foo/{name}",
+        "default_branch": default_branch,
+        "pushed_at": "2021-12-31T00:00:00Z",
+        "size": 42,
+        "fork": False,
+        "archived": False,
+    }
+
+
+def test_filter_repos_with_repo_stream_hook(fake_github, github_client):
+    fake_github.route(
+        "GET",
+        "/raw/foo/bar/develop/.pre-commit-config.yaml",
+        body=REPO_STREAM_PC_CONFIG,
+    )
+    fake_github.route(
+        "GET",
+        "/raw/foo/qux/main/.pre-commit-config.yaml",
+        body=b"repos: []\n",
+    )
+
+    repos_stream_config = filter_repos_with_repo_stream_hook(
+        [
+            RepoRecord.from_dict(_repo_record("bar", default_branch="develop")),
+            # without pre-commit configuration
+            RepoRecord.from_dict(_repo_record("baz")),
+            RepoRecord.from_dict(_repo_record("qux")),
+        ],
+        client=github_client,
+    )
+    assert repos_stream_config == [
+        Target(
+            "foo/bar",
+            "develop",
+            "foo/repo-stream-config",
+            "upstream",
+            pushed_at="2021-12-31T00:00:00Z",
+            size=42,
+        )
+    ]
+    assert len(fake_github.requests) == 3
+    assert not any("/git/trees/" in path for _, path, _ in fake_github.requests)
+
+
+def test_get_opened_prs_index(fake_github, github_client):
+    search_url = "/search/issues?q=is%3Apr+is%3Aopen+head%3Arepo-stream--+user%3A"
+    for page, items in enumerate(
+        (
+            [
+                {
+                    "number": 1,
+                    "repository_url": f"{fake_github.url}/repos/foo/bar",
+                    "body": _pr_body("foo/repo-stream-config", "upstream"),
+                },
+                {
+                    "number": 2,
+                    "repository_url": f"{fake_github.url}/repos/foo/baz",
+                    "body": None,
+                },
+            ],
+            [
+                {
+                    "number": 3,
+                    "repository_url": f"{fake_github.url}/repos/foo/bar",
+                    "body": _pr_body("foo/repo-stream-config", "upstream"),
+                },
+            ],
+        ),
+        start=1,
+    ):
+        fake_github.route(
+            "GET",
+            f"{search_url}foo&per_page=100&page={page}",
+            headers={"Link": f'<{fake_github.url}/search?page=2>; rel="last"'},
+            body={"total_count": 3, "incomplete_results": False, "items": items},
+        )
+    fake_github.route(
+        "GET",
+        f"{search_url}notfound&per_page=100&page=1",
+        status=422,
+        body={"message": "Validation Failed"},
+    )
+
+    prs_index = get_opened_prs_index(["foo", "notfound"], client=github_client)
+    assert prs_index == {
+        ("foo/bar", "foo/repo-stream-config", "upstream"): [1, 3],
+        ("foo/baz", None, None): [2],
+    }
+    assert len(fake_github.requests) == 3
+
+    repo = Target("foo/bar", "main", "foo/repo-stream-config", "upstream")
+    assert check_pr_already_opened(repo, "repo-stream--", prs_index=prs_index)
+    assert not check_pr_already_opened(
+        Target("foo/bar", "main", "foo/repo-stream-config", "other"),
+        "repo-stream--",
+        prs_index=prs_index,
+    )
+
+    # the index is checked in memory
+    assert len(fake_github.requests) == 3
+
+
+@pytest.mark.parametrize(
+    ("status", "body"),
+    (
+        (403, {"message": "API rate limit exceeded"}),
+        (200, {"total_count": 1001, "incomplete_results": False, "items": []}),
+        (200, {"total_count": 0, "incomplete_results": True, "items": []}),
+    ),
+)
+def test_get_opened_prs_index_incomplete(fake_github, github_client, status, body):
+    fake_github.route(
+        "GET",
+        "/search/issues?q=is%3Apr+is%3Aopen+head%3Arepo-stream--+user%3Afoo"
+        "&per_page=100&page=1",
+        status=status,
+        body=body,
+    )
+    # the pull requests are checked for each repository
+    assert get_opened_prs_index(["foo"], client=github_client) is None
+
+
+def test_check_pr_already_opened(fake_github, github_client):
+    def pr_data(number, head, body):
+        return {"number": number, "head": {"ref": head}, "body": body}
+
+    fake_github.route(
+        "GET",
+        "/repos/foo/bar/pulls?per_page=100&page=1",
+        headers={"Link": f'<{fake_github.url}/pulls?page=2>; rel="last"'},
+        body=[pr_data(1, "other", None), pr_data(2, "repo-stream--abc", None)],
+    )
+    fake_github.route(
+        "GET",
+        "/repos/foo/bar/pulls?per_page=100&page=2",
+        body=[
+            pr_data(
+                3,
+                "repo-stream--def",
+                _pr_body("foo/repo-stream-config", "upstream"),
+            ),
+        ],
+    )
+
+    repo = Target("foo/bar", "main", "foo/repo-stream-config", "upstream")
+    assert check_pr_already_opened(repo, "repo-stream--", client=github_client)
+    assert len(fake_github.requests) == 2
+
+
+CHANGING_UPDATER_CONFIG = b"""repos:
+  - repo: local
+    hooks:
+      - id: update-readme
+        name: update-readme
+        entry: sh -c "echo updated >> README.md"
+        language: system
+        always_run: true
+        pass_filenames: false
+"""
+
+
+def _create_bare_repo(dirpath, files):
+    worktree = os.path.join(os.path.dirname(dirpath), "worktree")
+    subprocess.check_call(["git", "init", "--quiet", "-b", "main", worktree])
+    for filename, content in files.items():
+        with open(os.path.join(worktree, filename), "wb") as f:
+            f.write(content)
+    subprocess.check_call(["git", "add", "."], cwd=worktree)
+    subprocess.check_call(["git", "commit", "--quiet", "-m", "init"], cwd=worktree)
+    subprocess.check_call(
+        ["git", "clone", "--quiet", "--bare", worktree, dirpath],
+    )
+
+
+def _setup_update(fake_github, tmp_path, monkeypatch):
+    # repository 'foo/bar' updated by its repo-stream hook and repository
+    # 'foo/baz' without pre-commit configuration, returns the pull requests
+    # created
+    for name in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{name}_NAME", "repo-stream")
+        monkeypatch.setenv(f"GIT_{name}_EMAIL", "repo-stream@example.com")
+    monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+
+    git_dirpath = tmp_path / "git"
+    _create_bare_repo(
+        str(git_dirpath / "foo" / "bar.git"),
+        {"README.md": b"bar\n", ".pre-commit-config.yaml": REPO_STREAM_PC_CONFIG},
+    )
+
+    fake_github.route(
+        "GET",
+        "/users/foo/repos?per_page=50&sort=updated&page=1&type=owner",
+        body=[_repo_record("bar"), _repo_record("baz")],
+    )
+    fake_github.route(
+        "GET",
+        "/raw/foo/bar/main/.pre-commit-config.yaml",
+        body=REPO_STREAM_PC_CONFIG,
+    )
+    fake_github.route(
+        "GET",
+        "/raw/foo/repo-stream-config/main/upstream.yaml",
+        body=CHANGING_UPDATER_CONFIG,
+    )
+    fake_github.route(
+        "GET",
+        "/search/issues?q=is%3Apr+is%3Aopen+head%3Arepo-stream--+user%3Afoo"
+        "&per_page=100&page=1",
+        body={"total_count": 0, "incomplete_results": False, "items": []},
+    )
+    created_prs = []
+
+    def create_pr(handler):
+        created_prs.append(json.loads(handler.body))
+        return (
+            201,
+            {},
+            {
+                "number": 1,
+                "user": {"login": "repo-stream"},
+                "html_url": "https://github.com/foo/bar/pull/1",
+            },
+        )
+
+    fake_github.routes[("POST", "/repos/foo/bar/pulls")] = create_pr
+    return created_prs
+
+
+def test_update(fake_github, tmp_path, monkeypatch):
+    created_prs = _setup_update(fake_github, tmp_path, monkeypatch)
+    git_dirpath = tmp_path / "git"
+
+    exitcode = update(
+        ["foo"],
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        git_url=str(git_dirpath),
+        pre_commit_home=str(tmp_path / "pre-commit"),
+        metrics_file=str(tmp_path / "metrics.json"),
+        results_file=str(tmp_path / "results.json"),
+    )
+    assert exitcode == 0
+
+    with open(tmp_path / "results.json") as f:
+        assert json.load(f) == {
+            "exitcode": 0,
+            "updates": [
+                {
+                    "repo": "foo/bar",
+                    "config": "foo/repo-stream-config",
+                    "updater": "upstream",
+                    "outcome": "pr-opened",
+                },
+            ],
+        }
+
+    with open(tmp_path / "metrics.json") as f:
+        metrics = json.load(f)
+    for span in ("clone", "pre_commit", "push", "pull_request"):
+        assert span in metrics["repos"]["foo/bar"]
+    assert {
+        "name": "updates",
+        "labels": {"outcome": "pr-opened"},
+        "value": 1,
+    } in metrics["counters"]
+
+    assert len(created_prs) == 1
+    assert created_prs[0]["base"] == "main"
+    assert "updater=upstream" in created_prs[0]["body"]
+
+    # the branch of the pull request has been pushed
+    branches = subprocess.check_output(
+        ["git", "branch", "--list", "--format=%(refname:short)"],
+        cwd=str(git_dirpath / "foo" / "bar.git"),
+    ).decode("utf-8")
+    assert created_prs[0]["head"] in branches.splitlines()
+
+
+def test_update_several_users(fake_github, tmp_path, monkeypatch):
+    created_prs = _setup_update(fake_github, tmp_path, monkeypatch)
+    # 'foo/bar' is also reachable from another user
+    fake_github.route(
+        "GET",
+        "/users/qux/repos?per_page=50&sort=updated&page=1&type=owner",
+        body=[_repo_record("bar")],
+    )
+    fake_github.route(
+        "GET",
+        "/search/issues?q=is%3Apr+is%3Aopen+head%3Arepo-stream--+user%3Aqux"
+        "&per_page=100&page=1",
+        body={"total_count": 0, "incomplete_results": False, "items": []},
+    )
+
+    exitcode = update(
+        ["foo", "qux", "FOO"],
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        git_url=str(tmp_path / "git"),
+        pre_commit_home=str(tmp_path / "pre-commit"),
+    )
+    assert exitcode == 0
+    assert len(created_prs) == 1
+
+    requested_paths = [path for _, path, _ in fake_github.requests]
+    assert requested_paths.count("/raw/foo/repo-stream-config/main/upstream.yaml") == 1
+    assert requested_paths.count("/raw/foo/bar/main/.pre-commit-config.yaml") == 1
+    assert not any("user%3AFOO" in path for path in requested_paths)
+
+
+def test_update_failing_repos(fake_github, tmp_path, monkeypatch, capsys):
+    created_prs = _setup_update(fake_github, tmp_path, monkeypatch)
+    monkeypatch.setattr(
+        "repo_stream.github.RetryPolicy",
+        functools.partial(RetryPolicy, sleep=lambda seconds: None),
+    )
+    # 'foo/qux' connection is reset creating its pull request and the
+    # pre-commit configuration of 'foo/quux' can't be downloaded
+    _create_bare_repo(
+        str(tmp_path / "git" / "foo" / "qux.git"),
+        {"README.md": b"qux\n", ".pre-commit-config.yaml": REPO_STREAM_PC_CONFIG},
+    )
+    fake_github.route(
+        "GET",
+        "/users/foo/repos?per_page=50&sort=updated&page=1&type=owner",
+        body=[_repo_record("bar"), _repo_record("qux"), _repo_record("quux")],
+    )
+    fake_github.route(
+        "GET",
+        "/raw/foo/qux/main/.pre-commit-config.yaml",
+        body=REPO_STREAM_PC_CONFIG,
+    )
+
+    def reset_connection(handler):
+        raise ConnectionResetError("connection reset")
+
+    fake_github.routes[("POST", "/repos/foo/qux/pulls")] = reset_connection
+    fake_github.route("GET", "/raw/foo/quux/main/.pre-commit-config.yaml", status=500)
+
+    exitcode = update(
+        ["foo"],
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        git_url=str(tmp_path / "git"),
+        pre_commit_home=str(tmp_path / "pre-commit"),
+        results_file=str(tmp_path / "results.json"),
+    )
+    assert exitcode == 1
+
+    # the update of 'foo/bar' is not affected by the other repositories
+    assert len(created_prs) == 1
+    with open(tmp_path / "results.json") as f:
+        outcomes = {
+            update["repo"]: update["outcome"] for update in json.load(f)["updates"]
+        }
+    assert outcomes == {"foo/bar": "pr-opened", "foo/qux": "failed"}
+
+    err = capsys.readouterr().err
+    assert "Error creating pull request for repository 'foo/qux'" in err
+    assert "pre-commit configuration of repository 'foo/quux'" in err
+    paths = [path for _, path, _ in fake_github.requests]
+    assert paths.count("/raw/foo/quux/main/.pre-commit-config.yaml") == 4
+
+
+def test_update_prs_search_failure(fake_github, tmp_path, monkeypatch):
+    created_prs = _setup_update(fake_github, tmp_path, monkeypatch)
+    fake_github.route(
+        "GET",
+        "/search/issues?q=is%3Apr+is%3Aopen+head%3Arepo-stream--+user%3Afoo"
+        "&per_page=100&page=1",
+        status=403,
+        body={"message": "API rate limit exceeded"},
+    )
+    fake_github.route("GET", "/repos/foo/bar/pulls?per_page=100&page=1", body=[])
+
+    exitcode = update(
+        ["foo"],
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        git_url=str(tmp_path / "git"),
+        pre_commit_home=str(tmp_path / "pre-commit"),
+    )
+    assert exitcode == 0
+    assert len(created_prs) == 1
+
+    # the pull requests of the repository have been checked
+    paths = [path for _, path, _ in fake_github.requests]
+    assert "/repos/foo/bar/pulls?per_page=100&page=1" in paths
+
+
+def test_update_resume(fake_github, tmp_path, monkeypatch):
+    created_prs = _setup_update(fake_github, tmp_path, monkeypatch)
+    update_kwargs = dict(
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        git_url=str(tmp_path / "git"),
+        pre_commit_home=str(tmp_path / "pre-commit"),
+        journal_file=str(tmp_path / "journal.jsonl"),
+        resume=True,
+    )
+
+    async def crash(*args, **kwargs):
+        raise RuntimeError("crash")
+
+    # the process dies before opening the pull request
+    with monkeypatch.context() as m:
+        m.setattr("repo_stream.update._open_update_pr", crash)
+        with pytest.raises(RuntimeError, match="crash"):
+            update(["foo"], **update_kwargs)
+    assert not created_prs
+
+    # the discovery and the check of 'foo/baz' are not repeated
+    fake_github.requests.clear()
+    assert update(["foo"], **update_kwargs) == 0
+    assert len(created_prs) == 1
+    paths = [path for _, path, _ in fake_github.requests]
+    assert not any(path.startswith("/users/foo/repos") for path in paths)
+    assert "/raw/foo/baz/main/.pre-commit-config.yaml" not in paths
+
+    # a completed run is not resumed
+    fake_github.requests.clear()
+    assert update(["foo"], **update_kwargs) == 0
+    paths = [path for _, path, _ in fake_github.requests]
+    assert any(path.startswith("/users/foo/repos") for path in paths)
+
+
+def test_update_releases_resources_on_error(fake_github, tmp_path, monkeypatch):
+    _setup_update(fake_github, tmp_path, monkeypatch)
+    closed = []
+
+    def record_close(name):
+        close = getattr(update_module, name).close
+
+        def wrapper(self):
+            closed.append(name)
+            close(self)
+
+        monkeypatch.setattr(getattr(update_module, name), "close", wrapper)
+
+    for name in ("GithubClient", "StateStore", "Journal", "PreCommitPool"):
+        record_close(name)
+
+    async def crash(*args, **kwargs):
+        raise RuntimeError("crash")
+
+    monkeypatch.setattr("repo_stream.update._update_pipeline", crash)
+    with pytest.raises(RuntimeError, match="crash"):
+        update(
+            ["foo"],
+            api_url=fake_github.url,
+            raw_url=f"{fake_github.url}/raw",
+            git_url=str(tmp_path / "git"),
+            pre_commit_home=str(tmp_path / "pre-commit"),
+            state_file=str(tmp_path / "state.db"),
+            journal_file=str(tmp_path / "journal.jsonl"),
+        )
+    assert closed == ["PreCommitPool", "Journal", "StateStore", "GithubClient"]
+
+
+def test_update_commit_mode_api(fake_github, tmp_path, monkeypatch):
+    created_prs = _setup_update(fake_github, tmp_path, monkeypatch)
+    monkeypatch.setenv("GITHUB_USERNAME", "repo-stream")
+    monkeypatch.setenv("GITHUB_TOKEN", "fake")
+    git_dirpath = tmp_path / "git"
+
+    # the repositories are cloned from an HTTP URL mapped to the local
+    # directory, recording the remote URLs stored in the clones
+    gitconfig_path = tmp_path / "gitconfig"
+    gitconfig_path.write_text(
+        f'[url "{git_dirpath}/"]\n\tinsteadOf = https://git.example.com/\n'
+    )
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(gitconfig_path))
+    remote_urls = []
+
+    @contextlib.contextmanager
+    def recording_tmp_repo(*args, **kwargs):
+        with tmp_repo(*args, **kwargs) as repo_dirpath:
+            remote_urls.append(
+                subprocess.check_output(
+                    ["git", "config", "--local", "remote.origin.url"],
+                    cwd=repo_dirpath,
+                )
+                .decode("utf-8")
+                .strip()
+            )
+            yield repo_dirpath
+
+    monkeypatch.setattr("repo_stream.update.tmp_repo", recording_tmp_repo)
+
+    requests_payloads = {}
+
+    def git_data_route(path, sha):
+        def handler(handler):
+            requests_payloads[path] = json.loads(handler.body)
+            return (201, {}, {"sha": sha})
+
+        fake_github.routes[("POST", f"/repos/foo/bar/git/{path}")] = handler
+
+    git_data_route("trees", "tree-sha")
+    git_data_route("commits", "commit-sha")
+    git_data_route("refs", "commit-sha")
+
+    exitcode = update(
+        ["foo"],
+        discovery="rest",
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        git_url="https://git.example.com",
+        pre_commit_home=str(tmp_path / "pre-commit"),
+        commit_mode="api",
+    )
+    assert exitcode == 0
+
+    # the token is not stored in the remote URL of the clone
+    assert remote_urls == ["https://git.example.com/foo/bar.git"]
+
+    bare_repo_dirpath = str(git_dirpath / "foo" / "bar.git")
+    base_sha, base_tree = (
+        subprocess.check_output(
+            ["git", "rev-parse", "main", "main^{tree}"],
+            cwd=bare_repo_dirpath,
+        )
+        .decode("utf-8")
+        .split()
+    )
+    assert requests_payloads["trees"] == {
+        "base_tree": base_tree,
+        "tree": [
+            {
+                "path": "README.md",
+                "mode": "100644",
+                "type": "blob",
+                "content": "bar\nupdated\n",
+            },
+        ],
+    }
+    assert requests_payloads["commits"] == {
+        "message": "repo-stream update",
+        "tree": "tree-sha",
+        "parents": [base_sha],
+    }
+    assert requests_payloads["refs"] == {
+        "ref": f"refs/heads/{created_prs[0]['head']}",
+        "sha": "commit-sha",
+    }
+
+    # nothing has been pushed
+    branches = subprocess.check_output(
+        ["git", "branch", "--list", "--format=%(refname:short)"],
+        cwd=bare_repo_dirpath,
+    ).decode("utf-8")
+    assert branches.splitlines() == ["main"]
+
+
+def test_update_commit_mode_api_without_token(monkeypatch, capsys):
+    monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+    assert update(["foo"], commit_mode="api") == 1
+    assert "A Github token is required" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    ("filters", "cloned"),
+    (
+        (b"files: \\.py$", False),
+        (b"files: \\.py$\n        always_run: true", True),
+    ),
+)
+def test_update_preflight(fake_github, tmp_path, monkeypatch, capsys, filters, cloned):
+    created_prs = _setup_update(fake_github, tmp_path, monkeypatch)
+    updater_config = CHANGING_UPDATER_CONFIG.replace(b"always_run: true", filters)
+    fake_github.route(
+        "GET",
+        "/raw/foo/repo-stream-config/main/upstream.yaml",
+        body=updater_config,
+    )
+    fake_github.route(
+        "GET",
+        "/repos/foo/bar/git/trees/main?recursive=1",
+        body={
+            "tree": [
+                {"path": "README.md", "mode": "100644", "type": "blob"},
+                {"path": ".pre-commit-config.yaml", "mode": "100644", "type": "blob"},
+            ],
+            "truncated": False,
+        },
+    )
+
+    exitcode = update(
+        ["foo"],
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        git_url=str(tmp_path / "git"),
+        pre_commit_home=str(tmp_path / "pre-commit"),
+        results_file=str(tmp_path / "results.json"),
+        preflight=True,
+    )
+    assert exitcode == 0
+
+    with open(tmp_path / "results.json") as f:
+        outcome = json.load(f)["updates"][0]["outcome"]
+    assert outcome == ("pr-opened" if cloned else "skipped")
+    assert len(created_prs) == (1 if cloned else 0)
+    assert ("Cloning 'foo/bar'" in capsys.readouterr().out) is cloned
+
+
+def test_update_pre_commit_cache_key(fake_github, tmp_path, monkeypatch):
+    created_prs = _setup_update(fake_github, tmp_path, monkeypatch)
+    # the hooks don't match any file of 'foo/bar', so pre-flight skips it
+    updater_config = CHANGING_UPDATER_CONFIG.replace(
+        b"always_run: true", b"files: \\.py$"
+    )
+    fake_github.route(
+        "GET",
+        "/raw/foo/repo-stream-config/main/upstream.yaml",
+        body=updater_config,
+    )
+    fake_github.route(
+        "GET",
+        "/repos/foo/bar/git/trees/main?recursive=1",
+        body={"tree": [], "truncated": False},
+    )
+    update_kwargs = dict(
+        api_url=fake_github.url,
+        raw_url=f"{fake_github.url}/raw",
+        git_url=str(tmp_path / "git"),
+        pre_commit_home=str(tmp_path / "pre-commit"),
+        pre_commit_cache_key_file=str(tmp_path / "key"),
+    )
+    expected_key = pre_commit_home_cache_key([updater_config.decode("utf-8")])
+
+    # the key is computed without updating the repositories
+    assert update(["foo"], only_pre_commit_cache_key=True, **update_kwargs) == 0
+    assert (tmp_path / "key").read_text() == expected_key
+    assert not created_prs
+    assert not (tmp_path / "pre-commit").exists()
+
+    # the key includes the configurations of the skipped repositories
+    (tmp_path / "key").unlink()
+    assert update(["foo"], preflight=True, **update_kwargs) == 0
+    assert not created_prs
+    assert (tmp_path / "key").read_text() == expected_key
+
+    # no key is written if no updater configuration is used
+    (tmp_path / "key").unlink()
+    fake_github.route(
+        "GET",
+        "/users/foo/repos?per_page=50&sort=updated&page=1&type=owner",
+        body=[_repo_record("baz")],
+    )
+    assert update(["foo"], **update_kwargs) == 0
+    assert not (tmp_path / "key").exists()